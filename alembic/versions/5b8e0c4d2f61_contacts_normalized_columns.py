@@ -0,0 +1,86 @@
+"""contacts normalized columns
+
+Revision ID: 5b8e0c4d2f61
+Revises: 3f1d2b7c9a10
+Create Date: 2026-10-19 14:02:17.531094
+
+Replaces the global unique constraints on contacts.email and contacts.phone by
+unique indexes on the normalized values per user. Contacts of one user that only
+differ in spelling must be merged before upgrading, or creating the indexes fails.
+
+The normalization rules are copied here as they were at this revision, so the migration
+gives the same result whatever the application code does later.
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.conf.config import config
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e0c4d2f61'
+down_revision = '3f1d2b7c9a10'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().casefold()
+
+
+def normalize_phone(phone: str, country_code: str) -> str:
+    phone = phone.strip()
+    digits = re.sub(r"\D", "", phone)
+    if phone.startswith("+"):
+        return "+" + digits
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    if digits.startswith(country_code) and len(digits) > len(country_code) + 8:
+        return "+" + digits
+    if digits.startswith("0"):
+        digits = digits[1:]
+    return "+" + country_code + digits
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('email_normalized', sa.String(length=150), nullable=True))
+    op.add_column('contacts', sa.Column('phone_normalized', sa.String(length=20), nullable=True))
+
+    contacts = sa.table('contacts', sa.column('id', sa.Integer), sa.column('email', sa.String),
+                        sa.column('phone', sa.String), sa.column('email_normalized', sa.String),
+                        sa.column('phone_normalized', sa.String))
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(contacts.c.id, contacts.c.email, contacts.c.phone)
+            .where(contacts.c.id > last_id).order_by(contacts.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id')),
+            [{'contact_id': row.id, 'email_normalized': normalize_email(row.email),
+              'phone_normalized': normalize_phone(row.phone, config.phone_country_code)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+    op.alter_column('contacts', 'email_normalized', nullable=False)
+    op.alter_column('contacts', 'phone_normalized', nullable=False)
+    op.drop_constraint('contacts_email_key', 'contacts', type_='unique')
+    op.drop_constraint('contacts_phone_key', 'contacts', type_='unique')
+    op.create_index('ux_contacts_user_id_email_normalized', 'contacts', ['user_id', 'email_normalized'], unique=True)
+    op.create_index('ux_contacts_user_id_phone_normalized', 'contacts', ['user_id', 'phone_normalized'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_contacts_user_id_phone_normalized', table_name='contacts')
+    op.drop_index('ux_contacts_user_id_email_normalized', table_name='contacts')
+    op.create_unique_constraint('contacts_phone_key', 'contacts', ['phone'])
+    op.create_unique_constraint('contacts_email_key', 'contacts', ['email'])
+    op.drop_column('contacts', 'phone_normalized')
+    op.drop_column('contacts', 'email_normalized')
@@ -0,0 +1,37 @@
+"""contact counters
+
+Revision ID: 9d4a7e2b1c35
+Revises: 5b8e0c4d2f61
+Create Date: 2026-10-19 15:37:52.904163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4a7e2b1c35'
+down_revision = '5b8e0c4d2f61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('contact_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'bucket')
+    )
+    op.execute(
+        "INSERT INTO contact_counters (user_id, bucket, count) "
+        "SELECT user_id, 0, count(*) FROM contacts WHERE user_id IS NOT NULL GROUP BY user_id "
+        "UNION ALL "
+        "SELECT user_id, extract(month FROM birthday)::int, count(*) FROM contacts WHERE user_id IS NOT NULL "
+        "GROUP BY user_id, extract(month FROM birthday)::int"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('contact_counters')
@@ -0,0 +1,89 @@
+"""partition contacts by user
+
+Revision ID: d7a3b5c1e902
+Revises: c2e6f1a9b847
+Create Date: 2026-10-19 18:21:44.630518
+
+Turns contacts into a table hash-partitioned by user_id (PostgreSQL only). The
+partition key has to be part of the primary key and of every unique index, so
+the primary key becomes (id, user_id) and contacts without a user are deleted.
+Rows are copied in one transaction, which locks contacts for the duration of the
+copy: run it in a maintenance window on large tables.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3b5c1e902'
+down_revision = 'c2e6f1a9b847'
+branch_labels = None
+depends_on = None
+
+PARTITIONS = 16
+
+COLUMNS = "id, name, surname, email, phone, email_normalized, phone_normalized, birthday, notes, " \
+          "created_at, updated_at, user_id"
+
+
+def _columns():
+    return [
+        # Keeps using the sequence of the original table, so IDs continue where they stopped.
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False,
+                  server_default=sa.text("nextval('contacts_id_seq'::regclass)")),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('surname', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=150), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=False),
+        sa.Column('email_normalized', sa.String(length=150), nullable=False),
+        sa.Column('phone_normalized', sa.String(length=20), nullable=False),
+        sa.Column('birthday', sa.Date(), nullable=False),
+        sa.Column('notes', sa.String(length=500), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='contacts_user_id_fkey'),
+    ]
+
+
+def _create_indexes():
+    op.create_index('ix_contacts_user_id_updated_at', 'contacts', ['user_id', 'updated_at'], unique=False)
+    op.create_index('ux_contacts_user_id_email_normalized', 'contacts', ['user_id', 'email_normalized'], unique=True)
+    op.create_index('ux_contacts_user_id_phone_normalized', 'contacts', ['user_id', 'phone_normalized'], unique=True)
+
+
+def _set_aside_old_table():
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY NONE")
+    op.drop_index('ix_contacts_user_id_updated_at', table_name='contacts')
+    op.drop_index('ux_contacts_user_id_email_normalized', table_name='contacts')
+    op.drop_index('ux_contacts_user_id_phone_normalized', table_name='contacts')
+    op.rename_table('contacts', 'contacts_old')
+    op.execute("ALTER TABLE contacts_old RENAME CONSTRAINT contacts_pkey TO contacts_old_pkey")
+    op.execute("ALTER TABLE contacts_old RENAME CONSTRAINT contacts_user_id_fkey TO contacts_old_user_id_fkey")
+
+
+def _move_rows():
+    op.execute(f"INSERT INTO contacts ({COLUMNS}) SELECT {COLUMNS} FROM contacts_old WHERE user_id IS NOT NULL")
+    op.drop_table('contacts_old')
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id")
+    op.execute("ANALYZE contacts")
+
+
+def upgrade() -> None:
+    _set_aside_old_table()
+    op.create_table('contacts', *_columns(), sa.PrimaryKeyConstraint('id', 'user_id', name='contacts_pkey'),
+                    postgresql_partition_by='HASH (user_id)')
+    for remainder in range(PARTITIONS):
+        op.execute(f"CREATE TABLE contacts_p{remainder} PARTITION OF contacts "
+                   f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})")
+    _create_indexes()
+    _move_rows()
+
+
+def downgrade() -> None:
+    _set_aside_old_table()
+    columns = _columns()
+    columns[-2] = sa.Column('user_id', sa.Integer(), nullable=True)
+    op.create_table('contacts', *columns, sa.PrimaryKeyConstraint('id', name='contacts_pkey'))
+    _create_indexes()
+    _move_rows()
@@ -0,0 +1,55 @@
+"""
+CPU cost vs. bytes saved when compressing a ``List[ContactResponse]`` body.
+
+Serialises the given number of contacts the way ``all_contacts`` does and compresses the
+body with every available encoder and a few levels, whole and in streamed 16 KiB chunks.
+
+    python -m benchmarks.bench_compression [contacts]
+"""
+import sys
+import time
+from datetime import date
+
+from pydantic import TypeAdapter
+
+from src.schemas import ContactResponse
+from src.services.compression import available_encoders
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 11), "zstd": (1, 3, 19)}
+CHUNK = 16 * 1024
+
+
+def payload(count: int) -> bytes:
+    contacts = [ContactResponse(id=i, name=f"Name{i}", surname=f"Surname{i % 300}", email=f"contact{i}@example.com",
+                                phone=f"+38096{i:07d}", birthday=date(1990, i % 12 + 1, i % 28 + 1),
+                                notes="Met at the conference, prefers email")
+                for i in range(count)]
+    return TypeAdapter(list[ContactResponse]).dump_json(contacts)
+
+
+def measure(encoder_class, level: int, body: bytes, streamed: bool):
+    start = time.perf_counter()
+    encoder = encoder_class(level)
+    if streamed:
+        out = b"".join(encoder.compress(body[i:i + CHUNK]) + encoder.flush() for i in range(0, len(body), CHUNK))
+        out += encoder.finish()
+    else:
+        out = encoder.compress(body) + encoder.finish()
+    return time.perf_counter() - start, len(out)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    body = payload(count)
+    print(f"{count} contacts, {len(body)} bytes uncompressed")
+    print(f"{'encoder':<8}{'level':>6}{'mode':>10}{'ms':>10}{'bytes':>12}{'ratio':>8}{'MB/s':>9}")
+    for name, encoder_class in available_encoders().items():
+        for level in LEVELS[name]:
+            for streamed in (False, True):
+                seconds, size = measure(encoder_class, level, body, streamed)
+                print(f"{name:<8}{level:>6}{'stream' if streamed else 'whole':>10}{seconds * 1000:>10.2f}"
+                      f"{size:>12}{len(body) / size:>8.1f}{len(body) / seconds / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
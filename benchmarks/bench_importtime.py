@@ -0,0 +1,60 @@
+"""
+Import-time report of the application, as a cold-start budget.
+
+Runs ``python -X importtime -c "import main"`` a few times in fresh interpreters,
+prints the slowest modules of the fastest run and fails when importing ``main`` takes
+longer than ``BENCH_IMPORT_BUDGET`` seconds or pulls in an integration that must only
+be loaded on first use.
+
+    python -m benchmarks.bench_importtime
+"""
+import os
+import subprocess
+import sys
+
+RUNS = int(os.environ.get("BENCH_RUNS", 5))
+TOP = int(os.environ.get("BENCH_TOP", 15))
+BUDGET = float(os.environ.get("BENCH_IMPORT_BUDGET", 1.5))
+
+# Loaded by the first request that needs them, never by ``import main``.
+LAZY_MODULES = ("cloudinary", "fastapi_mail", "libgravatar", "passlib", "aiosmtplib", "asyncpg")
+
+
+def import_times() -> dict[str, tuple[int, int]]:
+    """
+    Self and cumulative import time in microseconds of every module imported by ``main``.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main() -> int:
+    runs = [import_times() for _ in range(RUNS)]
+    times = min(runs, key=lambda run: run["main"][1])
+    total = times["main"][1] / 1e6
+
+    print(f"{'module':<50} {'self ms':>9} {'cumulative ms':>14}")
+    for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda item: -item[1][0])[:TOP]:
+        print(f"{name:<50} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+    print(f"\nimport main: {total:.3f}s (budget {BUDGET:.3f}s, best of {RUNS})")
+
+    failed = False
+    eager = sorted(name for name in times if name.split(".")[0] in LAZY_MODULES and "." not in name)
+    if eager:
+        print(f"imported eagerly: {', '.join(eager)}")
+        failed = True
+    if total > BUDGET:
+        print("over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+``GET /main/contacts`` and ``GET /main/contact/{elem}`` for an account of ``BENCH_CONTACTS``
+contacts, with the response built by the ORM and Pydantic (the default) and by the
+database (``config.contacts_json_aggregation``).
+
+Requests go through the whole application in process, authentication excepted.
+Set ``BENCH_DATABASE_URL`` to an asyncpg URL to measure PostgreSQL; the tables are
+created in a ``bench_json`` schema, dropped afterwards. Otherwise an in-memory
+SQLite database is used.
+
+    python -m benchmarks.bench_json_agg
+"""
+import asyncio
+import logging
+import os
+import statistics
+import time
+from datetime import date, timedelta
+
+import httpx
+from sqlalchemy import insert, make_url, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from main import app
+from src.conf.config import config
+from src.database.db import Base, get_db, unit_of_work
+from src.database.model import Contact, User
+from src.services.auth import auth_service
+from src.services.principal import Principal
+
+URL = os.environ.get("BENCH_DATABASE_URL", "sqlite+aiosqlite://")
+CONTACTS = int(os.environ.get("BENCH_CONTACTS", 10000))
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", 30))
+SCHEMA = "bench_json"
+
+
+def engine_for(url):
+    if make_url(url).get_driver_name() == "asyncpg":
+        return create_async_engine(url, connect_args={"server_settings": {"search_path": SCHEMA}})
+    return create_async_engine(url, poolclass=StaticPool)
+
+
+async def setup(engine, postgres):
+    async with engine.begin() as conn:
+        if postgres:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [{"id": 1, "username": "bench", "email": "bench@example.com",
+                                           "password": "x", "confirmed": True}])
+        await conn.execute(insert(Contact), [
+            {"name": f"Name{i}", "surname": f"Surname{i % 500}", "email": f"contact{i}@example.com",
+             "phone": f"+380{i:09d}", "email_normalized": f"contact{i}@example.com",
+             "phone_normalized": f"+380{i:09d}", "birthday": date(1970, 1, 1) + timedelta(days=i % 15000),
+             "notes": "Met at the conference", "user_id": 1}
+            for i in range(CONTACTS)
+        ])
+
+
+async def measure(client, path):
+    latencies = []
+    size = 0
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        response = await client.get(path)
+        latencies.append((time.perf_counter() - start) * 1e3)
+        response.raise_for_status()
+        size = len(response.content)
+    return statistics.median(latencies), min(latencies), size
+
+
+async def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    postgres = make_url(URL).get_driver_name() == "asyncpg"
+    engine = engine_for(URL)
+    await setup(engine, postgres)
+    app.dependency_overrides[get_db] = unit_of_work(async_sessionmaker(engine, expire_on_commit=False))
+    app.dependency_overrides[auth_service.get_current_user] = \
+        lambda: Principal(1, "bench@example.com", "bench", None, True)
+    # Lift the route deadlines: serializing 10k contacts through Pydantic may not fit in the search budget.
+    for route in app.routes:
+        if hasattr(route, "budget"):
+            route.budget = 600
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"{CONTACTS} contacts, {make_url(URL).get_backend_name()}")
+            print(f"{'endpoint':<22} {'mode':<22} {'p50 ms':>8} {'min ms':>8} {'bytes':>9}")
+            for path in ("/main/contacts", "/main/contact/Surname1"):
+                for aggregation in (False, True):
+                    config.contacts_json_aggregation = aggregation
+                    await measure(client, path)
+                    p50, best, size = await measure(client, path)
+                    mode = "database JSON" if aggregation else "ORM + Pydantic"
+                    print(f"{path:<22} {mode:<22} {p50:8.2f} {best:8.2f} {size:9d}")
+    finally:
+        if postgres:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+Logging overhead per request under load: synchronous handler vs. the queue handler of :mod:`src.services.log`.
+
+``BENCH_CONCURRENCY`` simulated requests run at a time on one event loop, each logging
+``BENCH_RECORDS`` records (plus debug records, sampled away by default) between awaits.
+Records go to a file flushed after every line, like a container's stdout pipe. The
+time of each request is measured on the loop, so time spent writing logs shows up as
+latency of every request sharing the loop.
+
+    python -m benchmarks.bench_logging
+"""
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from src.services.log import JsonFormatter, RequestIdFilter, setup_logging
+
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", 5000))
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", 100))
+RECORDS = int(os.environ.get("BENCH_RECORDS", 5))
+DEBUG_RECORDS = int(os.environ.get("BENCH_DEBUG_RECORDS", 20))
+
+logger = logging.getLogger("bench")
+
+
+async def request(i, latencies):
+    start = time.perf_counter()
+    for n in range(RECORDS):
+        logger.info("request %s step %s", i, n, extra={"user_id": i % 100})
+        for _ in range(DEBUG_RECORDS // RECORDS):
+            logger.debug("row %s", n)
+        await asyncio.sleep(0)
+    latencies.append(time.perf_counter() - start)
+
+
+async def load():
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def limited(i):
+        async with semaphore:
+            await request(i, latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(REQUESTS)))
+    return time.perf_counter() - start, latencies
+
+
+def report(label, elapsed, latencies):
+    latencies.sort()
+    print(f"{label:<34} {elapsed / REQUESTS * 1e6:8.1f} us/request  "
+          f"p50 {statistics.median(latencies) * 1e3:7.2f} ms  p99 {latencies[int(len(latencies) * 0.99)] * 1e3:7.2f} ms")
+
+
+def main():
+    root = logging.getLogger()
+    with tempfile.TemporaryFile("w") as output:
+        report("no logging", *asyncio.run(load()))
+
+        handler = logging.StreamHandler(output)
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(RequestIdFilter())
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+        report("synchronous, every debug record", *asyncio.run(load()))
+        root.removeHandler(handler)
+
+        listener = setup_logging("DEBUG", json_output=True, sample_rate=1.0, stream=output)
+        report("queue, every debug record", *asyncio.run(load()))
+        listener.stop()
+
+        listener = setup_logging("DEBUG", json_output=True, stream=output)
+        report("queue, debug records sampled", *asyncio.run(load()))
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
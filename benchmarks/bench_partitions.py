@@ -0,0 +1,109 @@
+"""
+Per-user contact query latency on a plain vs. a hash-partitioned contacts table.
+
+Needs PostgreSQL: set ``BENCH_DATABASE_URL`` to an asyncpg URL of a scratch database.
+Two tables with the layout of ``contacts`` are generated in the ``bench_partitions``
+schema (dropped afterwards) with ``BENCH_USERS`` users of ``BENCH_CONTACTS`` contacts
+each, then the hot per-user queries of :mod:`src.repository.contacts` are timed for
+random users, and the plan of one of them shows how many partitions it touches.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_partitions
+"""
+import asyncio
+import os
+import random
+import re
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+URL = os.environ.get("BENCH_DATABASE_URL")
+USERS = int(os.environ.get("BENCH_USERS", 20000))
+CONTACTS = int(os.environ.get("BENCH_CONTACTS", 100))
+PARTITIONS = int(os.environ.get("BENCH_PARTITIONS", 16))
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", 2000))
+
+COLUMNS = """
+    id integer NOT NULL, name varchar(100) NOT NULL, surname varchar(100) NOT NULL,
+    email varchar(150) NOT NULL, phone varchar(20) NOT NULL, email_normalized varchar(150) NOT NULL,
+    phone_normalized varchar(20) NOT NULL, birthday date NOT NULL, notes varchar(500),
+    created_at timestamp, updated_at timestamp, user_id integer NOT NULL
+"""
+
+QUERIES = {
+    "contacts of a user": "SELECT * FROM {table} WHERE user_id = $1",
+    "one contact of a user": "SELECT * FROM {table} WHERE user_id = $1 AND id = $2",
+    "changed since": "SELECT * FROM {table} WHERE user_id = $1 AND updated_at > now() - interval '1 day'",
+}
+
+
+async def setup(conn):
+    await conn.execute(text("DROP SCHEMA IF EXISTS bench_partitions CASCADE"))
+    await conn.execute(text("CREATE SCHEMA bench_partitions"))
+    await conn.execute(text(f"CREATE TABLE bench_partitions.plain ({COLUMNS}, PRIMARY KEY (id))"))
+    await conn.execute(text(f"CREATE TABLE bench_partitions.hashed ({COLUMNS}, PRIMARY KEY (id, user_id)) "
+                            "PARTITION BY HASH (user_id)"))
+    for remainder in range(PARTITIONS):
+        await conn.execute(text(f"CREATE TABLE bench_partitions.hashed_p{remainder} PARTITION OF "
+                                f"bench_partitions.hashed FOR VALUES WITH (MODULUS {PARTITIONS}, "
+                                f"REMAINDER {remainder})"))
+    for table in ("plain", "hashed"):
+        # Rows are inserted in id order, as in production: a user's contacts are spread over the heap.
+        await conn.execute(text(f"""
+            INSERT INTO bench_partitions.{table}
+            SELECT n, 'Name' || n, 'Surname', 'c' || n || '@example.com', n::text, 'c' || n || '@example.com',
+                   '+380' || n, date '1970-01-01' + (n % 15000), NULL, now() - (n % 1000) * interval '1 hour',
+                   now() - (n % 1000) * interval '1 hour', 1 + (n % {USERS})
+            FROM generate_series(1, {USERS * CONTACTS}) AS n
+        """))
+        await conn.execute(text(f"CREATE INDEX ON bench_partitions.{table} (user_id, updated_at)"))
+        await conn.execute(text(f"ANALYZE bench_partitions.{table}"))
+
+
+async def measure(conn, table, sql):
+    driver = await conn.get_raw_connection()
+    statement = await driver.driver_connection.prepare(sql.format(table=f"bench_partitions.{table}"))
+    latencies = []
+    for _ in range(ITERATIONS):
+        user_id = random.randint(1, USERS)
+        contact_id = user_id - 1 + USERS * random.randrange(1, CONTACTS)
+        args = (user_id, contact_id)[:len(statement.get_parameters())]
+        start = time.perf_counter()
+        await statement.fetch(*args)
+        latencies.append((time.perf_counter() - start) * 1e3)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95)]
+
+
+async def partitions_scanned(conn, table):
+    plan = (await conn.execute(text(f"EXPLAIN (ANALYZE, COSTS OFF) SELECT * FROM bench_partitions.{table} "
+                                    "WHERE user_id = 42"))).scalars().all()
+    return len({match for line in plan for match in re.findall(r" on ((?:plain|hashed)(?:_p\d+)?)\b", line)})
+
+
+async def main():
+    if not URL:
+        raise SystemExit("Set BENCH_DATABASE_URL to a PostgreSQL asyncpg URL")
+    engine = create_async_engine(URL)
+    try:
+        async with engine.begin() as conn:
+            print(f"Generating {USERS * CONTACTS} contacts of {USERS} users...")
+            await setup(conn)
+        async with engine.connect() as conn:
+            print(f"{'query':<25} {'table':<8} {'p50 ms':>8} {'p95 ms':>8}")
+            for label, sql in QUERIES.items():
+                for table in ("plain", "hashed"):
+                    p50, p95 = await measure(conn, table, sql)
+                    print(f"{label:<25} {table:<8} {p50:8.3f} {p95:8.3f}")
+            for table in ("plain", "hashed"):
+                print(f"{table}: tables scanned for one user: {await partitions_scanned(conn, table)}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP SCHEMA IF EXISTS bench_partitions CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+"""
+Memory and cache payload of the authenticated user: full ``User`` ORM instance vs. :class:`Principal`.
+
+For every request ``get_current_user`` turns the cached bytes back into a user. This
+measures, with tracemalloc, what one such user keeps allocated and the size of its
+cache entry, for the pickled ORM instance the auth cache used to hold and for the
+principal it holds now.
+
+    python -m benchmarks.bench_principal
+"""
+import os
+import pickle
+import time
+import tracemalloc
+
+from src.database.model import User
+from src.services.principal import Principal
+
+USERS = int(os.environ.get("BENCH_USERS", 10000))
+
+
+def orm_user(i):
+    return User(id=i, username=f"user{i}", email=f"user{i}@example.com", password="$2b$12$" + "x" * 53,
+                avatar=f"https://www.gravatar.com/avatar/{i:032x}", refresh_token="r" * 200, confirmed=True)
+
+
+def principal(i):
+    return Principal(i, f"user{i}@example.com", f"user{i}", f"https://www.gravatar.com/avatar/{i:032x}", True)
+
+
+def measure(label, payloads, loads):
+    tracemalloc.start()
+    start = time.perf_counter()
+    users = [loads(payload) for payload in payloads]
+    elapsed = time.perf_counter() - start
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = sum(len(payload) for payload in payloads) / len(payloads)
+    print(f"{label:<12} {size:8.0f} B/entry {allocated / len(users):8.0f} B/user {elapsed / len(users) * 1e6:8.2f} us/load")
+
+
+def main():
+    measure("User", [pickle.dumps(orm_user(i)) for i in range(USERS)], pickle.loads)
+    measure("Principal", [principal(i).dumps() for i in range(USERS)], Principal.loads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Per-request statement overhead of the hot user/contact lookups.
+
+Compares building a fresh ``select()`` on every call (the old route code) with the
+statements defined once in :mod:`src.repository`, with and without SQLAlchemy's
+compiled cache. Set ``BENCH_DATABASE_URL`` to a PostgreSQL asyncpg URL to also measure
+the prepared statement cache; otherwise an in-memory SQLite database is used.
+
+    python -m benchmarks.bench_statements
+"""
+import asyncio
+import os
+import time
+
+from sqlalchemy import select, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database.db import Base
+from src.database.model import Contact, User
+from src.repository.contacts import CONTACTS_BY_USER
+from src.repository.users import USER_BY_EMAIL
+
+URL = os.environ.get("BENCH_DATABASE_URL", "sqlite+aiosqlite://")
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", 5000))
+
+
+async def run(label, engine, build):
+    async with engine.connect() as conn:
+        for _ in range(100):
+            statement, params = build(0)
+            await conn.execute(statement, params)
+        start = time.perf_counter()
+        for i in range(ITERATIONS):
+            statement, params = build(i)
+            await conn.execute(statement, params)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed / ITERATIONS * 1e6:8.1f} us/query")
+
+
+async def main():
+    postgres = make_url(URL).get_driver_name() == "asyncpg"
+    engines = {
+        "no compiled cache": create_async_engine(URL, query_cache_size=0,
+                                                 **({"connect_args": {"prepared_statement_cache_size": 0}}
+                                                    if postgres else {})),
+        "compiled cache": create_async_engine(URL),
+    }
+    for name, engine in engines.items():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await run(f"ad-hoc user lookup, {name}", engine,
+                  lambda i: (select(User).filter(User.email == f"user{i}@example.com"), {}))
+        await run(f"USER_BY_EMAIL, {name}", engine,
+                  lambda i: (USER_BY_EMAIL, {"email": f"user{i}@example.com"}))
+        await run(f"ad-hoc contacts lookup, {name}", engine,
+                  lambda i: (select(Contact).filter(Contact.user_id == i), {}))
+        await run(f"CONTACTS_BY_USER, {name}", engine,
+                  lambda i: (CONTACTS_BY_USER, {"user_id": i}))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+Throughput of the production entry point with 1..N workers.
+
+Starts ``python main.py`` with ``WORKERS`` set to each count, waits for it to accept
+connections and measures requests per second with concurrent clients. Redis and the
+database from ``.env`` must be reachable, as for a normal start. By default the cheap
+``/openapi.json`` route is hit; set ``BENCH_EMAIL``/``BENCH_PASSWORD`` of a confirmed
+user to hit ``/auth/login`` instead, whose bcrypt check is CPU bound and shows the
+scaling across cores.
+
+    python -m benchmarks.bench_workers
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+PORT = int(os.environ.get("BENCH_PORT", 8765))
+DURATION = float(os.environ.get("BENCH_DURATION", 10))
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", 64))
+WORKER_COUNTS = [int(n) for n in os.environ.get("BENCH_WORKERS", f"1,2,{os.cpu_count()}").split(",")]
+
+
+async def request(client):
+    email = os.environ.get("BENCH_EMAIL")
+    if email:
+        response = await client.post("/auth/login", data={"username": email,
+                                                          "password": os.environ["BENCH_PASSWORD"]})
+    else:
+        response = await client.get("/openapi.json")
+    response.raise_for_status()
+
+
+async def load():
+    done = 0
+    deadline = time.perf_counter() + DURATION
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=30) as client:
+        async def worker():
+            nonlocal done
+            while time.perf_counter() < deadline:
+                await request(client)
+                done += 1
+        await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return done / DURATION
+
+
+async def wait_ready():
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}") as client:
+        for _ in range(100):
+            try:
+                await client.get("/openapi.json")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    baseline = None
+    for workers in WORKER_COUNTS:
+        env = dict(os.environ, WORKERS=str(workers), PORT=str(PORT))
+        server = subprocess.Popen([sys.executable, "main.py"], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            asyncio.run(wait_ready())
+            rps = asyncio.run(load())
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or rps
+        print(f"{workers:>3} workers: {rps:10.1f} req/s  ({rps / baseline:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
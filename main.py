@@ -1,19 +1,26 @@
 from fastapi import FastAPI,Request,status
 from ipaddress import ip_address
-from fastapi.staticfiles import StaticFiles
-from src.routes import contacts,auth,users
-import uvicorn
+from src.routes import contacts,auth,users,metrics
 from fastapi.responses import JSONResponse
 from typing import Callable
 import re
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_limiter import FastAPILimiter
 from src.conf.config import config
-import redis.asyncio as redis
+from src.services.lifecycle import lifespan, InFlightMiddleware, in_flight
+from src.conf.server import run
+from src.services.static import CachedStaticFiles
+from src.services.compression import CompressionMiddleware
+from src.services.admission import AdmissionMiddleware
+from src.services.log import RequestIdMiddleware
+from src.services.tracing import TracingMiddleware
 import os
 
-app= FastAPI()
+app= FastAPI(lifespan=lifespan)
 
+# Middleware added last runs first. Admission sits inside CORS so that load-shed 503s
+# carry CORS headers and browsers can read them.
+if config.admission_enabled:
+    app.add_middleware(AdmissionMiddleware, retry_after=config.admission_retry_after)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -21,6 +28,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=config.compression_minimum_size,
+                   levels={"gzip": config.compression_gzip_level, "br": config.compression_brotli_quality,
+                           "zstd": config.compression_zstd_level})
+app.add_middleware(InFlightMiddleware, tracker=in_flight)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 # ALLOWED_IPS = [ip_address('192.168.1.0'), ip_address('172.16.0.0'), ip_address("127.0.0.1")]
 
@@ -64,19 +77,15 @@ app.add_middleware(
 #     response = await call_next(request)
 #     return response
 
-app.mount("/static", StaticFiles(directory="src/static"), name="static")
+app.mount("/static", CachedStaticFiles("src/static", max_age=config.static_max_age,
+                                       memory_limit=config.static_memory_limit), name="static")
 
 app.include_router(contacts.router)
 app.include_router(auth.router)
 app.include_router(users.router)
-
-@app.on_event("startup")
-async def startup():
-    r = await redis.Redis(host=config.redis_host, port=config.redis_port, db=0, encoding="utf-8",
-                          password=config.redis_password)
-    await FastAPILimiter.init(r)
+app.include_router(metrics.router)
 
 if __name__ == '__main__':
-    uvicorn.run("main:app", host="0.0.0.0",port=int(os.environ.get("PORT")), log_level="info")
+    run()
 
 #port=int(os.environ.get("PORT"))
\ No newline at end of file
@@ -16,6 +16,83 @@ class Settings(BaseSettings):
     cloudinary_name: str ="cloudinary_name"
     cloudinary_api_key: str ="1234"
     cloudinary_api_secret: str="24354"
+    db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    db_warmup_connections: int = 5
+    db_query_cache_size: int = 1200
+    db_prepared_statement_cache_size: int = 500
+    db_statement_timeout: int = 5000
+    db_read_statement_timeout: int = 2000
+    request_deadline: float = 10.0
+    search_deadline: float = 2.0
+    mail_timeout: int = 10
+    redis_warmup_connections: int = 2
+    redis_max_connections: int = 50
+    redis_socket_timeout: float = 0.5
+    redis_connect_timeout: float = 0.5
+    redis_pool_timeout: float = 0.5
+    redis_health_check_interval: int = 30
+    redis_breaker_threshold: int = 5
+    redis_breaker_reset: float = 10.0
+    cache_prefix: str = "rest-app"
+    user_cache_ttl: int = 900
+    cache_ttl_jitter: float = 0.1
+    cache_early_refresh_beta: float = 1.0
+    cache_lock_enabled: bool = True
+    cache_lock_timeout: float = 2.0
+    cache_lock_wait: float = 0.5
+    shutdown_drain_timeout: float = 10.0
+    log_level: str = "INFO"
+    log_json: bool = True
+    log_sample_rate: float = 0.01
+    log_sampled_loggers: tuple[str, ...] = ("sqlalchemy.engine",)
+    tracing_enabled: bool = False
+    tracing_exporter: str = "log"
+    tracing_sample_rate: float = 0.01
+    tracing_file: str = "traces.jsonl"
+    tracing_endpoint: str = "http://localhost:4318/v1/traces"
+    tracing_service_name: str = "rest-app"
+    admission_enabled: bool = True
+    admission_auth_limit: int = 4
+    admission_read_limit: int = 32
+    admission_write_limit: int = 8
+    admission_queue_size: int = 64
+    admission_queue_timeout: float = 2.0
+    admission_target: float = 0.1
+    admission_interval: float = 1.0
+    admission_retry_after: int = 1
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 0
+    keep_alive: int = 5
+    backlog: int = 2048
+    limit_concurrency: int | None = None
+    static_max_age: int = 86400
+    static_memory_limit: int = 1024 * 1024
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
+    refresh_token_store: str = "redis"
+    sync_overlap_seconds: int = 5
+    batch_max_operations: int = 500
+    jobs_chunk_size: int = 1000
+    jobs_concurrency: int = 10
+    birthday_reminder_hour: int = 8
+    birthday_reminder_days_ahead: int = 1
+    phone_country_code: str = "380"
+    stats_recent_limit: int = 5
+    contacts_json_aggregation: bool = False
+    counters_reconcile_hour: int = 3
+    signup_filter_capacity: int = 1_000_000
+    signup_filter_error_rate: float = 0.01
+    signup_filter_rebuild_hour: int = 4
+    outbox_batch_size: int = 500
+    outbox_poll_interval: float = 1.0
+    outbox_publish_timeout: float = 2.0
+    outbox_stream_shards: int = 16
+    outbox_stream_maxlen: int = 1000000
 
     model_config = ConfigDict(extra= 'ignore', env_file = ".env",env_file_encoding = "utf-8")
 
@@ -0,0 +1,55 @@
+import importlib.util
+import os
+
+import uvicorn
+
+from src.conf.config import config
+
+
+def worker_count(settings=config) -> int:
+    """
+    Number of worker processes to run.
+
+    :param settings: Application settings.
+    :type settings: Settings
+    :return: ``settings.workers`` or the CPU count when it is not set.
+    :rtype: int
+    """
+    return settings.workers if settings.workers > 0 else os.cpu_count() or 1
+
+
+def uvicorn_options(settings=config) -> dict:
+    """
+    Build the keyword arguments for :func:`uvicorn.run` from the settings.
+
+    uvloop and httptools are used when they are installed.
+
+    :param settings: Application settings.
+    :type settings: Settings
+    :return: Options for uvicorn.
+    :rtype: dict
+    """
+    return dict(
+        host=settings.host,
+        port=settings.port,
+        workers=worker_count(settings),
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        timeout_keep_alive=settings.keep_alive,
+        backlog=settings.backlog,
+        limit_concurrency=settings.limit_concurrency,
+        timeout_graceful_shutdown=int(settings.shutdown_drain_timeout),
+        log_level=settings.log_level.lower(),
+        # Logging is set up by the application (see src.services.log), not by uvicorn.
+        log_config=None,
+    )
+
+
+def run():
+    """
+    Serve ``main:app`` with one process per worker.
+
+    Every worker imports the application itself, so each process owns its engine
+    and Redis pools; nothing created in the supervisor is shared.
+    """
+    uvicorn.run("main:app", **uvicorn_options())
@@ -1,28 +1,236 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from functools import cached_property
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy import text, make_url
 from src.conf.config import config
+from src.services.tracing import instrument_engine
 
 
 class Base(DeclarativeBase):
     pass
 
 class DatabaseSessionManager:
-    def __init__(self, url: str):
-        self._engine = create_async_engine(url, echo=True, max_overflow=5)
-        self._session_maker = sessionmaker(self._engine, expire_on_commit=False, class_=AsyncSession)
+    def __init__(self, url: str, **engine_options):
+        self._url = url
+        self._options = dict(echo=config.db_echo, pool_size=config.db_pool_size, max_overflow=config.db_max_overflow,
+                             pool_pre_ping=True, query_cache_size=config.db_query_cache_size)
+        if make_url(url).get_driver_name() == "asyncpg":
+            self._options["connect_args"] = {"prepared_statement_cache_size": config.db_prepared_statement_cache_size}
+        self._options.update(engine_options)
+
+    @cached_property
+    def _engine(self):
+        # Created on first use, so importing the app doesn't load the DB driver or build a pool.
+        engine = create_async_engine(self._url, **self._options)
+        instrument_engine(engine.sync_engine)
+        return engine
+
+    @cached_property
+    def _session_maker(self):
+        return sessionmaker(self._engine, expire_on_commit=False, class_=AsyncSession)
+
+    def session_factory(self) -> AsyncSession:
+        return self._session_maker()
 
     async def session(self):
         async with self._session_maker() as session:
             try:
                 yield session
-            except Exception as err:
+            except Exception:
                 await session.rollback()
-            finally:
-                await session.close()
+                raise
+
+    async def warm_up(self, connections: int, statements=()):
+        """
+        Open pool connections ahead of traffic and prepare statements on each of them.
+
+        All connections are checked out at the same time, so the pool really ends up
+        holding ``connections`` distinct sockets instead of reusing the first one.
+
+        :param connections: Number of connections to open.
+        :type connections: int
+        :param statements: ``(statement, parameters)`` pairs executed on every connection so that
+            the driver prepares them.
+        :type statements: Iterable[tuple]
+        :return: Number of connections that were opened.
+        :rtype: int
+        """
+        results = await asyncio.gather(*(self._engine.connect().start() for _ in range(connections)),
+                                       return_exceptions=True)
+        opened = [conn for conn in results if not isinstance(conn, BaseException)]
+        try:
+            for conn in opened:
+                await conn.execute(text("SELECT 1"))
+                for statement, parameters in statements:
+                    await conn.execute(statement, parameters)
+                await conn.rollback()
+        finally:
+            await asyncio.gather(*(conn.close() for conn in opened))
+        errors = [err for err in results if isinstance(err, BaseException)]
+        if errors:
+            raise errors[0]
+        return len(opened)
+
+    async def close(self):
+        """
+        Close every pooled connection.
+        """
+        if "_engine" in self.__dict__:
+            await self._engine.dispose()
+
+    def reset_after_fork(self):
+        """
+        Drop connections inherited from the parent process without closing them,
+        so a forked worker (e.g. a preloading server) opens its own.
+        """
+        if "_engine" in self.__dict__:
+            self._engine.sync_engine.dispose(close=False)
 
 sessionmanager = DatabaseSessionManager(config.sqlalchemy_database_url)
-engine = create_async_engine(config.sqlalchemy_database_url)
 
-async def get_db() -> AsyncSession:
-    async for session in sessionmanager.session():
-        yield session
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=sessionmanager.reset_after_fork)
+
+
+
+@dataclass(frozen=True)
+class TransactionOptions:
+    read_only: bool = False
+    statement_timeout: int | None = None
+
+
+def transaction(read_only: bool = False, statement_timeout: int | None = None):
+    """
+    Route dependency setting the options of the request's transaction.
+
+    Example: ``dependencies=[Depends(transaction(read_only=True, statement_timeout=2000))]``.
+
+    :param read_only: Run the transaction as ``READ ONLY``.
+    :type read_only: bool
+    :param statement_timeout: Longest a statement may run, in milliseconds; defaults to
+        ``config.db_statement_timeout``.
+    :type statement_timeout: int | None
+    :return: The dependency.
+    """
+    options = TransactionOptions(read_only, statement_timeout)
+
+    async def set_transaction(request: Request):
+        request.state.transaction = options
+
+    return set_transaction
+
+
+async def begin(session: AsyncSession, options: TransactionOptions, deadline=None) -> None:
+    """
+    Start the transaction of ``session`` with ``options`` (PostgreSQL only; other databases ignore them).
+
+    :param session: The database session.
+    :type session: AsyncSession
+    :param options: Transaction options.
+    :type options: TransactionOptions
+    :param deadline: Deadline of the request; statements may not run past it.
+    :type deadline: Deadline | None
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    if options.read_only:
+        await session.execute(text("SET TRANSACTION READ ONLY"))
+    timeout = options.statement_timeout or config.db_statement_timeout
+    if deadline is not None:
+        timeout = max(min(timeout or float("inf"), deadline.remaining() * 1000), 1)
+    if timeout:
+        await session.execute(text(f"SET LOCAL statement_timeout = {int(timeout)}"))
+
+
+def unit_of_work(session_factory):
+    """
+    Build a session dependency running each request in one transaction.
+
+    The transaction is started with the options set by :func:`transaction`, committed
+    by :class:`UnitOfWorkRoute` before the response is sent, and rolled back when the
+    request fails; the error is re-raised.
+
+    :param session_factory: Callable returning a new :class:`AsyncSession`.
+    :return: The dependency.
+    """
+    async def get_db(request: Request) -> AsyncSession:
+        async with session_factory() as session:
+            try:
+                await begin(session, getattr(request.state, "transaction", None) or TransactionOptions(),
+                            getattr(request.state, "deadline", None))
+                request.state.db = session
+                yield session
+            except Exception:
+                await session.rollback()
+                raise
+
+    return get_db
+
+
+get_db = unit_of_work(sessionmanager.session_factory)
+
+
+def after_commit(session: AsyncSession, callback) -> None:
+    """
+    Run ``callback()`` once the request's transaction is committed, e.g. to drop cache
+    entries of the rows it changed: dropped earlier, a concurrent request could cache
+    the old rows again before the commit. Nothing runs if the transaction fails.
+
+    :param session: The database session of the request.
+    :type session: AsyncSession
+    :param callback: Coroutine function without arguments.
+    """
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+async def commit_request(request: Request) -> None:
+    """
+    Commit the transaction of the request, if it opened one, then run its
+    :func:`after_commit` callbacks.
+
+    :param request: HTTP request.
+    :type request: Request
+    """
+    session = getattr(request.state, "db", None)
+    if session is None:
+        return
+    if session.in_transaction():
+        await session.commit()
+    for callback in session.info.pop("after_commit", []):
+        await callback()
+
+
+class UnitOfWorkRoute(APIRoute):
+    """
+    Route committing the request's transaction once the endpoint succeeded, before
+    the response is sent, so a failing commit turns into an error response.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            try:
+                response = await self.call_endpoint(handler, request)
+            except HTTPException as exc:
+                # Some endpoints report success by raising (e.g. 201 "created").
+                if exc.status_code < 400:
+                    await commit_request(request)
+                raise
+            await commit_request(request)
+            return response
+
+        return route_handler
+
+    async def call_endpoint(self, handler, request: Request) -> Response:
+        """
+        Run the endpoint (with its dependencies); the commit follows it.
+        """
+        return await handler(request)
@@ -1,4 +1,4 @@
-from sqlalchemy import  Integer, String, Date,func,DateTime,ForeignKey,Boolean
+from sqlalchemy import  Integer, String, Date,func,DateTime,ForeignKey,Boolean,Index,JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import date
 from .db import Base
@@ -9,16 +9,58 @@ class Contact(Base):
     id:Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name:Mapped[str] = mapped_column(String(100), nullable=False)
     surname:Mapped[str] = mapped_column(String(100), nullable=False)
-    email:Mapped[str] = mapped_column(String(150),unique=True, nullable=False)
-    phone:Mapped[str] = mapped_column(String(20),unique=True,nullable=False)
+    email:Mapped[str] = mapped_column(String(150), nullable=False)
+    phone:Mapped[str] = mapped_column(String(20),nullable=False)
+    email_normalized:Mapped[str] = mapped_column(String(150), nullable=False)
+    phone_normalized:Mapped[str] = mapped_column(String(20), nullable=False)
     birthday:Mapped[Date] = mapped_column(Date,nullable=False)
     notes:Mapped[str] = mapped_column(String(500),nullable=True)
     created_at:Mapped[date] = mapped_column('created_at', DateTime, default=func.now())
     updated_at:Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now())
     user : Mapped["User"] = relationship('User',backref='contacts')
-    user_id:Mapped[int]=mapped_column(Integer,ForeignKey('users.id'),nullable=True)
+    user_id:Mapped[int]=mapped_column(Integer,ForeignKey('users.id'),nullable=False)
+
+    __table_args__ = (Index('ix_contacts_user_id_updated_at', 'user_id', 'updated_at'),
+                      Index('ux_contacts_user_id_email_normalized', 'user_id', 'email_normalized', unique=True),
+                      Index('ux_contacts_user_id_phone_normalized', 'user_id', 'phone_normalized', unique=True))
+    # On PostgreSQL the table is hash-partitioned by user_id with primary key (id, user_id)
+    # (migration d7a3b5c1e902). Mapping both columns as the identity makes the ORM's UPDATE
+    # and DELETE filter on user_id, so they touch a single partition.
+    __mapper_args__ = {"primary_key": [id, user_id]}
+
+
+class ContactTombstone(Base):
+    __tablename__ = 'contact_tombstones'
+
+    id:Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    contact_id:Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id:Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
+    deleted_at:Mapped[date] = mapped_column('deleted_at', DateTime, default=func.now())
+
+    __table_args__ = (Index('ix_contact_tombstones_user_id_deleted_at', 'user_id', 'deleted_at'),)
+
+
+class ContactCounter(Base):
+    __tablename__ = 'contact_counters'
+
+    # bucket 0 counts every contact of the user, buckets 1-12 the contacts born in that month.
+    user_id:Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), primary_key=True)
+    bucket:Mapped[int] = mapped_column(Integer, primary_key=True)
+    count:Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class ContactEvent(Base):
+    # Transactional outbox: written with the contact change, published to Redis Streams by src.jobs.outbox.
+    __tablename__ = 'contact_events'
+
+    id:Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id:Mapped[int] = mapped_column(Integer, nullable=False)
+    contact_id:Mapped[int] = mapped_column(Integer, nullable=False)
+    event:Mapped[str] = mapped_column(String(20), nullable=False)
+    payload:Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at:Mapped[date] = mapped_column('created_at', DateTime, default=func.now())
+
 
-    
 class User(Base):
     __tablename__ = "users"
     id:Mapped[int] = mapped_column(Integer, primary_key=True)
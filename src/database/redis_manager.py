@@ -0,0 +1,227 @@
+import asyncio
+import os
+import time
+from functools import cached_property
+
+import redis.asyncio as redis
+from redis.exceptions import ConnectionError, RedisError, TimeoutError
+
+from src.conf.config import config
+from src.services.deadlines import timeout_for
+from src.services.tracing import span
+
+
+class CircuitOpen(ConnectionError):
+    """
+    Redis failed too often recently; the call was not attempted. Handled like a
+    connection error: callers fall back, routes answer 503.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stop calling Redis after ``threshold`` consecutive failures.
+
+    While open every call fails immediately. After ``reset_timeout`` seconds a single
+    trial call is let through: a success closes the breaker, a failure keeps it open
+    for another ``reset_timeout``.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """
+        Whether a call may be attempted now.
+
+        :return: True when closed or when a trial call is due.
+        :rtype: bool
+        """
+        if self.opened_at is None:
+            return True
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            self.opened_at = self.clock()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = self.clock()
+
+
+class SafeConnection(redis.Connection):
+    """
+    Connection closed when a command on it is cancelled or times out mid-flight.
+
+    The reply of an interrupted command may still arrive; if the connection went back
+    to the pool, the next command on it would read that reply instead of its own (and
+    possibly another user's data). Dropping the socket discards it.
+    """
+
+    async def send_packed_command(self, *args, **kwargs):
+        try:
+            return await super().send_packed_command(*args, **kwargs)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            await self.disconnect(nowait=True)
+            raise
+
+    async def read_response(self, *args, **kwargs):
+        try:
+            return await super().read_response(*args, **kwargs)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            await self.disconnect(nowait=True)
+            raise
+
+
+class RedisManager:
+    """
+    The one async Redis connection pool of the process, shared by the auth cache,
+    the refresh token store, the rate limiter and the background jobs.
+
+    Commands sent through :meth:`call` (and the helpers built on it) get a deadline and
+    go through a :class:`CircuitBreaker`, so a degraded Redis raises a
+    :class:`~redis.exceptions.RedisError` quickly and callers can fall back to the
+    database. A command interrupted by its deadline closes its connection (see
+    :class:`SafeConnection`). :attr:`client` exposes the raw client for libraries that need one.
+    """
+
+    def __init__(self, host: str, port: int, password: str | None = None, db: int = 0,
+                 max_connections: int = 50, socket_timeout: float = 0.5, connect_timeout: float = 0.5,
+                 pool_timeout: float = 0.5, health_check_interval: int = 30,
+                 breaker: CircuitBreaker | None = None):
+        self._pool_options = dict(host=host, port=port, password=password, db=db, max_connections=max_connections,
+                                  timeout=pool_timeout, socket_timeout=socket_timeout,
+                                  socket_connect_timeout=connect_timeout,
+                                  health_check_interval=health_check_interval)
+        self.command_timeout = socket_timeout
+        self.breaker = breaker or CircuitBreaker(5, 10.0)
+
+    @cached_property
+    def client(self) -> redis.Redis:
+        # A blocking pool waits up to ``pool_timeout`` for a free connection instead of
+        # opening an unbounded number of sockets under load.
+        return redis.Redis(connection_pool=redis.BlockingConnectionPool(connection_class=SafeConnection,
+                                                                        **self._pool_options))
+
+    async def call(self, operation, timeout: float | None = None, name: str = "redis"):
+        """
+        Run ``operation(client)`` with a deadline, through the circuit breaker.
+
+        :param operation: Function taking the client and returning an awaitable.
+        :param timeout: Deadline in seconds; defaults to the socket timeout, and never runs past
+            the deadline of the current request.
+        :type timeout: float | None
+        :param name: Name of the span tracing the call.
+        :type name: str
+        :return: Result of the operation.
+        :raises CircuitOpen: The breaker is open.
+        :raises RedisError: The command failed or timed out.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen("Redis circuit is open")
+        try:
+            with span(name, **{"db.system": "redis"}):
+                result = await asyncio.wait_for(operation(self.client), timeout_for(timeout or self.command_timeout))
+        except (ConnectionError, TimeoutError, OSError, asyncio.TimeoutError) as err:
+            self.breaker.record_failure()
+            if isinstance(err, RedisError):
+                raise
+            raise TimeoutError(str(err) or "Redis command timed out") from err
+        except RedisError:
+            # Redis answered: a command or script error is a bug of the caller, not an outage.
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def get(self, key: str, timeout: float | None = None):
+        return await self.call(lambda client: client.get(key), timeout, "redis GET")
+
+    async def set(self, key: str, value, ex: int | None = None, nx: bool = False, timeout: float | None = None):
+        return await self.call(lambda client: client.set(key, value, ex=ex, nx=nx), timeout, "redis SET")
+
+    async def expire(self, key: str, seconds: int, timeout: float | None = None):
+        return await self.call(lambda client: client.expire(key, seconds), timeout, "redis EXPIRE")
+
+    async def delete(self, *keys: str, timeout: float | None = None):
+        return await self.call(lambda client: client.delete(*keys), timeout, "redis DEL")
+
+    async def pipeline(self, build, transaction: bool = False, timeout: float | None = None) -> list:
+        """
+        Send several commands in one round trip.
+
+        Example: ``await redis_manager.pipeline(lambda pipe: pipe.get("a").get("b"))``.
+
+        :param build: Function queueing commands on the pipeline it receives.
+        :param transaction: Wrap the commands in MULTI/EXEC.
+        :type transaction: bool
+        :param timeout: Deadline in seconds for the whole pipeline.
+        :type timeout: float | None
+        :return: Results of the commands, in order.
+        :rtype: list
+        """
+        async def execute(client):
+            async with client.pipeline(transaction=transaction) as pipe:
+                build(pipe)
+                return await pipe.execute()
+
+        return await self.call(execute, timeout, "redis pipeline")
+
+    async def warm_up(self, connections: int) -> int:
+        """
+        Open connections in the pool ahead of traffic.
+
+        :param connections: Number of connections to open.
+        :type connections: int
+        :return: Number of connections that were opened.
+        :rtype: int
+        """
+        pool = self.client.connection_pool
+        opened = [await pool.get_connection("PING") for _ in range(connections)]
+        try:
+            for conn in opened:
+                await conn.send_command("PING")
+                await conn.read_response()
+        finally:
+            for conn in opened:
+                await pool.release(conn)
+        return len(opened)
+
+    async def close(self):
+        """
+        Close every pooled connection.
+        """
+        if "client" in self.__dict__:
+            await self.client.close()
+            await self.client.connection_pool.disconnect()
+
+    def reset_after_fork(self):
+        """
+        Forget the pool inherited from the parent process; the child opens its own.
+        """
+        self.__dict__.pop("client", None)
+
+
+redis_manager = RedisManager(config.redis_host, config.redis_port, config.redis_password,
+                             max_connections=config.redis_max_connections,
+                             socket_timeout=config.redis_socket_timeout,
+                             connect_timeout=config.redis_connect_timeout,
+                             pool_timeout=config.redis_pool_timeout,
+                             health_check_interval=config.redis_health_check_interval,
+                             breaker=CircuitBreaker(config.redis_breaker_threshold, config.redis_breaker_reset))
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=redis_manager.reset_after_fork)
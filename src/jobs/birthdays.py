@@ -0,0 +1,133 @@
+import asyncio
+import calendar
+import logging
+from datetime import date, timedelta
+
+from sqlalchemy import select, and_, or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.model import Contact, User
+from src.services import email as email_service
+
+logger = logging.getLogger(__name__)
+
+DONE = "done"
+
+
+def birthday_days(target: date) -> list[tuple[int, int]]:
+    """
+    (month, day) pairs whose birthdays fall on ``target``; 29 February birthdays
+    are celebrated on 28 February in common years.
+
+    :param target: Day of the birthdays.
+    :type target: date
+    :return: Matching (month, day) pairs.
+    :rtype: list[tuple[int, int]]
+    """
+    days = [(target.month, target.day)]
+    if (target.month, target.day) == (2, 28) and not calendar.isleap(target.year):
+        days.append((2, 29))
+    return days
+
+
+async def fetch_chunk(db: AsyncSession, target: date, after_id: int, size: int):
+    """
+    Next chunk of contacts having a birthday on ``target``, ordered by ID after ``after_id``.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param target: Day of the birthdays.
+    :type target: date
+    :param after_id: Keyset cursor: the last contact ID already processed.
+    :type after_id: int
+    :param size: Maximum number of rows.
+    :type size: int
+    :return: Rows with the contact and its owner.
+    """
+    on_target = or_(*(and_(func.extract('month', Contact.birthday) == month,
+                           func.extract('day', Contact.birthday) == day)
+                      for month, day in birthday_days(target)))
+    result = await db.execute(
+        select(Contact.id, Contact.name, Contact.surname, User.email, User.username)
+        .join(User, Contact.user_id == User.id)
+        .where(Contact.id > after_id, on_target)
+        .order_by(Contact.id)
+        .limit(size)
+    )
+    return result.all()
+
+
+async def send_reminders(rows, target: date, semaphore: asyncio.Semaphore) -> int:
+    """
+    Send one reminder per row, at most ``semaphore`` at a time.
+
+    :return: Number of reminders sent; failed ones are logged and not counted.
+    :rtype: int
+    """
+    async def send(row) -> bool:
+        async with semaphore:
+            try:
+                await email_service.send_birthday_reminder(row.email, row.username, f"{row.name} {row.surname}",
+                                                           target.isoformat())
+            except Exception as err:
+                logger.warning("Birthday reminder for contact %s failed: %s", row.id, err)
+                return False
+            return True
+
+    return sum(await asyncio.gather(*(send(row) for row in rows)))
+
+
+async def run_birthday_reminders(redis, session_factory, today: date, chunk_size: int = config.jobs_chunk_size,
+                                 concurrency: int = config.jobs_concurrency) -> tuple[int, int]:
+    """
+    Remind users of their contacts' birthdays ``config.birthday_reminder_days_ahead`` days from ``today``.
+
+    Contacts are read in chunks with a keyset cursor on their ID, each chunk in its own
+    short session, so the scan holds neither a connection nor a snapshot while emails
+    are sent and a run over millions of rows doesn't keep one transaction open. The cursor is
+    checkpointed in Redis after every chunk, so a crashed run resumes after the
+    last finished chunk (reminders of the interrupted chunk may be sent twice) and
+    a finished run is not repeated the same day. A Redis lock keeps concurrent
+    schedulers from running the job twice.
+
+    :param redis: The Redis manager (or a client with the same get/set/expire/delete methods).
+    :param session_factory: Callable returning a new :class:`AsyncSession`.
+    :param today: Day of the run.
+    :type today: date
+    :param chunk_size: Contacts read per query.
+    :type chunk_size: int
+    :param concurrency: Emails sent at the same time.
+    :type concurrency: int
+    :return: Numbers of reminders sent and of reminders that failed in this run.
+    :rtype: tuple[int, int]
+    """
+    checkpoint_key = f"jobs:birthdays:{today.isoformat()}"
+    lock_key = checkpoint_key + ":lock"
+    if not await redis.set(lock_key, 1, nx=True, ex=3600):
+        logger.info("Birthday reminders for %s are already running", today)
+        return 0, 0
+    try:
+        checkpoint = await redis.get(checkpoint_key)
+        if checkpoint is not None and checkpoint.decode() == DONE:
+            return 0, 0
+        cursor = int(checkpoint or 0)
+        target = today + timedelta(days=config.birthday_reminder_days_ahead)
+        semaphore = asyncio.Semaphore(concurrency)
+        sent = failed = 0
+        while True:
+            async with session_factory() as db:
+                rows = await fetch_chunk(db, target, cursor, chunk_size)
+            if not rows:
+                break
+            delivered = await send_reminders(rows, target, semaphore)
+            sent += delivered
+            failed += len(rows) - delivered
+            cursor = rows[-1].id
+            await redis.set(checkpoint_key, cursor, ex=2 * 86400)
+            await redis.expire(lock_key, 3600)
+        await redis.set(checkpoint_key, DONE, ex=2 * 86400)
+        logger.info("Sent %s birthday reminders for %s, %s failed", sent, target, failed)
+        return sent, failed
+    finally:
+        await redis.delete(lock_key)
@@ -0,0 +1,44 @@
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.model import User
+from src.repository import contacts as repository_contacts
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_all_counters(db: AsyncSession, chunk_size: int = config.jobs_chunk_size) -> int:
+    """
+    Correct the contact counters of every user from the contacts table.
+
+    Users are read in chunks with a keyset cursor on their ID and each user is
+    reconciled in its own short transaction, so counter rows are never locked for long.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param chunk_size: Users read per query.
+    :type chunk_size: int
+    :return: Number of buckets corrected.
+    :rtype: int
+    """
+    corrected = 0
+    cursor = 0
+    while True:
+        user_ids = (await db.execute(
+            select(User.id).where(User.id > cursor).order_by(User.id).limit(chunk_size)
+        )).scalars().all()
+        await db.commit()
+        if not user_ids:
+            break
+        for user_id in user_ids:
+            fixed = await repository_contacts.reconcile_counters(user_id, db)
+            await db.commit()
+            if fixed:
+                logger.warning("Corrected %s contact counters of user %s", fixed, user_id)
+            corrected += fixed
+        cursor = user_ids[-1]
+    logger.info("Contact counters reconciled, %s buckets corrected", corrected)
+    return corrected
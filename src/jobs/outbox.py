@@ -0,0 +1,186 @@
+"""
+Relay of the contact change outbox to Redis Streams.
+
+Every row of ``contact_events`` becomes one stream entry on
+``contacts:events:<shard>``, the shard being ``user_id % config.outbox_stream_shards``.
+All events of a user go to the same stream in outbox order. Writers hold
+:func:`~src.repository.contacts.lock_user_writes` while writing them, so a user's
+outbox order is the order of their commits and consumers see a user's changes in
+the order they were committed. Delivery is at least once: entries published right
+before a crash are published again, and consumers should dedupe on the
+``outbox_id`` field.
+"""
+import asyncio
+import json
+import logging
+import secrets
+
+from redis.exceptions import ResponseError
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.model import ContactEvent
+
+logger = logging.getLogger(__name__)
+
+STREAM_PREFIX = "contacts:events:"
+LOCK_KEY = "outbox:relay:lock"
+
+# Extend or release the relay lock only while it still holds this relay's token: after
+# a stall longer than its TTL the lock may belong to another relay.
+EXTEND_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end
+return 0
+"""
+RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+
+def stream_for(user_id: int) -> str:
+    """
+    Stream carrying the events of a user.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :return: Stream key.
+    :rtype: str
+    """
+    return f"{STREAM_PREFIX}{user_id % config.outbox_stream_shards}"
+
+
+def streams() -> list[str]:
+    return [f"{STREAM_PREFIX}{shard}" for shard in range(config.outbox_stream_shards)]
+
+
+async def relay_batch(redis, db: AsyncSession, batch_size: int = config.outbox_batch_size) -> int:
+    """
+    Publish the oldest outbox entries in one pipeline and delete them.
+
+    :param redis: The Redis manager.
+    :param db: The database session.
+    :type db: AsyncSession
+    :param batch_size: Maximum number of entries.
+    :type batch_size: int
+    :return: Number of entries published.
+    :rtype: int
+    """
+    events = (await db.execute(select(ContactEvent).order_by(ContactEvent.id).limit(batch_size))).scalars().all()
+    if not events:
+        await db.commit()
+        return 0
+
+    def build(pipe):
+        for event in events:
+            pipe.xadd(stream_for(event.user_id),
+                      {"outbox_id": event.id, "user_id": event.user_id, "contact_id": event.contact_id,
+                       "event": event.event, "payload": json.dumps(event.payload),
+                       "created_at": event.created_at.isoformat()},
+                      maxlen=config.outbox_stream_maxlen, approximate=True)
+
+    await redis.pipeline(build, transaction=False, timeout=config.outbox_publish_timeout)
+    await db.execute(delete(ContactEvent).where(ContactEvent.id.in_([event.id for event in events])))
+    await db.commit()
+    return len(events)
+
+
+async def run_relay(redis, db: AsyncSession, stop: asyncio.Event | None = None) -> int:
+    """
+    Publish outbox entries until ``stop`` is set, polling every ``config.outbox_poll_interval``
+    seconds while the outbox is empty.
+
+    A Redis lock keeps a single relay active, which preserves the per-user order;
+    another relay takes over when the lock of a dead one expires. A relay that finds
+    its lock taken over stops publishing until it gets the lock again.
+
+    :param redis: The Redis manager.
+    :param db: The database session.
+    :type db: AsyncSession
+    :param stop: Event ending the loop; runs forever when omitted.
+    :type stop: asyncio.Event | None
+    :return: Number of entries published.
+    :rtype: int
+    """
+    stop = stop or asyncio.Event()
+    lock_ttl = max(int(config.outbox_poll_interval * 10), 10)
+    published = 0
+    while not stop.is_set():
+        token = secrets.token_hex(16)
+        if not await redis.set(LOCK_KEY, token, nx=True, ex=lock_ttl):
+            await _sleep(stop, lock_ttl / 2)
+            continue
+        try:
+            while not stop.is_set():
+                count = await relay_batch(redis, db)
+                published += count
+                if not await redis.call(lambda client: client.eval(EXTEND_LOCK, 1, LOCK_KEY, token, lock_ttl)):
+                    logger.warning("Outbox relay lock was lost")
+                    break
+                if count < config.outbox_batch_size:
+                    await _sleep(stop, config.outbox_poll_interval)
+        finally:
+            await redis.call(lambda client: client.eval(RELEASE_LOCK, 1, LOCK_KEY, token))
+    return published
+
+
+async def _sleep(stop: asyncio.Event, seconds: float):
+    try:
+        await asyncio.wait_for(stop.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def ensure_group(redis, group: str) -> None:
+    """
+    Create consumer group ``group`` on every event stream, reading new entries only.
+
+    :param redis: The Redis manager.
+    :param group: Name of the consumer group.
+    :type group: str
+    """
+    for stream in streams():
+        try:
+            await redis.call(lambda client: client.xgroup_create(stream, group, id="$", mkstream=True))
+        except ResponseError as err:
+            if "BUSYGROUP" not in str(err):
+                raise
+
+
+async def read_events(redis, group: str, consumer: str, count: int = 100, block_ms: int = 5000) -> list:
+    """
+    Next events for ``consumer`` of ``group``; acknowledge them with :func:`ack` once handled.
+    Entries that are not acknowledged stay pending and can be claimed by another consumer.
+
+    :param redis: The Redis manager.
+    :param group: Name of the consumer group.
+    :type group: str
+    :param consumer: Name of this consumer.
+    :type consumer: str
+    :param count: Maximum number of entries per stream.
+    :type count: int
+    :param block_ms: How long to wait for new entries, in milliseconds.
+    :type block_ms: int
+    :return: ``(stream, entry ID, fields)`` triples.
+    :rtype: list
+    """
+    response = await redis.call(
+        lambda client: client.xreadgroup(group, consumer, {stream: ">" for stream in streams()},
+                                         count=count, block=block_ms),
+        timeout=block_ms / 1000 + config.redis_socket_timeout)
+    return [(stream, entry_id, fields) for stream, entries in response or [] for entry_id, fields in entries]
+
+
+async def ack(redis, group: str, stream: str, *entry_ids) -> None:
+    """
+    Acknowledge handled entries of a stream.
+
+    :param redis: The Redis manager.
+    :param group: Name of the consumer group.
+    :type group: str
+    :param stream: Stream of the entries.
+    :type stream: str
+    :param entry_ids: IDs of the entries.
+    """
+    await redis.call(lambda client: client.xack(stream, group, *entry_ids))
@@ -0,0 +1,89 @@
+"""
+Background job worker. Run it as a separate process next to the API:
+
+    python -m src.jobs.runner
+"""
+import asyncio
+import logging
+from datetime import datetime, time, timedelta
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.database.redis_manager import redis_manager
+from src.jobs.birthdays import run_birthday_reminders
+from src.jobs.counters import reconcile_all_counters
+from src.jobs.outbox import run_relay
+from src.jobs.signup_filter import rebuild_email_filter
+from src.services.log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def seconds_until(hour: int, now: datetime) -> float:
+    """
+    Seconds from ``now`` to the next time the clock shows ``hour``:00.
+
+    :param hour: Hour of the day.
+    :type hour: int
+    :param now: Current time.
+    :type now: datetime
+    :return: Number of seconds.
+    :rtype: float
+    """
+    next_run = datetime.combine(now.date(), time(hour))
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def daily(job, hour: int):
+    """
+    Run ``job`` now and then every day at ``hour``:00. The jobs checkpoint their
+    progress, so running again on the same day only resumes an unfinished run.
+
+    :param job: Coroutine function taking the day of the run.
+    :param hour: Hour of the day.
+    :type hour: int
+    """
+    while True:
+        try:
+            await job(datetime.now().date())
+        except Exception:
+            logger.exception("Job %s failed", job.__name__)
+        await asyncio.sleep(seconds_until(hour, datetime.now()))
+
+
+async def main():
+    async def birthday_reminders(today):
+        await run_birthday_reminders(redis_manager, sessionmanager.session_factory, today)
+
+    async def reconcile_counters(today):
+        async for db in sessionmanager.session():
+            await reconcile_all_counters(db)
+
+    async def rebuild_signup_filter(today):
+        async for db in sessionmanager.session():
+            await rebuild_email_filter(redis_manager, db)
+
+    async def relay_outbox():
+        while True:
+            try:
+                async for db in sessionmanager.session():
+                    await run_relay(redis_manager, db)
+            except Exception:
+                logger.exception("Outbox relay failed")
+                await asyncio.sleep(config.outbox_poll_interval)
+
+    try:
+        await asyncio.gather(daily(birthday_reminders, config.birthday_reminder_hour),
+                             daily(reconcile_counters, config.counters_reconcile_hour),
+                             daily(rebuild_signup_filter, config.signup_filter_rebuild_hour),
+                             relay_outbox())
+    finally:
+        await redis_manager.close()
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
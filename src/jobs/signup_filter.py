@@ -0,0 +1,50 @@
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.model import User
+from src.services.bloom import email_filter
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_email_filter(redis, db: AsyncSession, chunk_size: int = config.jobs_chunk_size) -> int:
+    """
+    Rebuild the signup email filter from the users table.
+
+    The bitmap is built in memory from emails read in chunks with a keyset cursor on
+    the user ID, then swapped in at once, so signups never see a partial filter.
+    Emails of accounts created during the rebuild are added by the signups themselves,
+    and merged into the new bitmap when it is swapped in.
+
+    :param redis: The Redis manager.
+    :param db: The database session.
+    :type db: AsyncSession
+    :param chunk_size: Users read per query.
+    :type chunk_size: int
+    :return: Number of emails in the filter.
+    :rtype: int
+    """
+    emails = email_filter(redis)
+    await emails.start_rebuild()
+    bits = None
+    count = 0
+    cursor = 0
+    while True:
+        rows = (await db.execute(
+            select(User.id, User.email).where(User.id > cursor).order_by(User.id).limit(chunk_size)
+        )).all()
+        await db.commit()
+        if not rows:
+            break
+        bits = emails.bitmap((email for _, email in rows), bits)
+        count += len(rows)
+        cursor = rows[-1].id
+    await emails.replace(bits if bits is not None else emails.bitmap(()))
+    if count > config.signup_filter_capacity:
+        logger.warning("Signup filter holds %s emails, more than its capacity of %s", count,
+                       config.signup_filter_capacity)
+    logger.info("Signup filter rebuilt with %s emails", count)
+    return count
@@ -0,0 +1,485 @@
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, bindparam, insert, update, delete, values, column, func, any_, and_, or_, cast, literal_column, Integer, String, Date, Text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import ARRAY
+from src.conf.config import config
+from src.database.model import Contact, ContactTombstone, ContactCounter, ContactEvent
+from src.schemas import ContactOperation, ContactOperationResult
+from src.services.normalize import normalize_email, normalize_phone, normalize_name, email_key, phone_key
+
+CONTACT_FIELDS = ("name", "surname", "email", "phone", "birthday", "notes")
+UPDATE_COLUMNS = (column("id", Integer), column("name", String), column("surname", String), column("phone", String),
+                  column("phone_normalized", String), column("birthday", Date), column("notes", String))
+
+# Hot per-user statements, built once so every request reuses the cached compiled SQL
+# and the prepared statement on the connection.
+CONTACTS_BY_USER = select(Contact).where(Contact.user_id == bindparam("user_id"))
+CONTACTS_BY_USER_PAGE = CONTACTS_BY_USER.offset(bindparam("skip")).limit(bindparam("limit"))
+
+
+def with_normalized(data: dict) -> dict:
+    """
+    Contact column values completed with the normalized email and phone they contain.
+
+    :param data: Column values.
+    :type data: dict
+    :return: Column values including ``email_normalized`` and ``phone_normalized``.
+    :rtype: dict
+    """
+    data = dict(data)
+    if "email" in data:
+        data["email_normalized"] = normalize_email(data["email"])
+    if "phone" in data:
+        data["phone_normalized"] = normalize_phone(data["phone"])
+    return data
+
+
+async def get_contacts_by_user(user_id: int, db: AsyncSession, skip: int = 0,
+                               limit: int | None = None) -> list[Contact]:
+    """
+    Retrieve contacts of a user, optionally one page of them.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param skip: Number of contacts to skip.
+    :type skip: int
+    :param limit: Maximum number of contacts to retrieve.
+    :type limit: int | None
+    :return: List of contacts.
+    :rtype: list[Contact]
+    """
+    if limit is None:
+        result = await db.execute(CONTACTS_BY_USER, {"user_id": user_id})
+    else:
+        result = await db.execute(CONTACTS_BY_USER_PAGE, {"user_id": user_id, "skip": skip, "limit": limit})
+    return result.scalars().all()
+
+
+# Fields of ContactResponse, in order: what the database puts in a JSON response body.
+RESPONSE_COLUMNS = ("id", "name", "surname", "email", "phone", "birthday", "notes")
+
+
+def search_filter(user_id: int, elem: str):
+    """
+    Condition matching the contacts of a user whose name, surname or email contains ``elem``.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param elem: Search term.
+    :type elem: str
+    :return: The condition.
+    """
+    return and_(
+        Contact.user_id == user_id,
+        or_(
+            Contact.name.ilike(f"%{elem}%"),
+            Contact.surname.ilike(f"%{elem}%"),
+            Contact.email.ilike(f"%{elem}%"),
+        )
+    )
+
+
+async def get_contacts_json(condition, db: AsyncSession) -> bytes:
+    """
+    JSON array of the contacts matching ``condition``, in the shape of ``List[ContactResponse]``,
+    built by the database (``json_agg`` on PostgreSQL, ``json_group_array`` on SQLite).
+
+    The rows never become ORM objects or Pydantic models: the body arrives as one
+    text value and goes to the response as is.
+
+    :param condition: Filter of the contacts.
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: UTF-8 JSON array.
+    :rtype: bytes
+    """
+    fields = [part for name in RESPONSE_COLUMNS for part in (literal_column(f"'{name}'"), getattr(Contact, name))]
+    if _is_postgres(db):
+        body = func.coalesce(cast(func.json_agg(func.json_build_object(*fields)), Text), "[]")
+    else:
+        body = func.json_group_array(func.json_object(*fields))
+    result = await db.execute(select(body).where(condition))
+    return result.scalar_one().encode()
+
+
+# First key of the advisory locks taken by lock_user_writes; the second one is the user ID.
+USER_WRITES_LOCK = 7001
+
+
+async def lock_user_writes(user_id: int, db: AsyncSession) -> None:
+    """
+    Serialize the contact writes of a user until the current transaction ends.
+
+    Writes to different contacts of a user otherwise share no lock, and two overlapping
+    transactions could commit in the opposite order of their outbox IDs. Holding this
+    lock from before the first write makes the outbox order of a user's events its
+    commit order. It has to be taken before any row lock of the transaction, so writers
+    never wait on it while holding a lock another writer needs. SQLite serializes
+    writers already.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    if _is_postgres(db):
+        await db.execute(select(func.pg_advisory_xact_lock(USER_WRITES_LOCK, user_id)))
+
+
+async def record_events(user_id: int, events, db: AsyncSession) -> None:
+    """
+    Write contact change events to the outbox in the current transaction, which must
+    hold :func:`lock_user_writes`.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param events: ``(contact ID, event, contact values)`` triples; event is "created", "updated" or "deleted".
+    :type events: Iterable[tuple[int, str, dict]]
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    rows = [{"user_id": user_id, "contact_id": contact_id, "event": event,
+             "payload": {key: value.isoformat() if isinstance(value, date) else value
+                         for key, value in data.items() if key in CONTACT_FIELDS}}
+            for contact_id, event, data in events]
+    if rows:
+        await db.execute(insert(ContactEvent), rows)
+
+
+def contact_values(contact: Contact) -> dict:
+    return {field: getattr(contact, field) for field in CONTACT_FIELDS}
+
+
+TOTAL = 0
+
+
+async def update_counters(user_id: int, db: AsyncSession, added=(), removed=()) -> None:
+    """
+    Adjust the contact counters of a user in the current transaction.
+
+    Every bucket is changed with one atomic upsert, in bucket order so concurrent
+    transactions lock the rows in the same order.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param added: Birthdays of the contacts added.
+    :type added: Iterable[date]
+    :param removed: Birthdays of the contacts removed.
+    :type removed: Iterable[date]
+    """
+    deltas = Counter()
+    for birthday in added:
+        deltas[TOTAL] += 1
+        deltas[birthday.month] += 1
+    for birthday in removed:
+        deltas[TOTAL] -= 1
+        deltas[birthday.month] -= 1
+    rows = [{"user_id": user_id, "bucket": bucket, "count": delta} for bucket, delta in sorted(deltas.items()) if delta]
+    if rows:
+        await _upsert_counters(rows, db)
+
+
+async def _upsert_counters(rows: list[dict], db: AsyncSession) -> None:
+    dialect = postgresql if _is_postgres(db) else sqlite
+    stmt = dialect.insert(ContactCounter)
+    stmt = stmt.on_conflict_do_update(index_elements=[ContactCounter.user_id, ContactCounter.bucket],
+                                      set_={"count": ContactCounter.count + stmt.excluded.count})
+    await db.execute(stmt, rows)
+
+
+async def reconcile_counters(user_id: int, db: AsyncSession) -> int:
+    """
+    Recount the contacts of a user and correct counters that drifted.
+
+    The user's counter rows are locked first: writers adjusting them wait, and a
+    writer that has added a contact without adjusting the counters yet is not seen
+    by the count and adjusts the corrected value afterwards.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: Number of buckets corrected.
+    :rtype: int
+    """
+    stored = dict((await db.execute(
+        select(ContactCounter.bucket, ContactCounter.count)
+        .where(ContactCounter.user_id == user_id).with_for_update()
+    )).all())
+    month = func.extract('month', Contact.birthday)
+    actual = {int(bucket): count for bucket, count in (await db.execute(
+        select(month, func.count()).where(Contact.user_id == user_id).group_by(month)
+    )).all()}
+    actual[TOTAL] = sum(actual.values())
+    drift = {bucket: actual.get(bucket, 0) - stored.get(bucket, 0) for bucket in set(stored) | set(actual)}
+    rows = [{"user_id": user_id, "bucket": bucket, "count": delta} for bucket, delta in sorted(drift.items()) if delta]
+    if rows:
+        await _upsert_counters(rows, db)
+    return len(rows)
+
+
+async def get_stats(user_id: int, db: AsyncSession, recent: int = 5):
+    """
+    Contact count, birthdays per month and latest contacts of a user, read from the counters.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param recent: Number of latest contacts.
+    :type recent: int
+    :return: Total, counts by month (1-12) and the latest contacts.
+    :rtype: tuple[int, dict[int, int], list[Contact]]
+    """
+    counts = dict((await db.execute(
+        select(ContactCounter.bucket, ContactCounter.count).where(ContactCounter.user_id == user_id)
+    )).all())
+    latest = (await db.execute(
+        select(Contact).where(Contact.user_id == user_id).order_by(Contact.id.desc()).limit(recent)
+    )).scalars().all()
+    return counts.get(TOTAL, 0), {month: counts.get(month, 0) for month in range(1, 13)}, latest
+
+
+async def delete_contact(contact: Contact, db: AsyncSession) -> None:
+    """
+    Delete a contact and leave a tombstone for clients that sync changes.
+
+    :param contact: The contact to delete.
+    :type contact: Contact
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    await lock_user_writes(contact.user_id, db)
+    db.add(ContactTombstone(contact_id=contact.id, user_id=contact.user_id))
+    await update_counters(contact.user_id, db, removed=[contact.birthday])
+    await record_events(contact.user_id, [(contact.id, "deleted", {})], db)
+    await db.delete(contact)
+    await db.flush()
+
+
+def sync_overlap() -> timedelta:
+    """
+    How far before a watermark a sync looks for changes.
+
+    Timestamps come from ``now()``, the start of the writing transaction, so a row can
+    become visible up to the length of that transaction after its timestamp. Write
+    transactions end with the request deadline (``config.request_deadline``) and their
+    commit, for which ``config.sync_overlap_seconds`` are added.
+
+    :return: The overlap.
+    :rtype: timedelta
+    """
+    return timedelta(seconds=config.request_deadline + config.sync_overlap_seconds)
+
+
+async def get_changes(user_id: int, since: datetime | None, db: AsyncSession):
+    """
+    Contacts created or updated and contacts deleted after a watermark.
+
+    The window starts :func:`sync_overlap` before ``since`` so rows written by
+    transactions that committed after a previous sync with an earlier timestamp are not
+    missed; clients apply changes idempotently.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param since: Watermark returned by the previous sync, None for a full sync. An aware
+        datetime is converted to naive UTC, like the timestamp columns.
+    :type since: datetime | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: Changed contacts, IDs of deleted contacts and the new watermark.
+    :rtype: tuple[list[Contact], list[int], datetime | None]
+    """
+    contacts_query = select(Contact).where(Contact.user_id == user_id).order_by(Contact.updated_at)
+    if since is None:
+        contacts = (await db.execute(contacts_query)).scalars().all()
+        return contacts, [], max((contact.updated_at for contact in contacts), default=None)
+
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    start = since - sync_overlap()
+    contacts = (await db.execute(contacts_query.where(Contact.updated_at > start))).scalars().all()
+    tombstones = (await db.execute(
+        select(ContactTombstone.contact_id, ContactTombstone.deleted_at)
+        .where(ContactTombstone.user_id == user_id, ContactTombstone.deleted_at > start)
+    )).all()
+    watermark = max([since] + [contact.updated_at for contact in contacts] + [row.deleted_at for row in tombstones])
+    changed_ids = {contact.id for contact in contacts}
+    deleted = [row.contact_id for row in tombstones if row.contact_id not in changed_ids]
+    return contacts, deleted, watermark
+
+
+def _is_postgres(db: AsyncSession) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+async def _update_many(user_id: int, rows: list[dict], db: AsyncSession) -> set[int]:
+    """
+    Update several contacts of a user; returns the IDs that were found.
+    """
+    if _is_postgres(db):
+        data = values(*UPDATE_COLUMNS, name="v").data(
+            [tuple(row[col.name] for col in UPDATE_COLUMNS) for row in rows])
+        stmt = (update(Contact)
+                .where(Contact.id == data.c.id, Contact.user_id == user_id)
+                .values(**{col.name: data.c[col.name] for col in UPDATE_COLUMNS[1:]}, updated_at=func.now())
+                .returning(Contact.id)
+                .execution_options(synchronize_session=False))
+        return set((await db.execute(stmt)).scalars().all())
+
+    owned = set((await db.execute(
+        select(Contact.id).where(Contact.user_id == user_id, Contact.id.in_([row["id"] for row in rows]))
+    )).scalars().all())
+    params = [dict(row, user_id=user_id) for row in rows if row["id"] in owned]
+    if params:
+        await db.execute(update(Contact), params)
+    return owned
+
+
+async def _delete_many(user_id: int, ids: list[int], db: AsyncSession) -> dict[int, date]:
+    """
+    Delete several contacts of a user and leave tombstones; returns the birthdays of the deleted contacts by ID.
+    """
+    if _is_postgres(db):
+        condition = Contact.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+    else:
+        condition = Contact.id.in_(ids)
+    stmt = (delete(Contact).where(Contact.user_id == user_id, condition)
+            .returning(Contact.id, Contact.birthday).execution_options(synchronize_session=False))
+    deleted = dict((await db.execute(stmt)).all())
+    if deleted:
+        await db.execute(insert(ContactTombstone),
+                         [{"contact_id": contact_id, "user_id": user_id} for contact_id in deleted])
+    return deleted
+
+
+async def apply_batch(user_id: int, operations: list[ContactOperation], db: AsyncSession) -> list[ContactOperationResult]:
+    """
+    Apply create, update and delete operations of a user in the current transaction.
+
+    Each kind of operation runs as one set-based statement: creates first, then
+    updates, then deletes. Missing contacts are reported per operation; a
+    constraint violation aborts the whole batch.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param operations: Operations to apply.
+    :type operations: list[ContactOperation]
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: One result per operation, in request order.
+    :rtype: list[ContactOperationResult]
+    """
+    await lock_user_writes(user_id, db)
+    results = [None] * len(operations)
+    creates = [(i, op) for i, op in enumerate(operations) if op.op == "create"]
+    updates = [(i, op) for i, op in enumerate(operations) if op.op == "update"]
+    deletes = [(i, op) for i, op in enumerate(operations) if op.op == "delete"]
+
+    if creates:
+        stmt = insert(Contact).returning(Contact.id, sort_by_parameter_order=True)
+        rows = [with_normalized(dict(op.contact.model_dump(include=set(CONTACT_FIELDS)), user_id=user_id))
+                for _, op in creates]
+        ids = (await db.execute(stmt, rows)).scalars().all()
+        await update_counters(user_id, db, added=[row["birthday"] for row in rows])
+        await record_events(user_id, [(contact_id, "created", row) for contact_id, row in zip(ids, rows)], db)
+        for (i, op), contact_id in zip(creates, ids):
+            results[i] = ContactOperationResult(index=i, op=op.op, id=contact_id, status=201)
+
+    if updates:
+        rows = [with_normalized(dict(op.contact.model_dump(include=set(CONTACT_FIELDS) - {"email"}), id=op.id))
+                for _, op in updates]
+        old = dict((await db.execute(
+            select(Contact.id, Contact.birthday)
+            .where(Contact.user_id == user_id, Contact.id.in_([row["id"] for row in rows]))
+        )).all())
+        found = await _update_many(user_id, rows, db)
+        await update_counters(user_id, db, added=[row["birthday"] for row in rows if row["id"] in found],
+                              removed=[old[contact_id] for contact_id in found])
+        await record_events(user_id, [(row["id"], "updated", row) for row in rows if row["id"] in found], db)
+        for i, op in updates:
+            results[i] = ContactOperationResult(index=i, op=op.op, id=op.id, status=200 if op.id in found else 404,
+                                                detail=None if op.id in found else "NOT FOUND")
+
+    if deletes:
+        found = await _delete_many(user_id, [op.id for _, op in deletes], db)
+        await update_counters(user_id, db, removed=found.values())
+        await record_events(user_id, [(contact_id, "deleted", {}) for contact_id in found], db)
+        for i, op in deletes:
+            results[i] = ContactOperationResult(index=i, op=op.op, id=op.id, status=200 if op.id in found else 404,
+                                                detail=None if op.id in found else "NOT FOUND")
+
+    return results
+
+
+DUPLICATE_KEYS = {
+    "email": lambda row: email_key(row.email_normalized),
+    "phone": lambda row: phone_key(row.phone_normalized),
+    "name": lambda row: normalize_name(row.name, row.surname),
+}
+
+
+async def find_duplicates(user_id: int, db: AsyncSession) -> list[tuple[list[Contact], list[str]]]:
+    """
+    Groups of contacts of a user that probably are the same person.
+
+    Every contact is put in one block per blocking key (email without dots and
+    ``+tag``, last digits of the phone, letters of the name); contacts sharing a
+    block are candidates. Blocks are merged into groups, so the cost is linear in
+    the number of contacts instead of comparing every pair.
+
+    :param user_id: ID of the user.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: ``(contacts, reasons)`` per group of probable duplicates.
+    :rtype: list[tuple[list[Contact], list[str]]]
+    """
+    rows = (await db.execute(
+        select(Contact.id, Contact.name, Contact.surname, Contact.email_normalized, Contact.phone_normalized)
+        .where(Contact.user_id == user_id)
+    )).all()
+
+    parent = {row.id: row.id for row in rows}
+
+    def find(contact_id):
+        while parent[contact_id] != contact_id:
+            parent[contact_id] = parent[parent[contact_id]]
+            contact_id = parent[contact_id]
+        return contact_id
+
+    reasons = {}
+    for reason, key in DUPLICATE_KEYS.items():
+        blocks = {}
+        for row in rows:
+            value = key(row)
+            if value:
+                blocks.setdefault(value, []).append(row.id)
+        for ids in blocks.values():
+            for contact_id in ids[1:]:
+                parent[find(contact_id)] = find(ids[0])
+            if len(ids) > 1:
+                reasons.setdefault(ids[0], set()).add(reason)
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(find(row.id), []).append(row.id)
+    group_reasons = {}
+    for contact_id, found in reasons.items():
+        group_reasons.setdefault(find(contact_id), set()).update(found)
+    duplicates = [(sorted(ids), sorted(group_reasons[root])) for root, ids in groups.items() if len(ids) > 1]
+    if not duplicates:
+        return []
+    contacts = (await db.execute(
+        select(Contact).where(Contact.user_id == user_id,
+                              Contact.id.in_([contact_id for ids, _ in duplicates for contact_id in ids]))
+    )).scalars().all()
+    by_id = {contact.id: contact for contact in contacts}
+    return [([by_id[contact_id] for contact_id in ids], found) for ids, found in duplicates]
@@ -1,9 +1,18 @@
-from libgravatar import Gravatar
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
 from src.database.model import User
 from src.schemas import UserSchema,UserResponseSchema
+from src.services.principal import Principal
+import logging
 
+logger = logging.getLogger(__name__)
+
+# Built once at import: SQLAlchemy reuses the compiled form from its query cache and
+# asyncpg keeps the statement prepared per connection, so a lookup only binds the email.
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+PRINCIPAL_BY_EMAIL = select(User.id, User.email, User.username, User.avatar, User.confirmed)\
+    .where(User.email == bindparam("email"))
 
 
 async def get_user_by_email(email: str, db: AsyncSession) -> User:
@@ -18,11 +27,24 @@ async def get_user_by_email(email: str, db: AsyncSession) -> User:
     :rtype: User
     """
 
-    sq = select(User).filter(User.email == email)
-    result = await db.execute(sq)
+    result = await db.execute(USER_BY_EMAIL, {"email": email})
     user =  result.scalar()
     return user
 
+async def get_principal_by_email(email: str, db: AsyncSession) -> Principal | None:
+    """
+    Find the principal of a user, reading only the columns it needs.
+
+    :param email: The email of the user.
+    :type email: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The principal, or None if there is no such user.
+    :rtype: Principal | None
+    """
+    row = (await db.execute(PRINCIPAL_BY_EMAIL, {"email": email})).first()
+    return None if row is None else Principal(*row)
+
 async def user_to_response_schema(user: User) -> UserResponseSchema:
     """
     Changes type of user
@@ -39,29 +61,32 @@ async def user_to_response_schema(user: User) -> UserResponseSchema:
         avatar=user.avatar
     )
 
-async def create_user(body: UserSchema, db: AsyncSession) -> User:
+async def create_user(body: UserSchema, db: AsyncSession) -> User | None:
     """
     Created User.
 
+    The row is inserted with ``ON CONFLICT DO NOTHING``, so an email that is already
+    taken returns None instead of failing the transaction.
+
     :param body: Body user.
     :type body: UserSchema
     :param db: The database session.
     :type db: AsyncSession
-    :return: Return new user.
-    :rtype: User
+    :return: Return new user, or None if the email is taken.
+    :rtype: User | None
     """
+    from libgravatar import Gravatar
+
     avatar = None
     try:
         g = Gravatar(body.email)
         avatar = g.get_image()
     except Exception as e:
-        print(e)
-    user_data = body.model_dump()
-    new_user = User(**user_data, avatar=avatar)
-    db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)
-    return new_user
+        logger.warning("No gravatar for %s: %s", body.email, e)
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(User).values(**body.model_dump(), avatar=avatar)\
+        .on_conflict_do_nothing(index_elements=[User.email]).returning(User)
+    return (await db.execute(stmt)).scalar_one_or_none()
 
 
 async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
@@ -79,7 +104,7 @@ async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     """
 
     user.refresh_token = token
-    await db.commit()
+    await db.flush()
 
 async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
@@ -94,7 +119,7 @@ async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    await db.commit()
+    await db.flush()
 
 async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
@@ -111,5 +136,5 @@ async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    await db.commit()
+    await db.flush()
     return user
\ No newline at end of file
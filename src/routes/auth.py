@@ -2,15 +2,23 @@ from fastapi import APIRouter, HTTPException, Depends, status, Security, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import get_db
+from src.database.db import get_db, after_commit
 from src.schemas import UserSchema, UserResponseSchema, TokenModel, RequestEmail
 from src.repository import users as repository_users
 from src.services.auth import auth_service
+from src.services.bloom import email_filter
 from src.services.email import send_email
+from src.services.tokens import token_store, new_claims, InvalidRefreshToken
+from src.services.compression import compression
 from fastapi.responses import FileResponse
+from redis.exceptions import RedisError
+import asyncio
+import logging
+from src.services.deadlines import DeadlineRoute
 
-router = APIRouter(prefix='/auth', tags=["auth"])
+router = APIRouter(prefix='/auth', tags=["auth"], route_class=DeadlineRoute)
 security = HTTPBearer()
+logger = logging.getLogger(__name__)
 
 
 @router.post("/signup", response_model=UserResponseSchema, status_code=status.HTTP_201_CREATED)
@@ -29,22 +37,37 @@ async def signup(body: UserSchema,background_tasks: BackgroundTasks, request: Re
     :return:  Newly created user.
     :rtype: UserResponseSchema
     """
+    # Existing emails are turned down before paying for bcrypt: the filter rules out
+    # most new emails without a query, the others are checked in the database.
+    emails = email_filter(auth_service.cache)
     try:
-        exist_user = await repository_users.get_user_by_email(body.email, db)
-
-        body.password = auth_service.get_password_hash(body.password)
-        new_user = await repository_users.create_user(body, db)
-        response_user = await repository_users.user_to_response_schema(new_user)
-        background_tasks.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
-        return response_user
-    except Exception as e:
-        if exist_user:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-        print("Error in signup:", e)
-        raise HTTPException(status_code=500, detail="Internal Server Error")
-
-
-@router.post("/login", response_model=TokenModel)
+        maybe_taken = await emails.might_contain(body.email)
+    except RedisError as err:
+        logger.warning("Signup filter unavailable: %s", err)
+        maybe_taken = True
+    if maybe_taken and await repository_users.get_user_by_email(body.email, db) is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
+
+    body.password = await asyncio.to_thread(auth_service.get_password_hash, body.password)
+    new_user = await repository_users.create_user(body, db)
+    if new_user is None:
+        # Another signup for the same email got in first.
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
+
+    async def remember_email():
+        try:
+            await emails.add(new_user.email)
+        except RedisError as err:
+            logger.warning("Signup filter unavailable: %s", err)
+
+    # A signup that fails to commit leaves no bits behind.
+    after_commit(db, remember_email)
+    background_tasks.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
+    return await repository_users.user_to_response_schema(new_user)
+
+
+# Token responses are never compressed, so their secrets can't leak through compression ratios.
+@router.post("/login", response_model=TokenModel, dependencies=[Depends(compression(enabled=False))])
 async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     User login.
@@ -67,12 +90,12 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
     
     access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
+    refresh_token = await auth_service.create_refresh_token(data=new_claims(user.email))
+    await token_store.issue(refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
-@router.get('/refresh_token', response_model=TokenModel)
+@router.get('/refresh_token', response_model=TokenModel, dependencies=[Depends(compression(enabled=False))])
 async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_db)):
     """
     Refresh access token.
@@ -85,15 +108,17 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(sec
     :rtype: TokenModel
     """
     token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
+    claims = await auth_service.decode_refresh_payload(token)
+    email = claims["sub"]
+    refresh_token = await auth_service.create_refresh_token(data=new_claims(email, claims.get("fam")))
+    try:
+        await token_store.rotate(claims, token, refresh_token, db)
+    except InvalidRefreshToken:
+        # Keep the revocation of the token family although the request fails.
+        await db.commit()
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
     access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
@@ -118,6 +143,7 @@ async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     await repository_users.confirmed_email(email, db)
+    after_commit(db, lambda: auth_service.forget_user(email))
     return {"message": "Email confirmed"}
 
 
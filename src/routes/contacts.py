@@ -1,16 +1,26 @@
-from fastapi import Depends,HTTPException,status,APIRouter
-from src.database.db import get_db
+from fastapi import Depends,HTTPException,status,APIRouter,Response
+from src.database.db import get_db, transaction
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text,and_,func,or_
-from src.database.model import Contact,User
-from src.schemas import ContactModel,ContactResponse
+from src.database.model import Contact
+from src.schemas import ContactModel,ContactResponse,ContactChanges,ContactBatch,ContactOperationResult,ContactDuplicates,ContactStats
+from sqlalchemy.exc import IntegrityError
+from src.conf.config import config
 from typing import List
+import logging
 from datetime import datetime, timedelta
 from src.services.auth import auth_service
+from src.services.principal import Principal
 from sqlalchemy.future import select
 from fastapi_limiter.depends import RateLimiter
+from src.repository import contacts as repository_contacts
+from src.services.normalize import normalize_email, normalize_phone
+from src.services.deadlines import DeadlineRoute, deadline
 
-router = APIRouter(prefix='/main', tags=["contacts"])
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix='/main', tags=["contacts"], route_class=DeadlineRoute)
+read_only = Depends(transaction(read_only=True, statement_timeout=config.db_read_statement_timeout))
+search_deadline = Depends(deadline(config.search_deadline))
 
 async def get_contacts(skip: int, limit: int, user_id: int, db: AsyncSession):
     """
@@ -27,16 +37,12 @@ async def get_contacts(skip: int, limit: int, user_id: int, db: AsyncSession):
     :return: List of retrieved contacts.
     :rtype: List[Contact]
     """
-    result = await db.execute(
-        select(Contact).filter(Contact.user_id == user_id).offset(skip).limit(limit)
-    )
-    contacts = result.scalars().all()
-    return contacts
+    return await repository_contacts.get_contacts_by_user(user_id, db, skip, limit)
 
 @router.get("/", response_model=List[ContactResponse], description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+            dependencies=[read_only, Depends(RateLimiter(times=10, seconds=60))])
 async def read_notes(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db),
-                     current_user: User = Depends(auth_service.get_current_user)):
+                     current_user: Principal = Depends(auth_service.get_current_user)):
     """
     Get a list of contacts for the current user.
 
@@ -47,14 +53,14 @@ async def read_notes(skip: int = 0, limit: int = 100, db: AsyncSession = Depends
     :param db: The database session.
     :type db: AsyncSession
     :param current_user: Current authenticated user.
-    :type current_user: User
+    :type current_user: Principal
     :return: List of retrieved contacts.
     :rtype: List[ContactResponse]
     """
-    contacts = await get_contacts(skip, limit, current_user, db)
+    contacts = await get_contacts(skip, limit, current_user.id, db)
     return contacts
 
-@router.get("/api/healthchecker")
+@router.get("/api/healthchecker", dependencies=[read_only])
 async def healthchecker(db: AsyncSession = Depends(get_db)):
     """
     Health check endpoint to verify database connectivity.
@@ -70,13 +76,13 @@ async def healthchecker(db: AsyncSession = Depends(get_db)):
         if result1 is None:
             raise HTTPException(status_code=500, detail="Database is not configured correctly")
         return {"message": "Welcome to FastAPI!"}
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception("Health check failed")
         raise HTTPException(status_code=500, detail="Error connecting to the database")
 
 
 @router.post("/contact", response_model = ContactResponse)
-async def add_contact(body :ContactModel, db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+async def add_contact(body :ContactModel, db: AsyncSession = Depends(get_db), user: Principal = Depends(auth_service.get_current_user)):
     """
     Create a new contact for the current user.
 
@@ -85,11 +91,14 @@ async def add_contact(body :ContactModel, db: AsyncSession = Depends(get_db), us
     :param db: The database session.
     :type db: AsyncSession
     :param user: Current authenticated user.
-    :type user: User
+    :type user: Principal
     :return: Response message.
     :rtype: ContactResponse
     """
-    contact_email = await  db.execute(select(Contact).filter(Contact.email == body.email))
+    email_normalized = normalize_email(body.email)
+    phone_normalized = normalize_phone(body.phone)
+    contact_email = await  db.execute(select(Contact.id).filter(Contact.user_id == user.id,
+                                                                Contact.email_normalized == email_normalized))
     existing_email = contact_email.fetchone()
 
     if existing_email:
@@ -97,7 +106,8 @@ async def add_contact(body :ContactModel, db: AsyncSession = Depends(get_db), us
             status_code=status.HTTP_409_CONFLICT,
             detail="Email is exsisting",
         )
-    contact_phone= await db.execute(select(Contact).filter(Contact.phone == body.phone))
+    contact_phone= await db.execute(select(Contact.id).filter(Contact.user_id == user.id,
+                                                              Contact.phone_normalized == phone_normalized))
     existing_phone = contact_phone.fetchone()
     if existing_phone:
         raise HTTPException(
@@ -106,10 +116,14 @@ async def add_contact(body :ContactModel, db: AsyncSession = Depends(get_db), us
         )
     contact=Contact(name=body.name, email=body.email,surname=body.surname,
                     phone=body.phone,birthday=body.birthday,notes=body.notes,
+                    email_normalized=email_normalized,phone_normalized=phone_normalized,
                     user_id=user.id)
 
+    await repository_contacts.lock_user_writes(user.id, db)
     db.add(contact)
-    await  db.commit()
+    await db.flush()
+    await repository_contacts.update_counters(user.id, db, added=[body.birthday])
+    await repository_contacts.record_events(user.id, [(contact.id, "created", repository_contacts.contact_values(contact))], db)
 
     raise HTTPException(
             status_code=status.HTTP_201_CREATED,
@@ -117,21 +131,23 @@ async def add_contact(body :ContactModel, db: AsyncSession = Depends(get_db), us
         )
 
 
-@router.get("/contacts", response_model = List[ContactResponse])
-async def all_contacts(db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+@router.get("/contacts", response_model = List[ContactResponse], dependencies=[read_only, search_deadline])
+async def all_contacts(db: AsyncSession = Depends(get_db), user: Principal = Depends(auth_service.get_current_user)):
     """
     Retrieve all contacts for the current user.
 
     :param db: The database session.
     :type db: AsyncSession
     :param user: Current authenticated user.
-    :type user: User
+    :type user: Principal
     :return: List of contacts.
     :rtype: List[ContactResponse]
     """
-    result = await db.execute(select(Contact).filter(Contact.user_id == user.id))
-    contacts = result.scalars().all()
-    
+    if config.contacts_json_aggregation:
+        body = await repository_contacts.get_contacts_json(Contact.user_id == user.id, db)
+        return Response(body, media_type="application/json")
+    contacts = await repository_contacts.get_contacts_by_user(user.id, db)
+
     contact_responses = []
     for contact in contacts:
         contact_response = ContactResponse(
@@ -148,8 +164,91 @@ async def all_contacts(db: AsyncSession = Depends(get_db), user: User = Depends(
     return contact_responses
 
 
+@router.get("/contacts/changes", response_model = ContactChanges, dependencies=[read_only])
+async def contact_changes(since: datetime | None = None, db: AsyncSession = Depends(get_db),
+                          user: Principal = Depends(auth_service.get_current_user)):
+    """
+    Retrieve contacts changed since a watermark, for incremental sync.
+
+    :param since: Watermark returned by the previous call; omit it for a full sync.
+    :type since: datetime | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: Current authenticated user.
+    :type user: Principal
+    :return: Created or updated contacts, IDs of deleted contacts and the next watermark.
+    :rtype: ContactChanges
+    """
+    contacts, deleted, watermark = await repository_contacts.get_changes(user.id, since, db)
+    return ContactChanges(changes=[ContactResponse.model_validate(contact) for contact in contacts],
+                          deleted=deleted, watermark=watermark)
+
+
+@router.get("/contacts/stats", response_model = ContactStats, dependencies=[read_only])
+async def stats(db: AsyncSession = Depends(get_db), user: Principal = Depends(auth_service.get_current_user)):
+    """
+    Get the number of contacts, their birthdays per month and the latest added contacts.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: Current authenticated user.
+    :type user: Principal
+    :return: Contact statistics.
+    :rtype: ContactStats
+    """
+    total, per_month, latest = await repository_contacts.get_stats(user.id, db, config.stats_recent_limit)
+    return ContactStats(total=total, birthdays_per_month=per_month,
+                        recently_added=[ContactResponse.model_validate(contact) for contact in latest])
+
+
+@router.get("/contacts/duplicates", response_model = List[ContactDuplicates], dependencies=[read_only])
+async def duplicates(db: AsyncSession = Depends(get_db), user: Principal = Depends(auth_service.get_current_user)):
+    """
+    Find groups of contacts that probably are the same person.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: Current authenticated user.
+    :type user: Principal
+    :return: Groups of probable duplicates with the fields they share.
+    :rtype: List[ContactDuplicates]
+    """
+    groups = await repository_contacts.find_duplicates(user.id, db)
+    return [ContactDuplicates(contacts=[ContactResponse.model_validate(contact) for contact in contacts],
+                              reasons=reasons) for contacts, reasons in groups]
+
+
+@router.post("/contacts/batch", response_model = List[ContactOperationResult])
+async def batch(body: ContactBatch, db: AsyncSession = Depends(get_db), user: Principal = Depends(auth_service.get_current_user)):
+    """
+    Create, update and delete several contacts in one transaction.
+
+    :param body: Operations to apply.
+    :type body: ContactBatch
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: Current authenticated user.
+    :type user: Principal
+    :return: One result per operation, in request order.
+    :rtype: List[ContactOperationResult]
+    """
+    if len(body.operations) > config.batch_max_operations:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"No more than {config.batch_max_operations} operations per batch",
+        )
+    try:
+        return await repository_contacts.apply_batch(user.id, body.operations, db)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Email or phone is exsisting",
+        )
+
+
 @router.put("/contact/{contact_id}", response_model = ContactResponse)
-async def update(contact_id : int,body:ContactModel,db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+async def update(contact_id : int,body:ContactModel,db: AsyncSession = Depends(get_db), user: Principal = Depends(auth_service.get_current_user)):
     """
     Update a contact with the provided information.
 
@@ -160,29 +259,34 @@ async def update(contact_id : int,body:ContactModel,db: AsyncSession = Depends(g
     :param db: The database session.
     :type db: AsyncSession
     :param user: Current authenticated user.
-    :type user: User
+    :type user: Principal
     :return: Updated contact.
     :rtype: ContactResponse
     """
 
+    await repository_contacts.lock_user_writes(user.id, db)
     result = await db.execute(select(Contact).filter(Contact.user_id == user.id, Contact.id == contact_id))
     contact = result.scalar_one_or_none()
     
     if contact:
+        if contact.birthday.month != body.birthday.month:
+            await repository_contacts.update_counters(user.id, db, added=[body.birthday], removed=[contact.birthday])
         contact.name = body.name
         contact.surname = body.surname
         contact.phone = body.phone
+        contact.phone_normalized = normalize_phone(body.phone)
         contact.notes = body.notes
         contact.birthday = body.birthday
-        await db.commit()
+        await repository_contacts.record_events(user.id, [(contact.id, "updated", repository_contacts.contact_values(contact))], db)
+        await db.flush()
         await db.refresh(contact)
         
     contact_response = ContactResponse.model_validate(contact)
     return contact_response
 
 
-@router.get("/contact/{elem}", response_model = List[ContactResponse])
-async def search(elem : str,db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+@router.get("/contact/{elem}", response_model = List[ContactResponse], dependencies=[read_only, search_deadline])
+async def search(elem : str,db: AsyncSession = Depends(get_db), user: Principal = Depends(auth_service.get_current_user)):
     """
     Search contacts based on a given search term.
 
@@ -191,22 +295,19 @@ async def search(elem : str,db: AsyncSession = Depends(get_db), user: User = Dep
     :param db: The database session.
     :type db: AsyncSession
     :param user: Current authenticated user.
-    :type user: User
+    :type user: Principal
     :return: List of matching contacts.
     :rtype: List[ContactResponse]
     """
-    result = await db.execute(
-        select(Contact).filter(
-            and_(
-                Contact.user_id == user.id,
-                or_(
-                    Contact.name.ilike(f"%{elem}%"),
-                    Contact.surname.ilike(f"%{elem}%"),
-                    Contact.email.ilike(f"%{elem}%"),
-                )
+    if config.contacts_json_aggregation:
+        body = await repository_contacts.get_contacts_json(repository_contacts.search_filter(user.id, elem), db)
+        if body == b"[]":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="NOT FOUND",
             )
-        )
-    )
+        return Response(body, media_type="application/json")
+    result = await db.execute(select(Contact).filter(repository_contacts.search_filter(user.id, elem)))
     contacts = result.scalars().all()
     if len(contacts)==0:
         raise HTTPException(
@@ -217,7 +318,7 @@ async def search(elem : str,db: AsyncSession = Depends(get_db), user: User = Dep
 
 
 @router.delete("/contact/{contact_id}")
-async def Delete(contact_id : int,db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+async def Delete(contact_id : int,db: AsyncSession = Depends(get_db), user: Principal = Depends(auth_service.get_current_user)):
     """
     Delete a contact with the provided ID.
 
@@ -226,7 +327,7 @@ async def Delete(contact_id : int,db: AsyncSession = Depends(get_db), user: User
     :param db: The database session.
     :type db: AsyncSession
     :param user: Current authenticated user.
-    :type user: User
+    :type user: Principal
     :return: Deletion success message.
     :rtype: dict
     """
@@ -237,21 +338,20 @@ async def Delete(contact_id : int,db: AsyncSession = Depends(get_db), user: User
             status_code=status.HTTP_404_NOT_FOUND,
             detail="NOT FOUND",
         )
-    await db.delete(contact)
-    await db.commit()
+    await repository_contacts.delete_contact(contact, db)
     return {"message": "Contact deleted successfully"}
 
 
 
-@router.get("/contacts/HB", response_model = List[ContactResponse])
-async def HpB(db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+@router.get("/contacts/HB", response_model = List[ContactResponse], dependencies=[read_only])
+async def HpB(db: AsyncSession = Depends(get_db), user: Principal = Depends(auth_service.get_current_user)):
     """
     Get upcoming contacts' birthdays within the next 7 days.
 
     :param db: The database session.
     :type db: AsyncSession
     :param user: Current authenticated user.
-    :type user: User
+    :type user: Principal
     :return: List of contacts with upcoming birthdays.
     :rtype: List[ContactResponse]
     """
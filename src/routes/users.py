@@ -1,31 +1,45 @@
+from functools import lru_cache
+
 from fastapi import APIRouter, Depends,  UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-import cloudinary
-import cloudinary.uploader
 
-from src.database.db import get_db
-from src.database.model import User
+from src.database.db import get_db, transaction, after_commit
 from src.repository import users as repository_users
 from src.services.auth import auth_service
+from src.services.principal import Principal
 from src.conf.config import config
 from src.schemas import UserResponseSchema
+from src.services.deadlines import DeadlineRoute
+
+router = APIRouter(prefix="/users", tags=["users"], route_class=DeadlineRoute)
+
 
-router = APIRouter(prefix="/users", tags=["users"])
+@lru_cache
+def get_cloudinary():
+    """
+    Import and configure cloudinary on first use instead of at application import.
+
+    :return: The configured cloudinary module.
+    """
+    import cloudinary
+    import cloudinary.uploader
 
-cloudinary.config(
+    cloudinary.config(
         cloud_name=config.cloudinary_name,
         api_key=config.cloudinary_api_key,
         api_secret=config.cloudinary_api_secret,
         secure=True
     )
+    return cloudinary
 
-@router.get("/me/", response_model=UserResponseSchema)
-async def read_users_me(current_user: User = Depends(auth_service.get_current_user)):
+@router.get("/me/", response_model=UserResponseSchema,
+            dependencies=[Depends(transaction(read_only=True, statement_timeout=config.db_read_statement_timeout))])
+async def read_users_me(current_user: Principal = Depends(auth_service.get_current_user)):
     """
     Get user details for the currently authenticated user.
 
     :param current_user: Current authenticated user.
-    :type current_user: User
+    :type current_user: Principal
     :return: User details.
     :rtype: UserResponseSchema
     """
@@ -33,7 +47,7 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
 
 
 @router.patch('/avatar', response_model=UserResponseSchema)
-async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
+async def update_avatar_user(file: UploadFile = File(), current_user: Principal = Depends(auth_service.get_current_user),
                              db: AsyncSession = Depends(get_db)):
 
     """
@@ -42,14 +56,16 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
     :param file: Uploaded image file.
     :type file: UploadFile
     :param current_user: Current authenticated user.
-    :type current_user: User
+    :type current_user: Principal
     :param db: The database session.
     :type db: AsyncSession
     :return: Updated user details with the new avatar URL.
     :rtype: UserResponseSchema
     """
+    cloudinary = get_cloudinary()
     r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
     src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
                         .build_url(width=250, height=250, crop='fill', version=r.get('version'))
     user = await repository_users.update_avatar(current_user.email, src_url, db)
+    after_commit(db, lambda: auth_service.forget_user(current_user.email))
     return user
\ No newline at end of file
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field,ConfigDict
-from datetime  import date
+from pydantic import BaseModel, EmailStr, Field,ConfigDict,model_validator
+from datetime  import date, datetime
+from typing import Dict, List, Literal
 
 
 
@@ -49,3 +50,52 @@ class ContactResponse(BaseModel):
     model_config = ConfigDict(from_attributes = True)
 
 
+class ContactChanges(BaseModel):
+    changes: List[ContactResponse]
+    deleted: List[int]
+    watermark: datetime | None
+
+
+class ContactDuplicates(BaseModel):
+    contacts: List[ContactResponse]
+    reasons: List[str]
+
+
+class ContactStats(BaseModel):
+    total: int
+    birthdays_per_month: Dict[int, int]
+    recently_added: List[ContactResponse]
+
+
+class ContactOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: int | None = None
+    contact: ContactModel | None = None
+
+    @model_validator(mode="after")
+    def check_fields(self):
+        if self.op != "create" and self.id is None:
+            raise ValueError(f"'{self.op}' needs the contact id")
+        if self.op != "delete" and self.contact is None:
+            raise ValueError(f"'{self.op}' needs the contact data")
+        return self
+
+
+class ContactBatch(BaseModel):
+    operations: List[ContactOperation] = Field(min_length=1)
+
+    @model_validator(mode="after")
+    def check_unique_ids(self):
+        for kind in ("update", "delete"):
+            ids = [op.id for op in self.operations if op.op == kind]
+            if len(ids) != len(set(ids)):
+                raise ValueError(f"each contact can be the target of one '{kind}' per batch")
+        return self
+
+
+class ContactOperationResult(BaseModel):
+    index: int
+    op: str
+    id: int | None
+    status: int
+    detail: str | None = None
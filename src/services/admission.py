@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+
+from fastapi.responses import JSONResponse
+
+from src.conf.config import config
+from src.services.metrics import registry
+
+# Paths that are never queued nor shed: probes and metrics must answer during overload.
+EXEMPT_PATHS = ("/main/api/healthchecker", "/metrics", "/static", "/docs", "/redoc", "/openapi.json")
+
+admitted = registry.counter("admission_admitted_total", "Requests admitted, by route class.", ("route_class",))
+shed = registry.counter("admission_shed_total", "Requests answered 503 without being served, by route class and reason.",
+                        ("route_class", "reason"))
+queue_wait = registry.counter("admission_queue_wait_seconds_total", "Time admitted requests spent queued.",
+                              ("route_class",))
+in_flight = registry.gauge("admission_in_flight", "Requests being served, by route class.", ("route_class",))
+
+
+class Overloaded(Exception):
+    """
+    The request can't be admitted; ``reason`` is ``queue`` (queue full), ``timeout``
+    (waited too long) or ``latency`` (queueing delay above target).
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Limiter:
+    """
+    Concurrency limit of one route class with a bounded FIFO queue.
+
+    Queueing delay is controlled as in CoDel: once every request admitted during
+    ``interval`` seconds has waited more than ``target`` seconds, requests which would
+    have to queue are shed right away, until a request gets in below the target again.
+    A standing queue is thereby drained quickly instead of adding latency to every request.
+    """
+
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float, target: float, interval: float,
+                 clock=time.monotonic):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.target = target
+        self.interval = interval
+        self.clock = clock
+        self.in_flight = 0
+        self.dropping = False
+        self._first_above = None
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> float:
+        """
+        Wait for a free slot; release it with :meth:`release`.
+
+        :return: Seconds spent in the queue.
+        :rtype: float
+        :raises Overloaded: The request is shed.
+        """
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self._record(0.0)
+            return 0.0
+        if self.dropping:
+            raise Overloaded("latency")
+        if len(self._waiters) >= self.queue_size:
+            raise Overloaded("queue")
+        started = self.clock()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as err:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the wait ended: pass it on.
+                self.release()
+            else:
+                self._waiters.remove(future)
+            if isinstance(err, asyncio.TimeoutError):
+                raise Overloaded("timeout") from err
+            raise
+        wait = self.clock() - started
+        self._record(wait)
+        return wait
+
+    def release(self) -> None:
+        """
+        Free a slot, handing it to the oldest queued request if there is one.
+        """
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _record(self, wait: float) -> None:
+        now = self.clock()
+        if wait < self.target:
+            self._first_above = None
+            self.dropping = False
+        elif self._first_above is None:
+            self._first_above = now + self.interval
+        elif now >= self._first_above:
+            self.dropping = True
+
+
+def classify(scope) -> str | None:
+    """
+    Route class of a request: ``auth`` (password hashing), ``read`` or ``write``.
+
+    :param scope: ASGI scope of the request.
+    :return: The route class, or None for exempt paths.
+    :rtype: str | None
+    """
+    path = scope["path"]
+    if path.startswith(EXEMPT_PATHS):
+        return None
+    if path.startswith("/auth"):
+        return "auth"
+    return "read" if scope["method"] in ("GET", "HEAD", "OPTIONS") else "write"
+
+
+def limiters_from_config() -> dict[str, Limiter]:
+    options = dict(queue_size=config.admission_queue_size, queue_timeout=config.admission_queue_timeout,
+                   target=config.admission_target, interval=config.admission_interval)
+    return {
+        "auth": Limiter(config.admission_auth_limit, **options),
+        "read": Limiter(config.admission_read_limit, **options),
+        "write": Limiter(config.admission_write_limit, **options),
+    }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting requests through the :class:`Limiter` of their route class.
+
+    Requests that can't be admitted are answered 503 with ``Retry-After`` before any
+    work is done, so the requests already admitted keep their latency under overload.
+    """
+
+    def __init__(self, app, limiters: dict[str, Limiter] | None = None, retry_after: int = 1):
+        self.app = app
+        self.limiters = limiters or limiters_from_config()
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        route_class = classify(scope) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+        limiter = self.limiters[route_class]
+        try:
+            wait = await limiter.acquire()
+        except Overloaded as err:
+            shed.inc(route_class=route_class, reason=err.reason)
+            response = JSONResponse({"detail": "Service overloaded, retry later"}, status_code=503,
+                                    headers={"Retry-After": str(self.retry_after)})
+            await response(scope, receive, send)
+            return
+        admitted.inc(route_class=route_class)
+        queue_wait.inc(wait, route_class=route_class)
+        in_flight.inc(route_class=route_class)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight.dec(route_class=route_class)
+            limiter.release()
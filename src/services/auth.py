@@ -1,17 +1,26 @@
+from functools import cached_property
 from typing import Optional
 
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
+from src.database.redis_manager import redis_manager
+from src.services.cache import CachePolicy, SingleFlight, read_cached, invalidate_tag
 from src.repository import users as repository_users
 from src.conf.config import config
-import pickle
-import redis
+from src.services.principal import Principal
+from src.services.tracing import span
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump the version whenever the fields of Principal change.
+principal_cache = CachePolicy("principal", version=1, ttl=config.user_cache_ttl)
+
 
 def hash_for_user(email:str):
     """
@@ -22,17 +31,39 @@ def hash_for_user(email:str):
     :return: Hashed user representation.
     :rtype: str
     """
+    return principal_cache.key(email)
+
+
+def user_tag(email: str) -> str:
+    """
+    Cache tag of the entries derived from a user's row, whatever their policy version.
+
+    :param email: The email of the user.
+    :type email: str
+    :return: The tag.
+    :rtype: str
+    """
     return f"user:{email}"
 
 class Auth:
     """
     Class for authentication-related functionalities.
     """
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY =config.secret_key
     ALGORITHM = config.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-    cache = redis.Redis(host=config.redis_host, port=config.redis_port,password=config.redis_password, db=0)
+
+    @cached_property
+    def pwd_context(self):
+        """
+        Password hashing context, built on first use so passlib and bcrypt are not loaded at import.
+        """
+        from passlib.context import CryptContext
+
+        return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+    cache = redis_manager
+    user_flight = SingleFlight()
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -98,24 +129,35 @@ class Auth:
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
 
-    async def decode_refresh_token(self, refresh_token: str):
+    async def decode_refresh_payload(self, refresh_token: str) -> dict:
         """
-        Decode a refresh token and retrieve the email associated with it.
+        Decode a refresh token and return all of its claims.
 
         :param refresh_token: The refresh token to be decoded.
         :type refresh_token: str
-        :return: Email from the token.
-        :rtype: str
+        :return: Claims of the token.
+        :rtype: dict
         """
         try:
             payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
+    async def decode_refresh_token(self, refresh_token: str):
+        """
+        Decode a refresh token and retrieve the email associated with it.
+
+        :param refresh_token: The refresh token to be decoded.
+        :type refresh_token: str
+        :return: Email from the token.
+        :rtype: str
+        """
+        payload = await self.decode_refresh_payload(refresh_token)
+        return payload['sub']
+
     def create_email_token(self, data: dict):
         """
         Create a token for email verification.
@@ -145,7 +187,7 @@ class Auth:
             email = payload["sub"]
             return email
         except JWTError as e:
-            print(e)
+            logger.info("Invalid email verification token: %s", e)
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                 detail="Invalid token for email verification")
 
@@ -158,7 +200,7 @@ class Auth:
         :param db: The database session.
         :type db: AsyncSession
         :return: Current authenticated user.
-        :rtype: User
+        :rtype: Principal
         """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -167,7 +209,8 @@ class Auth:
         )
 
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            with span("auth.decode_token"):
+                payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'access_token':
                 email = payload["sub"]
                 if email is None:
@@ -177,18 +220,28 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        user_hash=hash_for_user(email)
-        user = self.cache.get(user_hash)
+        async def load_user():
+            principal = await repository_users.get_principal_by_email(email, db)
+            return None if principal is None else principal.dumps()
+
+        with span("auth.load_principal"):
+            user = await read_cached(self.cache, principal_cache, (email,), load_user, self.user_flight,
+                                     tags=(user_tag(email),))
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.cache.set(user_hash, pickle.dumps(user))
-            self.cache.expire(user_hash, 900)
-        else:
-            user = pickle.loads(user)
+            raise credentials_exception
+        return Principal.loads(user)
 
-        return user
+    async def forget_user(self, email: str) -> None:
+        """
+        Drop the cached principal of a user after changing it.
+
+        Entries are dropped by tag, so those written under another version of the policy
+        during a rolling deploy go too instead of being upgraded into the new key.
+
+        :param email: The email of the user.
+        :type email: str
+        """
+        await invalidate_tag(self.cache, user_tag(email))
 
 
 auth_service = Auth()
\ No newline at end of file
@@ -0,0 +1,129 @@
+import hashlib
+import math
+
+from src.conf.config import config
+
+
+class BloomFilter:
+    """
+    Bloom filter in a Redis bitmap (plain SETBIT/GETBIT, no Redis module needed).
+
+    :meth:`might_contain` never answers False for an added item, and answers True for
+    an item never added with probability ``error_rate`` once ``capacity`` items are in.
+    Items can't be removed; the filter is rebuilt from the database instead (see
+    :func:`src.jobs.signup_filter.rebuild_email_filter`). Until the first rebuild has
+    marked it ready, the filter answers True for everything.
+
+    Items are also added to a delta bitmap, emptied when a rebuild starts and merged
+    into the rebuilt bitmap when it is swapped in, so items added while a rebuild reads
+    the database are not lost.
+    """
+
+    def __init__(self, redis, key: str, capacity: int, error_rate: float):
+        self.redis = redis
+        self.key = key
+        self.ready_key = key + ":ready"
+        self.delta_key = key + ":delta"
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+
+    def positions(self, item: str) -> list[int]:
+        """
+        Bits of ``item``, by double hashing one 128-bit digest.
+
+        :param item: The item.
+        :type item: str
+        :return: Bit offsets.
+        :rtype: list[int]
+        """
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    async def add(self, item: str) -> None:
+        """
+        Add ``item`` to the filter.
+
+        :param item: The item.
+        :type item: str
+        """
+        positions = self.positions(item)
+
+        def build(pipe):
+            for position in positions:
+                pipe.setbit(self.key, position, 1)
+                pipe.setbit(self.delta_key, position, 1)
+
+        await self.redis.pipeline(build)
+
+    async def might_contain(self, item: str) -> bool:
+        """
+        Whether ``item`` may have been added.
+
+        :param item: The item.
+        :type item: str
+        :return: False only if ``item`` was certainly never added.
+        :rtype: bool
+        """
+        positions = self.positions(item)
+
+        def build(pipe):
+            pipe.exists(self.ready_key)
+            for position in positions:
+                pipe.getbit(self.key, position)
+
+        ready, *bits = await self.redis.pipeline(build)
+        return not ready or all(bits)
+
+    def bitmap(self, items, bits: bytearray | None = None) -> bytearray:
+        """
+        Bitmap of a filter holding ``items``, in Redis bit order, for :meth:`replace`.
+
+        :param items: The items.
+        :param bits: Bitmap to add the items to; a new one when omitted.
+        :type bits: bytearray | None
+        :return: The bitmap.
+        :rtype: bytearray
+        """
+        bits = bytearray(math.ceil(self.size / 8)) if bits is None else bits
+        for item in items:
+            for position in self.positions(item):
+                bits[position // 8] |= 0x80 >> (position % 8)
+        return bits
+
+    async def start_rebuild(self) -> None:
+        """
+        Start collecting the items added until :meth:`replace`; call it before reading them.
+        """
+        await self.redis.delete(self.delta_key)
+
+    async def replace(self, bitmap: bytearray) -> None:
+        """
+        Swap in a rebuilt bitmap, merged with the items added since :meth:`start_rebuild`,
+        and mark the filter ready.
+
+        :param bitmap: Bitmap built with :meth:`bitmap`.
+        :type bitmap: bytearray
+        """
+        staging = self.key + ":staging"
+
+        def build(pipe):
+            pipe.set(staging, bytes(bitmap))
+            pipe.bitop("OR", staging, staging, self.delta_key)
+            pipe.rename(staging, self.key)
+            pipe.delete(self.delta_key)
+            pipe.set(self.ready_key, 1)
+
+        await self.redis.pipeline(build, transaction=True)
+
+
+def email_filter(redis) -> BloomFilter:
+    """
+    Filter of the emails of every account, used to turn down repeated signups before hashing.
+
+    :param redis: The Redis manager.
+    :return: The filter.
+    :rtype: BloomFilter
+    """
+    return BloomFilter(redis, f"{config.cache_prefix}:bloom:emails", config.signup_filter_capacity,
+                       config.signup_filter_error_rate)
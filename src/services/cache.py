@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import math
+import pickle
+import random
+import secrets
+import time
+from dataclasses import dataclass, field
+
+from redis.exceptions import RedisError
+
+from src.conf.config import config
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] lock key; ARGV[1] token of the holder. Deletes the lock only if it is still ours:
+# after a load slower than the lock timeout another worker may hold it.
+RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+# KEYS[1] tag set; ARGV: cache key, TTL of the entry. The set lives as long as the
+# longest-lived entry it lists, whatever order entries with jittered TTLs are written in.
+TAG = """
+redis.call('sadd', KEYS[1], ARGV[1])
+if redis.call('ttl', KEYS[1]) < tonumber(ARGV[2]) then redis.call('expire', KEYS[1], ARGV[2]) end
+return 1
+"""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key: the first caller runs the function,
+    the others wait for its result (or exception) instead of running it again.
+
+    A cancelled caller (e.g. one whose request ran out of time) leaves no result: the
+    callers waiting on it run the call again themselves, as the leader of a new flight.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn):
+        """
+        Run ``fn()`` unless a call for ``key`` is already in flight.
+
+        :param key: Key of the call.
+        :type key: str
+        :param fn: Coroutine function without arguments.
+        :return: Result of the call.
+        """
+        while (future := self._calls.get(key)) is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # This caller was cancelled, not the leader.
+                    raise
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except BaseException as err:
+            if isinstance(err, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(err)
+                # Nobody may be waiting; don't log "exception was never retrieved".
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """
+    A cached value with what early refresh needs: how long it took to compute and when it expires.
+    """
+    value: bytes
+    delta: float
+    expires_at: float
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """
+    How one kind of entity is cached: its key namespace, the version of its serialized
+    form and its TTL.
+
+    The version is part of every key, so bumping it when the serialized form changes
+    makes old and new code read separate keys during a rolling deploy instead of
+    failing on each other's entries. ``upgrades`` maps an older version to a function
+    converting its value to the current form (or returning None), so entries of the
+    previous release still warm the new keys rather than every user missing at once.
+    """
+    namespace: str
+    version: int
+    ttl: int
+    jitter: float | None = None
+    upgrades: dict = field(default_factory=dict)
+
+    def key(self, *parts, version: int | None = None) -> str:
+        """
+        Cache key of an entity, e.g. ``rest-app:principal:v1:<email>``.
+
+        :param parts: Parts identifying the entity.
+        :param version: Version of the key; defaults to the current one.
+        :type version: int | None
+        :return: The key.
+        :rtype: str
+        """
+        version = self.version if version is None else version
+        return ":".join((config.cache_prefix, self.namespace, f"v{version}", *map(str, parts)))
+
+
+def tag_key(tag: str) -> str:
+    """
+    Key of the set listing the cache keys tagged with ``tag``.
+
+    :param tag: The tag.
+    :type tag: str
+    :return: The key.
+    :rtype: str
+    """
+    return f"{config.cache_prefix}:tag:{tag}"
+
+
+def jittered_ttl(ttl: int, jitter: float) -> int:
+    """
+    ``ttl`` shortened by a random fraction up to ``jitter``, so keys written together don't expire together.
+
+    :param ttl: TTL in seconds.
+    :type ttl: int
+    :param jitter: Largest fraction of ``ttl`` to remove.
+    :type jitter: float
+    :return: TTL in seconds.
+    :rtype: int
+    """
+    return max(int(ttl * (1 - jitter * random.random())), 1)
+
+
+def should_refresh(entry: CacheEntry, beta: float, now: float | None = None) -> bool:
+    """
+    Probabilistic early expiration (XFetch): refresh before expiry with a probability
+    growing as expiry approaches and with the cost of recomputing the value.
+
+    :param entry: Cached entry.
+    :type entry: CacheEntry
+    :param beta: Eagerness; 0 disables early refresh, larger values refresh earlier.
+    :type beta: float
+    :param now: Current time; defaults to ``time.time()``.
+    :type now: float | None
+    :return: True if this caller should recompute the value.
+    :rtype: bool
+    """
+    now = time.time() if now is None else now
+    return now - entry.delta * beta * math.log(1.0 - random.random()) >= entry.expires_at
+
+
+async def _read(redis, key: str) -> CacheEntry | None:
+    data = await redis.get(key)
+    if data is None:
+        return None
+    try:
+        entry = pickle.loads(data)
+    except Exception as err:
+        # An entry this code can't read is a miss; the load overwrites it.
+        logger.warning("Unreadable cache entry %s: %s", key, err)
+        return None
+    # Values written before entries were introduced count as misses.
+    return entry if isinstance(entry, CacheEntry) else None
+
+
+async def _wait_for_entry(redis, key: str, timeout: float) -> CacheEntry | None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        entry = await _read(redis, key)
+        if entry is not None:
+            return entry
+    return None
+
+
+async def _load(redis, key: str, load, ttl: int, stale: CacheEntry | None, lock: bool,
+                tags: tuple[str, ...] = (), jitter: float | None = None) -> bytes | None:
+    lock_key = key + ":lock"
+    token = secrets.token_hex(16)
+    locked = False
+    if lock and stale is None:
+        # Another worker may be loading the same key: wait for its result instead of hitting the DB.
+        try:
+            locked = await redis.set(lock_key, token, nx=True, ex=math.ceil(config.cache_lock_timeout))
+            if not locked:
+                entry = await _wait_for_entry(redis, key, config.cache_lock_wait)
+                if entry is not None:
+                    return entry.value
+        except RedisError as err:
+            logger.warning("Cache unavailable: %s", err)
+    started = time.monotonic()
+    value = await load()
+    delta = time.monotonic() - started
+    try:
+        if value is not None:
+            ttl = jittered_ttl(ttl, config.cache_ttl_jitter if jitter is None else jitter)
+            entry = CacheEntry(value, delta, time.time() + ttl)
+            await redis.set(key, pickle.dumps(entry), ex=ttl)
+            for tag in tags:
+                await redis.call(lambda client: client.eval(TAG, 1, tag_key(tag), key, ttl))
+        if locked:
+            await redis.call(lambda client: client.eval(RELEASE_LOCK, 1, lock_key, token))
+    except RedisError as err:
+        logger.warning("Cache unavailable: %s", err)
+    return value
+
+
+async def read_through(redis, key: str, load, ttl: int, flight: SingleFlight, lock: bool | None = None,
+                       tags: tuple[str, ...] = (), jitter: float | None = None) -> bytes | None:
+    """
+    Cached value of ``key``, loaded with ``load()`` on a miss.
+
+    Concurrent misses in this process share one ``load()`` through ``flight``; with
+    ``lock`` a short Redis lock also makes other processes wait for the first loader.
+    Values are refreshed early at random (see :func:`should_refresh`) and stored with a
+    jittered TTL. When Redis is unavailable the value is loaded without the cache.
+
+    :param redis: The Redis manager.
+    :param key: Cache key.
+    :type key: str
+    :param load: Coroutine function returning the serialized value, or None if there is none.
+    :param ttl: TTL in seconds.
+    :type ttl: int
+    :param flight: Coalesces concurrent loads.
+    :type flight: SingleFlight
+    :param lock: Dedupe loads across processes; defaults to ``config.cache_lock_enabled``.
+    :type lock: bool | None
+    :param tags: Tags of the entry, for :func:`invalidate_tag`.
+    :type tags: tuple[str, ...]
+    :param jitter: TTL jitter; defaults to ``config.cache_ttl_jitter``.
+    :type jitter: float | None
+    :return: The serialized value, or None.
+    :rtype: bytes | None
+    """
+    lock = config.cache_lock_enabled if lock is None else lock
+    try:
+        entry = await _read(redis, key)
+    except RedisError as err:
+        logger.warning("Cache unavailable: %s", err)
+        return await flight.do(key, load)
+    if entry is not None and not should_refresh(entry, config.cache_early_refresh_beta):
+        return entry.value
+    if entry is not None and flight.in_flight(key):
+        # Someone is already refreshing it; the current value is still valid.
+        return entry.value
+    return await flight.do(key, lambda: _load(redis, key, load, ttl, entry, lock, tuple(tags), jitter))
+
+
+async def read_cached(redis, policy: CachePolicy, parts: tuple, load, flight: SingleFlight,
+                      tags: tuple[str, ...] = ()) -> bytes | None:
+    """
+    :func:`read_through` for the entity identified by ``parts`` under ``policy``.
+
+    On a miss, entries of the versions listed in ``policy.upgrades`` are converted
+    before falling back to ``load()``.
+
+    :param redis: The Redis manager.
+    :param policy: Cache policy of the entity.
+    :type policy: CachePolicy
+    :param parts: Parts identifying the entity.
+    :type parts: tuple
+    :param load: Coroutine function returning the serialized value, or None if there is none.
+    :param flight: Coalesces concurrent loads.
+    :type flight: SingleFlight
+    :param tags: Tags of the entry, for :func:`invalidate_tag`.
+    :type tags: tuple[str, ...]
+    :return: The serialized value, or None.
+    :rtype: bytes | None
+    """
+    async def upgrade_or_load():
+        for version, upgrade in policy.upgrades.items():
+            try:
+                entry = await _read(redis, policy.key(*parts, version=version))
+            except RedisError:
+                break
+            value = None if entry is None else upgrade(entry.value)
+            if value is not None:
+                return value
+        return await load()
+
+    return await read_through(redis, policy.key(*parts), upgrade_or_load, policy.ttl, flight,
+                              tags=tags, jitter=policy.jitter)
+
+
+async def invalidate_tag(redis, tag: str, chunk_size: int = 500) -> int:
+    """
+    Drop every entry tagged with ``tag``; Redis errors are logged, not raised.
+
+    The tag set is read with SSCAN and its keys deleted a chunk at a time, so a large
+    tag neither loads at once nor blocks Redis.
+
+    :param redis: The Redis manager.
+    :param tag: The tag.
+    :type tag: str
+    :param chunk_size: Keys read and deleted per command.
+    :type chunk_size: int
+    :return: Number of keys listed under the tag.
+    :rtype: int
+    """
+    key = tag_key(tag)
+    cursor, count = 0, 0
+    try:
+        while True:
+            cursor, keys = await redis.call(lambda client: client.sscan(key, cursor, count=chunk_size))
+            if keys:
+                await redis.delete(*keys)
+                count += len(keys)
+            if cursor == 0:
+                break
+        await redis.delete(key)
+    except RedisError as err:
+        logger.warning("Cache unavailable: %s", err)
+    return count
@@ -0,0 +1,245 @@
+import zlib
+from dataclasses import dataclass
+
+from fastapi import Request
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_CONTENT_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+@dataclass(frozen=True)
+class CompressionOptions:
+    enabled: bool = True
+    minimum_size: int | None = None
+    level: int | None = None
+
+
+def compression(enabled: bool = True, minimum_size: int | None = None, level: int | None = None):
+    """
+    Route dependency overriding the compression settings for one route.
+
+    Example: ``dependencies=[Depends(compression(enabled=False))]``.
+
+    :param enabled: Whether the response may be compressed.
+    :type enabled: bool
+    :param minimum_size: Smallest body in bytes that gets compressed.
+    :type minimum_size: int | None
+    :param level: Compression level of the chosen encoder.
+    :type level: int | None
+    :return: The dependency.
+    """
+    options = CompressionOptions(enabled, minimum_size, level)
+
+    async def set_compression(request: Request):
+        request.state.compression = options
+
+    return set_compression
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encoders() -> dict:
+    """
+    Encoders usable in this process, in order of preference.
+
+    :return: Encoder classes by content-coding name.
+    :rtype: dict
+    """
+    encoders = {}
+    if brotli is not None:
+        encoders["br"] = BrotliEncoder
+    if zstandard is not None:
+        encoders["zstd"] = ZstdEncoder
+    encoders["gzip"] = GzipEncoder
+    return encoders
+
+
+def negotiate(accept_encoding: str, encoders: dict) -> str | None:
+    """
+    Pick the preferred encoder accepted by the client.
+
+    :param accept_encoding: Value of the ``Accept-Encoding`` header.
+    :type accept_encoding: str
+    :param encoders: Available encoders, in order of preference.
+    :type encoders: dict
+    :return: Content-coding name or None.
+    :rtype: str | None
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for name in encoders:
+        if accepted.get(name, accepted.get("*", 0)) > 0:
+            return name
+    return None
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with brotli, zstd or gzip.
+
+    Only bodies of an allowed content type and at least ``minimum_size`` bytes are
+    compressed, but every response of an allowed content type carries
+    ``Vary: Accept-Encoding`` so shared caches keep the variants apart. Streaming
+    responses are compressed chunk by chunk and flushed after every chunk, so clients
+    keep receiving data incrementally. Routes can override the
+    settings with the :func:`compression` dependency.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, levels: dict | None = None,
+                 content_types=DEFAULT_CONTENT_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": 6, "br": 4, "zstd": 3, **(levels or {})}
+        self.content_types = tuple(content_types)
+        self.encoders = available_encoders()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encoders)
+        responder = _CompressionResponder(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, scope, send, encoding: str | None):
+        self.middleware = middleware
+        self.scope = scope
+        self._send = send
+        self.encoding = encoding
+        self.start_message = None
+        self.options = None
+        self.encoder = None
+        self.passthrough = False
+        self.buffer = b""
+
+    def _eligible(self, headers: Headers) -> bool:
+        self.options = self.scope.get("state", {}).get("compression") or CompressionOptions()
+        if not self.options.enabled or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(self.middleware.content_types)
+
+    def _minimum_size(self) -> int:
+        if self.options.minimum_size is not None:
+            return self.options.minimum_size
+        return self.middleware.minimum_size
+
+    async def _start(self, content_length: int | None):
+        headers = MutableHeaders(scope=self.start_message)
+        headers["content-encoding"] = self.encoding
+        if content_length is None:
+            del headers["content-length"]
+        else:
+            headers["content-length"] = str(content_length)
+        await self._send(self.start_message)
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = MutableHeaders(scope=message)
+            eligible = self._eligible(headers)
+            if eligible:
+                headers.add_vary_header("Accept-Encoding")
+            self.passthrough = not eligible or self.encoding is None
+            if self.passthrough:
+                await self._send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.encoder is None:
+            self.buffer += body
+            if len(self.buffer) < self._minimum_size():
+                if more_body:
+                    return
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": self.buffer})
+                return
+            level = self.options.level
+            if level is None:
+                level = self.middleware.levels[self.encoding]
+            self.encoder = self.middleware.encoders[self.encoding](level)
+            body, self.buffer = self.buffer, b""
+            if not more_body:
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                await self._start(len(compressed))
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+            await self._start(None)
+
+        if more_body:
+            chunk = self.encoder.compress(body) + self.encoder.flush()
+        else:
+            chunk = self.encoder.compress(body) + self.encoder.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from fastapi import Request, Response, status
+from fastapi.responses import JSONResponse
+from redis.exceptions import RedisError, TimeoutError as RedisTimeoutError, ConnectionError as RedisConnectionError
+from sqlalchemy.exc import DBAPIError
+
+from src.conf.config import config
+from src.database.db import UnitOfWorkRoute
+from src.services.metrics import deadline_exceeded
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE of a statement cancelled by statement_timeout.
+QUERY_CANCELED = "57014"
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """
+    Point in time by which the current request must be answered.
+    """
+    expires_at: float
+    budget: float
+
+    def remaining(self) -> float:
+        """
+        Seconds left before the deadline, never negative.
+        """
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+
+_current: ContextVar[Deadline | None] = ContextVar("deadline", default=None)
+
+
+def current() -> Deadline | None:
+    """
+    Deadline of the request being served in this context, if any.
+    """
+    return _current.get()
+
+
+def timeout_for(default: float) -> float:
+    """
+    Timeout of a call made on behalf of the current request: ``default``, shortened to
+    what is left of the request's deadline.
+
+    :param default: Timeout of the call without a deadline, in seconds.
+    :type default: float
+    :return: Timeout in seconds.
+    :rtype: float
+    """
+    deadline = current()
+    if deadline is None:
+        return default
+    return max(min(default, deadline.remaining()), 0.001)
+
+
+def deadline(seconds: float):
+    """
+    Route dependency declaring the time budget of a route, read by :class:`DeadlineRoute`.
+
+    Example: ``dependencies=[Depends(deadline(2))]``.
+
+    :param seconds: Budget of the route in seconds.
+    :type seconds: float
+    :return: The dependency.
+    """
+    async def set_deadline(request: Request):
+        pass
+
+    set_deadline.budget = seconds
+    return set_deadline
+
+
+def _is_query_canceled(err: DBAPIError) -> bool:
+    return getattr(err.orig, "sqlstate", None) == QUERY_CANCELED
+
+
+class DeadlineRoute(UnitOfWorkRoute):
+    """
+    Unit-of-work route answered within its budget (``config.request_deadline`` unless
+    the route declares one with :func:`deadline`).
+
+    The remaining budget caps the PostgreSQL ``statement_timeout`` and the Redis call
+    timeouts. An endpoint that runs out of time is cancelled and answered with 504;
+    the commit that follows a finished endpoint is never cancelled, so a 504 always
+    means nothing was committed. A database statement or Redis call that timed out,
+    and Redis calls refused by an open circuit breaker, are answered with 503. Every
+    case is counted in ``deadline_exceeded_total``.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        self.budget = config.request_deadline
+        for depends in self.dependencies:
+            self.budget = getattr(depends.dependency, "budget", self.budget)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            request.state.deadline = Deadline(time.monotonic() + self.budget, self.budget)
+            token = _current.set(request.state.deadline)
+            try:
+                return await handler(request)
+            except asyncio.TimeoutError:
+                return self._exceeded("request", status.HTTP_504_GATEWAY_TIMEOUT, "Request deadline exceeded")
+            except DBAPIError as err:
+                if not _is_query_canceled(err):
+                    raise
+                return self._exceeded("database", status.HTTP_503_SERVICE_UNAVAILABLE, "Database statement timed out")
+            except RedisError as err:
+                # CircuitOpen is a ConnectionError.
+                if not isinstance(err, (RedisTimeoutError, RedisConnectionError)):
+                    raise
+                return self._exceeded("redis", status.HTTP_503_SERVICE_UNAVAILABLE, "Cache unavailable")
+            finally:
+                _current.reset(token)
+
+        return route_handler
+
+    async def call_endpoint(self, handler, request: Request) -> Response:
+        return await asyncio.wait_for(handler(request), request.state.deadline.remaining())
+
+    def _exceeded(self, stage: str, status_code: int, detail: str) -> Response:
+        deadline_exceeded.inc(route=self.path, stage=stage)
+        logger.warning("%s %s: %s", ",".join(sorted(self.methods)), self.path, detail)
+        headers = {"Retry-After": "1"} if status_code == status.HTTP_503_SERVICE_UNAVAILABLE else None
+        return JSONResponse({"detail": detail}, status_code=status_code, headers=headers)
@@ -1,25 +1,42 @@
+import logging
+from functools import lru_cache
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
 from src.conf.config import config
+from src.services.tracing import span
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=config.mail_username,
-    MAIL_PASSWORD=config.mail_password,
-    MAIL_FROM=config.mail_username,
-    MAIL_PORT=config.mail_port,
-    MAIL_SERVER=config.mail_server,
-    MAIL_FROM_NAME="Desired Name",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+logger = logging.getLogger(__name__)
+
+
+@lru_cache
+def get_mail():
+    """
+    The mail client, created on first use: importing fastapi_mail is a large part of
+    the application's import time and most processes never send an email.
+
+    :return: Mail client.
+    :rtype: FastMail
+    """
+    from fastapi_mail import FastMail, ConnectionConfig
+
+    conf = ConnectionConfig(
+        MAIL_USERNAME=config.mail_username,
+        MAIL_PASSWORD=config.mail_password,
+        MAIL_FROM=config.mail_username,
+        MAIL_PORT=config.mail_port,
+        MAIL_SERVER=config.mail_server,
+        MAIL_FROM_NAME="Desired Name",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=True,
+        USE_CREDENTIALS=True,
+        VALIDATE_CERTS=True,
+        TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+        TIMEOUT=config.mail_timeout,
+    )
+    return FastMail(conf)
 
 
 async def send_email(email: EmailStr, username: str, host: str):
@@ -33,6 +50,9 @@ async def send_email(email: EmailStr, username: str, host: str):
     :param host: Host URL where the verification link will point to.
     :type host: str
     """
+    from fastapi_mail import MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
     try:
         token_verification = auth_service.create_email_token({"sub": email})
         message = MessageSchema(
@@ -42,7 +62,34 @@ async def send_email(email: EmailStr, username: str, host: str):
             subtype=MessageType.html
         )
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
+        with span("smtp.send", template="email_template.html"):
+            await get_mail().send_message(message, template_name="email_template.html")
     except ConnectionErrors as err:
-        print(err)
+        logger.error("Confirmation email not sent: %s", err)
+
+
+async def send_birthday_reminder(email: EmailStr, username: str, contact: str, birthday: str):
+    """
+    Remind a user of the upcoming birthday of one of their contacts.
+
+    :param email: Email of the user.
+    :type email: EmailStr
+    :param username: Username of the recipient.
+    :type username: str
+    :param contact: Full name of the contact.
+    :type contact: str
+    :param birthday: Date of the birthday.
+    :type birthday: str
+    :raises ConnectionErrors: The message could not be sent; the caller counts and logs it.
+    """
+    from fastapi_mail import MessageSchema, MessageType
+
+    message = MessageSchema(
+        subject=f"{contact} has a birthday soon",
+        recipients=[email],
+        template_body={"username": username, "contact": contact, "birthday": birthday},
+        subtype=MessageType.html
+    )
+
+    with span("smtp.send", template="birthday_template.html"):
+        await get_mail().send_message(message, template_name="birthday_template.html")
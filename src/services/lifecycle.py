@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi_limiter import FastAPILimiter
+from src.conf.config import config
+from src.database import db
+from src.database.redis_manager import redis_manager
+from src.repository.contacts import CONTACTS_BY_USER
+from src.repository.users import USER_BY_EMAIL
+from src.services.log import setup_logging, stop_logging
+from src.services.tracing import setup_tracing, stop_tracing
+
+logger = logging.getLogger(__name__)
+
+HOT_STATEMENTS = (
+    (USER_BY_EMAIL, {"email": ""}),
+    (CONTACTS_BY_USER, {"user_id": 0}),
+)
+
+
+class InFlightTracker:
+    """
+    Count requests which are currently being served.
+
+    The lifespan shutdown waits on :meth:`drain` so pools are closed only after
+    the last in-flight request has finished.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def enter(self):
+        self.in_flight += 1
+        self._idle.clear()
+
+    def leave(self):
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Wait until no request is in flight.
+
+        :param timeout: Maximum number of seconds to wait.
+        :type timeout: float
+        :return: True if every request finished in time, else False.
+        :rtype: bool
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class InFlightMiddleware:
+    """
+    ASGI middleware that reports every HTTP request to an :class:`InFlightTracker`.
+    """
+
+    def __init__(self, app, tracker: InFlightTracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.tracker.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.tracker.leave()
+
+
+in_flight = InFlightTracker()
+
+
+async def startup(app: FastAPI):
+    """
+    Start logging and tracing, initialise the rate limiter and pre-open DB and Redis connections.
+
+    Warm-up failures are logged and never prevent the application from starting.
+
+    :param app: The application.
+    :type app: FastAPI
+    """
+    setup_logging()
+    setup_tracing()
+    await FastAPILimiter.init(redis_manager.client)
+
+    try:
+        opened = await db.sessionmanager.warm_up(config.db_warmup_connections, HOT_STATEMENTS)
+        logger.info("Opened %s database connections", opened)
+    except Exception as err:
+        logger.warning("Database warm-up failed: %s", err)
+    try:
+        opened = await redis_manager.warm_up(config.redis_warmup_connections)
+        logger.info("Opened %s Redis connections", opened)
+    except Exception as err:
+        logger.warning("Redis warm-up failed: %s", err)
+
+
+async def shutdown(app: FastAPI):
+    """
+    Drain in-flight requests, close the DB engine and the Redis pool, then flush the
+    spans and the logs.
+
+    :param app: The application.
+    :type app: FastAPI
+    """
+    try:
+        if not await in_flight.drain(config.shutdown_drain_timeout):
+            logger.warning("%s requests still in flight after %ss", in_flight.in_flight,
+                           config.shutdown_drain_timeout)
+        await db.sessionmanager.close()
+        await redis_manager.close()
+    finally:
+        stop_tracing()
+        stop_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan: warm connections up on startup, drain and close them on shutdown.
+
+    :param app: The application.
+    :type app: FastAPI
+    """
+    await startup(app)
+    try:
+        yield
+    finally:
+        await shutdown(app)
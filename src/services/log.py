@@ -0,0 +1,190 @@
+"""
+Structured logging.
+
+Records are put on a queue by the thread that logs them and written by a
+:class:`~logging.handlers.QueueListener` thread, so the event loop never waits on
+stdout. Each line is a JSON object carrying the ID of the request it was logged
+for. Debug records, and records of the loggers in ``config.log_sampled_loggers``,
+are kept only with probability ``config.log_sample_rate``.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+from starlette.datastructures import MutableHeaders
+
+from src.conf.config import config
+
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed with ``extra=`` and is output as a field.
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, message, request ID and ``extra`` fields.
+    """
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update((key, value) for key, value in vars(record).items() if key not in _STANDARD)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamp records with the ID of the current request; runs in the logging thread, before the queue.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep debug records, and records of ``loggers`` below WARNING, with probability ``rate``.
+    """
+
+    def __init__(self, rate: float, loggers: tuple[str, ...] = ()):
+        super().__init__()
+        self.rate = rate
+        self.loggers = tuple(loggers)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sampled = record.levelno < logging.INFO or record.name.startswith(self.loggers)
+        return not sampled or record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike QueueHandler.prepare, keep the record structured: only resolve what can't
+        # cross threads (arguments and the traceback).
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str | None = None, json_output: bool | None = None, sample_rate: float | None = None,
+                  stream=None) -> QueueListener:
+    """
+    Route every log record of the process through a queue to one writer thread.
+
+    Calling it again replaces the previous setup.
+
+    :param level: Root level; defaults to ``config.log_level``.
+    :type level: str | None
+    :param json_output: Write JSON lines; defaults to ``config.log_json``.
+    :type json_output: bool | None
+    :param sample_rate: Fraction of sampled records kept; defaults to ``config.log_sample_rate``.
+    :type sample_rate: float | None
+    :param stream: Where lines are written; defaults to stdout.
+    :return: The listener writing the records.
+    :rtype: QueueListener
+    """
+    global _listener
+    stop_logging()
+    json_output = config.log_json if json_output is None else json_output
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if json_output else
+                        logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    handler, listener = queued(output)
+    handler.addFilter(SamplingFilter(config.log_sample_rate if sample_rate is None else sample_rate,
+                                     tuple(config.log_sampled_loggers)))
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if isinstance(h, _QueueHandler)]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level or config.log_level)
+    # uvicorn's loggers propagate to the root logger instead of writing themselves.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers.clear()
+        logging.getLogger(name).propagate = True
+
+    _listener = listener
+    _listener.start()
+    return _listener
+
+
+def queued(output: logging.Handler) -> tuple[QueueHandler, QueueListener]:
+    """
+    Handler putting records on a queue, and the (not yet started) listener passing them to ``output``.
+
+    :param output: Handler writing the records.
+    :type output: logging.Handler
+    :return: The queue handler and its listener.
+    :rtype: tuple[QueueHandler, QueueListener]
+    """
+    records = queue.SimpleQueue()
+    return _QueueHandler(records), QueueListener(records, output, respect_handler_level=True)
+
+
+@atexit.register
+def stop_logging() -> None:
+    """
+    Write out the records still queued and stop the writer thread started by
+    :func:`setup_logging`; records logged afterwards go to Python's last-resort handler.
+    """
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, _QueueHandler)]:
+        root.removeHandler(handler)
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every request an ID, taken from the ``X-Request-ID`` header
+    or generated, logged with every record of the request and returned in the response.
+    """
+
+    def __init__(self, app, header: str = "x-request-id"):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope["headers"]).get(self.header.encode(), b"").decode("latin-1")
+        current = incoming[:64] or uuid.uuid4().hex
+        token = request_id.set(current)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[self.header] = current
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,114 @@
+from collections import defaultdict
+
+
+class Counter:
+    """
+    Monotonic counter with labels, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Increase the counter.
+
+        :param amount: Amount to add.
+        :type amount: float
+        :param labels: Value of every label of the counter.
+        """
+        self._values[tuple(str(labels[label]) for label in self.labels)] += amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[label]) for label in self.labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for values, amount in sorted(self._values.items()):
+            labels = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(self.labels, values))
+            lines.append(f"{self.name}{{{labels}}} {amount:g}" if labels else f"{self.name} {amount:g}")
+        return lines
+
+
+class Gauge(Counter):
+    """
+    Value with labels that goes up and down, rendered in the Prometheus text format.
+    """
+
+    def set(self, amount: float, **labels) -> None:
+        self._values[tuple(str(labels[label]) for label in self.labels)] = amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    """
+    Metrics of this process. Every worker keeps its own values; the scraper sums them.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def counter(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+        """
+        Create a counter, or return the existing one of that name.
+
+        :param name: Metric name.
+        :type name: str
+        :param description: Help text.
+        :type description: str
+        :param labels: Label names.
+        :type labels: tuple[str, ...]
+        :return: The counter.
+        :rtype: Counter
+        """
+        return self._add(Counter, name, description, labels)
+
+    def gauge(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Gauge:
+        """
+        Create a gauge, or return the existing one of that name.
+
+        :param name: Metric name.
+        :type name: str
+        :param description: Help text.
+        :type description: str
+        :param labels: Label names.
+        :type labels: tuple[str, ...]
+        :return: The gauge.
+        :rtype: Gauge
+        """
+        return self._add(Gauge, name, description, labels)
+
+    def _add(self, kind, name: str, description: str, labels: tuple[str, ...]):
+        if name not in self._metrics:
+            self._metrics[name] = kind(name, description, labels)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        """
+        Every metric in the Prometheus text exposition format.
+
+        :return: Exposition text.
+        :rtype: str
+        """
+        return "\n".join(line for metric in self._metrics.values() for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+deadline_exceeded = registry.counter("deadline_exceeded_total",
+                                     "Requests that ran out of their time budget, by route and by where it ran out.",
+                                     ("route", "stage"))
@@ -0,0 +1,88 @@
+import re
+import unicodedata
+
+from src.conf.config import config
+
+
+def normalize_email(email: str) -> str:
+    """
+    Case-folded email without surrounding whitespace.
+
+    :param email: Email as entered.
+    :type email: str
+    :return: Normalized email.
+    :rtype: str
+    """
+    return email.strip().casefold()
+
+
+def normalize_phone(phone: str, country_code: str | None = None) -> str:
+    """
+    Phone number in E.164 form (``+<country code><number>``).
+
+    Separators are dropped, a ``00`` international prefix becomes ``+`` and national
+    numbers get the default country code, without their trunk prefix ``0``, so every
+    spelling of a number compares equal. Migration 5b8e0c4d2f61 keeps a copy of these
+    rules; changing them needs a migration that re-normalizes existing rows.
+
+    :param phone: Phone number as entered.
+    :type phone: str
+    :param country_code: Country calling code of national numbers; defaults to ``config.phone_country_code``.
+    :type country_code: str | None
+    :return: Normalized phone number.
+    :rtype: str
+    """
+    country_code = country_code or config.phone_country_code
+    phone = phone.strip()
+    digits = re.sub(r"\D", "", phone)
+    if phone.startswith("+"):
+        return "+" + digits
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    if digits.startswith(country_code) and len(digits) > len(country_code) + 8:
+        return "+" + digits
+    if digits.startswith("0"):
+        digits = digits[1:]
+    return "+" + country_code + digits
+
+
+def normalize_name(*parts: str) -> str:
+    """
+    Name reduced to case-folded letters without accents, with its parts in alphabetical
+    order, so "Ann-Marie Smith" and "smith annmarie" match.
+
+    :param parts: Name, surname...
+    :type parts: str
+    :return: Blocking key for the name.
+    :rtype: str
+    """
+    words = []
+    for part in parts:
+        text = unicodedata.normalize("NFKD", part).casefold()
+        words.append("".join(char for char in text if char.isalpha()))
+    return " ".join(sorted(word for word in words if word))
+
+
+def email_key(email: str) -> str:
+    """
+    Blocking key of an email: the local part without dots and ``+tag`` suffix, with its domain.
+
+    :param email: Normalized email.
+    :type email: str
+    :return: Blocking key.
+    :rtype: str
+    """
+    local, _, domain = email.rpartition("@")
+    return local.split("+", 1)[0].replace(".", "") + "@" + domain
+
+
+def phone_key(phone: str) -> str:
+    """
+    Blocking key of a phone: its last nine digits, the subscriber number in most numbering plans.
+
+    :param phone: Normalized phone.
+    :type phone: str
+    :return: Blocking key.
+    :rtype: str
+    """
+    return re.sub(r"\D", "", phone)[-9:]
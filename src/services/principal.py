@@ -0,0 +1,39 @@
+import pickle
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    The authenticated user as the routes see it: what identifies and displays the user,
+    without the password hash, the refresh token or any SQLAlchemy state.
+
+    Routes that change the user load the ``User`` row themselves.
+    """
+    id: int
+    email: str
+    username: str
+    avatar: str | None
+    confirmed: bool
+
+    def dumps(self) -> bytes:
+        """
+        Compact serialized form, as stored in the user cache.
+
+        :return: Serialized principal.
+        :rtype: bytes
+        """
+        return pickle.dumps((self.id, self.email, self.username, self.avatar, self.confirmed),
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def loads(cls, data: bytes) -> "Principal":
+        """
+        Principal serialized with :meth:`dumps`.
+
+        :param data: Serialized principal.
+        :type data: bytes
+        :return: The principal.
+        :rtype: Principal
+        """
+        return cls(*pickle.loads(data))
@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, PlainTextResponse, Response
+
+from src.services.compression import negotiate
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+@dataclass
+class StaticFile:
+    path: str
+    media_type: str
+    version: str
+    size: int
+    body: bytes | None = None
+    gzip: bytes | None = None
+    br: bytes | None = None
+
+    def etag(self, encoding: str | None = None) -> str:
+        """
+        Strong ETag of the variant with content-coding ``encoding`` (None for identity):
+        the variants have different bytes, so they must not share one.
+        """
+        return f'"{self.version}-{encoding}"' if encoding else f'"{self.version}"'
+
+
+def _compress(body: bytes, compress) -> bytes | None:
+    """
+    Compress ``body`` and keep the result only when it saves at least a tenth of the size.
+    """
+    compressed = compress(body)
+    return compressed if len(compressed) < len(body) * 0.9 else None
+
+
+def load_file(path: str, memory_limit: int) -> StaticFile:
+    """
+    Hash a file and, when it is small enough, keep it and its compressed variants in memory.
+
+    :param path: Path of the file.
+    :type path: str
+    :param memory_limit: Largest file size kept in memory, in bytes.
+    :type memory_limit: int
+    :return: The loaded file.
+    :rtype: StaticFile
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    size = os.path.getsize(path)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    version = digest.hexdigest()[:16]
+    static_file = StaticFile(path=path, media_type=media_type, version=version, size=size)
+    if size <= memory_limit:
+        with open(path, "rb") as f:
+            static_file.body = f.read()
+        if media_type.startswith(COMPRESSIBLE_TYPES):
+            static_file.gzip = _compress(static_file.body, lambda data: gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                static_file.br = _compress(static_file.body, brotli.compress)
+    return static_file
+
+
+class CachedStaticFiles:
+    """
+    ASGI app serving a directory whose content is hashed once at startup.
+
+    Responses are cached for ``max_age`` seconds and carry an ETag per content-coding,
+    answering ``If-None-Match`` with 304 once they expire. Small files are served from
+    memory, including gzip/brotli variants of compressible types.
+    """
+
+    def __init__(self, directory: str, max_age: int = 86400, memory_limit: int = 1024 * 1024):
+        self.directory = directory
+        self.max_age = max_age
+        self.files = {}
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                key = os.path.relpath(path, directory).replace(os.sep, "/")
+                self.files[key] = load_file(path, memory_limit)
+
+    def response(self, scope) -> Response:
+        """
+        Build the response for a request.
+
+        :param scope: ASGI scope of the request.
+        :type scope: dict
+        :return: The response.
+        :rtype: Response
+        """
+        if scope["method"] not in ("GET", "HEAD"):
+            return PlainTextResponse("Method Not Allowed", status_code=405)
+        static_file = self.files.get(scope["path"].lstrip("/"))
+        if static_file is None:
+            return PlainTextResponse("Not Found", status_code=404)
+
+        request_headers = Headers(scope=scope)
+        variants = {name: data for name, data in (("br", static_file.br), ("gzip", static_file.gzip))
+                    if data is not None}
+        encoding = negotiate(request_headers.get("accept-encoding", ""), variants)
+        body = static_file.body if encoding is None else variants[encoding]
+
+        headers = {
+            "etag": static_file.etag(encoding),
+            "cache-control": f"public, max-age={self.max_age}",
+            "vary": "Accept-Encoding",
+        }
+        if_none_match = request_headers.get("if-none-match", "")
+        if headers["etag"] in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")) \
+                or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+
+        if body is None:
+            return FileResponse(static_file.path, media_type=static_file.media_type, headers=headers)
+        if encoding is not None:
+            headers["content-encoding"] = encoding
+        return Response(body, media_type=static_file.media_type, headers=headers)
+
+    async def __call__(self, scope, receive, send):
+        await self.response(scope)(scope, receive, send)
@@ -0,0 +1,184 @@
+import logging
+import time
+import uuid
+from functools import cached_property
+
+from jose import jwt
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.redis_manager import redis_manager
+from src.repository import users as repository_users
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidRefreshToken(Exception):
+    """
+    The refresh token is not the current one of its family.
+    """
+
+
+class UnknownFamily(Exception):
+    """
+    The store has no record of the token family.
+    """
+
+
+def new_claims(email: str, family: str | None = None) -> dict:
+    """
+    Claims of a new refresh token.
+
+    :param email: Email of the user.
+    :type email: str
+    :param family: Family the token belongs to; a new family is started when omitted.
+    :type family: str | None
+    :return: Claims for :meth:`Auth.create_refresh_token`.
+    :rtype: dict
+    """
+    return {"sub": email, "fam": family or uuid.uuid4().hex, "jti": uuid.uuid4().hex}
+
+
+class SQLTokenStore:
+    """
+    Keeps the current refresh token in ``users.refresh_token``.
+    """
+
+    async def issue(self, token: str, db: AsyncSession) -> None:
+        """
+        Record ``token`` as the current one of its user.
+
+        :param token: Encoded token.
+        :type token: str
+        :param db: The database session.
+        :type db: AsyncSession
+        """
+        user = await repository_users.get_user_by_email(jwt.get_unverified_claims(token)["sub"], db)
+        await repository_users.update_token(user, token, db)
+
+    async def rotate(self, claims: dict, token: str, new_token: str, db: AsyncSession) -> None:
+        """
+        Replace ``token`` by ``new_token``; a token that is not the current one revokes the user's token.
+
+        :param claims: Verified claims of the presented token.
+        :type claims: dict
+        :param token: Presented token.
+        :type token: str
+        :param new_token: New token of the same family.
+        :type new_token: str
+        :param db: The database session.
+        :type db: AsyncSession
+        """
+        user = await repository_users.get_user_by_email(claims["sub"], db)
+        if user is None:
+            raise InvalidRefreshToken()
+        if user.refresh_token != token:
+            await repository_users.update_token(user, None, db)
+            raise InvalidRefreshToken()
+        await repository_users.update_token(user, new_token, db)
+
+
+# KEYS[1] family key; ARGV: presented jti, new jti, ttl in ms.
+# Returns 1 after rotating, 0 when the jti was reused (the family is revoked), -1 for unknown families.
+ROTATE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'jti')
+if not current then
+    return -1
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('HSET', KEYS[1], 'jti', ARGV[2])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class RedisTokenStore:
+    """
+    Keeps one hash per refresh-token family in Redis: the owner and the id of the only
+    token of the family that may still be used. The key expires with the newest token.
+
+    Presenting any older token of the family is treated as theft: the whole family is
+    revoked and every holder has to log in again.
+    """
+
+    def __init__(self, redis, prefix: str = "refresh:family:"):
+        self.redis = redis
+        self.prefix = prefix
+
+    @cached_property
+    def _rotate(self):
+        return self.redis.client.register_script(ROTATE_SCRIPT)
+
+    @staticmethod
+    def _ttl_ms(claims: dict) -> int:
+        return max(int((claims["exp"] - time.time()) * 1000), 1)
+
+    async def issue(self, token: str, db: AsyncSession) -> None:
+        claims = jwt.get_unverified_claims(token)
+        key = self.prefix + claims["fam"]
+        await self.redis.pipeline(lambda pipe: pipe.hset(key, mapping={"sub": claims["sub"], "jti": claims["jti"]})
+                                  .pexpire(key, self._ttl_ms(claims)))
+
+    async def rotate(self, claims: dict, token: str, new_token: str, db: AsyncSession) -> None:
+        if "fam" not in claims:
+            raise UnknownFamily()
+        new_claims = jwt.get_unverified_claims(new_token)
+        # The client of the call, not the one the script was registered on: that one is
+        # stale in a forked worker.
+        result = await self.redis.call(lambda client: self._rotate(
+            keys=[self.prefix + claims["fam"]], args=[claims["jti"], new_claims["jti"], self._ttl_ms(new_claims)],
+            client=client))
+        if result == -1:
+            raise UnknownFamily()
+        if result == 0:
+            raise InvalidRefreshToken()
+
+    async def revoke(self, family: str) -> None:
+        await self.redis.delete(self.prefix + family)
+
+
+class FallbackTokenStore:
+    """
+    Uses ``primary`` and falls back to ``fallback`` when it is unreachable or does not
+    know the token family (tokens issued while Redis was down or before the migration).
+
+    Tokens handled by ``primary`` are not written to ``fallback``, so logins and refreshes
+    don't touch the database while Redis is up. A token ``primary`` reports as reused is
+    rejected without asking ``fallback``.
+    """
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    async def issue(self, token: str, db: AsyncSession) -> None:
+        try:
+            await self.primary.issue(token, db)
+        except RedisError as err:
+            logger.warning("Token store unavailable, using fallback: %s", err)
+            await self.fallback.issue(token, db)
+
+    async def rotate(self, claims: dict, token: str, new_token: str, db: AsyncSession) -> None:
+        try:
+            await self.primary.rotate(claims, token, new_token, db)
+        except UnknownFamily:
+            await self.fallback.rotate(claims, token, new_token, db)
+        except RedisError as err:
+            logger.warning("Token store unavailable, using fallback: %s", err)
+            await self.fallback.rotate(claims, token, new_token, db)
+
+
+def build_token_store():
+    """
+    Token store selected by ``config.refresh_token_store`` ("redis" or "sql").
+    """
+    if config.refresh_token_store == "sql":
+        return SQLTokenStore()
+    return FallbackTokenStore(RedisTokenStore(redis_manager), SQLTokenStore())
+
+
+token_store = build_token_store()
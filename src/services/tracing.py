@@ -0,0 +1,304 @@
+"""
+Tracing of requests through auth, the database, Redis and SMTP.
+
+:func:`span` opens a span around a block of code. With the OpenTelemetry SDK installed
+and ``config.tracing_exporter = "otlp"``, spans are OpenTelemetry spans sent to the
+collector at ``config.tracing_endpoint``. Otherwise a built-in tracer records spans
+with W3C trace context IDs and writes them as JSON lines, through the non-blocking
+log queue, to ``config.tracing_file`` (``"file"``) or to the application log
+(``"log"``). Only ``config.tracing_sample_rate`` of the traces are recorded; spans
+of the other traces cost a context variable lookup.
+
+Tracing is off unless ``config.tracing_enabled`` is set; the application lifespan
+calls :func:`setup_tracing` on startup and :func:`stop_tracing` on shutdown.
+"""
+import atexit
+import logging
+import random
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from src.conf.config import config
+from src.services.log import JsonFormatter, queued
+
+try:
+    from opentelemetry import trace as otel_trace, propagate as otel_propagate
+except ImportError:
+    otel_trace = otel_propagate = None
+
+span_logger = logging.getLogger("tracing.spans")
+
+_tracer = None
+
+
+@dataclass
+class Span:
+    """
+    A span of the built-in tracer.
+    """
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    sampled: bool
+    attributes: dict = field(default_factory=dict)
+    start_ns: int = 0
+    status: str = "OK"
+
+    def set_attribute(self, key: str, value) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+_current: ContextVar[Span | None] = ContextVar("span", default=None)
+
+
+def parse_traceparent(header: str | None) -> Span | None:
+    """
+    Remote parent from a W3C ``traceparent`` header.
+
+    :param header: Value of the header.
+    :type header: str | None
+    :return: The parent span, or None if the header is missing or malformed.
+    :rtype: Span | None
+    """
+    parts = (header or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return Span("remote", parts[1], parts[2], None, parts[3] == "01")
+
+
+class Tracer:
+    """
+    Built-in tracer: parent-based ratio sampling, spans written to :data:`span_logger`.
+    """
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+
+    def start(self, name: str, attributes: dict, parent: Span | None = None) -> Span:
+        parent = parent or _current.get()
+        if parent is not None and not parent.sampled:
+            # Nothing of an unsampled trace is recorded: its spans are all the parent.
+            return parent
+        if parent is None:
+            trace_id, sampled = secrets.token_hex(16), random.random() < self.sample_rate
+        else:
+            trace_id, sampled = parent.trace_id, parent.sampled
+        return Span(name, trace_id, secrets.token_hex(8), parent and parent.span_id, sampled,
+                    dict(attributes) if sampled else {}, time.time_ns())
+
+    def end(self, span: Span) -> None:
+        if not span.sampled:
+            return
+        end_ns = time.time_ns()
+        span_logger.info(span.name, extra={
+            "trace_id": span.trace_id, "span_id": span.span_id, "parent_span_id": span.parent_id,
+            "start_time_unix_nano": span.start_ns, "duration_ms": (end_ns - span.start_ns) / 1e6,
+            "status": span.status, "attributes": span.attributes,
+        })
+
+    @contextmanager
+    def span(self, name: str, attributes: dict, parent: Span | None = None):
+        current = self.start(name, attributes, parent)
+        if current is _current.get():
+            yield current
+            return
+        token = _current.set(current)
+        try:
+            yield current
+        except BaseException as err:
+            current.status = "ERROR"
+            current.set_attribute("exception.type", type(err).__name__)
+            raise
+        finally:
+            _current.reset(token)
+            self.end(current)
+
+
+class OpenTelemetryTracer:
+    """
+    Spans of the OpenTelemetry SDK, exported to an OTLP collector.
+    """
+
+    def __init__(self, sample_rate: float, endpoint: str):
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        provider = TracerProvider(sampler=ParentBased(TraceIdRatioBased(sample_rate)),
+                                  resource=Resource.create({"service.name": config.tracing_service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+        otel_trace.set_tracer_provider(provider)
+        self.provider = provider
+        self.tracer = otel_trace.get_tracer("rest-app")
+
+    @contextmanager
+    def span(self, name: str, attributes: dict, parent=None):
+        context = otel_propagate.extract(parent) if parent is not None else None
+        with self.tracer.start_as_current_span(name, context=context, attributes=attributes) as current:
+            yield current
+
+
+def setup_tracing(enabled: bool | None = None, exporter: str | None = None, sample_rate: float | None = None):
+    """
+    Choose the tracer from the settings.
+
+    :param enabled: Record spans at all; defaults to ``config.tracing_enabled``.
+    :type enabled: bool | None
+    :param exporter: ``file``, ``log`` or ``otlp``; defaults to ``config.tracing_exporter``.
+    :type exporter: str | None
+    :param sample_rate: Fraction of traces recorded; defaults to ``config.tracing_sample_rate``.
+    :type sample_rate: float | None
+    :return: The tracer, or None when tracing is disabled.
+    """
+    global _tracer
+    stop_tracing()
+    enabled = config.tracing_enabled if enabled is None else enabled
+    exporter = exporter or config.tracing_exporter
+    sample_rate = config.tracing_sample_rate if sample_rate is None else sample_rate
+    if not enabled:
+        _tracer = None
+    elif exporter == "otlp" and otel_trace is not None:
+        _tracer = OpenTelemetryTracer(sample_rate, config.tracing_endpoint)
+    else:
+        if exporter == "otlp":
+            logging.getLogger(__name__).warning("OpenTelemetry is not installed; writing spans to %s",
+                                                config.tracing_file)
+            exporter = "file"
+        if exporter == "file":
+            output = logging.FileHandler(config.tracing_file, delay=True)
+            output.setFormatter(JsonFormatter())
+            handler, listener = queued(output)
+            handler.listener = listener
+            span_logger.addHandler(handler)
+            span_logger.propagate = False
+            listener.start()
+        span_logger.setLevel(logging.INFO)
+        _tracer = Tracer(sample_rate)
+    return _tracer
+
+
+@atexit.register
+def stop_tracing() -> None:
+    """
+    Stop recording spans and flush those not written or exported yet.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    for handler in [h for h in span_logger.handlers if hasattr(h, "listener")]:
+        span_logger.removeHandler(handler)
+        handler.listener.stop()
+    span_logger.propagate = True
+    if isinstance(tracer, OpenTelemetryTracer):
+        tracer.provider.shutdown()
+
+
+@contextmanager
+def span(name: str, parent=None, **attributes):
+    """
+    Trace a block of code: ``with span("db.query", statement=sql): ...``.
+
+    :param name: Name of the span.
+    :type name: str
+    :param parent: Remote parent: a :class:`Span` for the built-in tracer, the request
+        headers for OpenTelemetry.
+    :param attributes: Attributes of the span.
+    :return: The span, or None when tracing is disabled.
+    """
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.span(name, attributes, parent) as current:
+        yield current
+
+
+def current_span() -> Span | None:
+    """
+    Span of the built-in tracer open in this context, if any.
+    """
+    return _current.get()
+
+
+def start_span(name: str, **attributes) -> Span | None:
+    """
+    Start a span without making it current, for callbacks that begin and end in
+    different places (like SQLAlchemy events). End it with :func:`end_span`.
+
+    :param name: Name of the span.
+    :type name: str
+    :param attributes: Attributes of the span.
+    :return: The span, or None if it is not recorded.
+    :rtype: Span | None
+    """
+    if isinstance(_tracer, Tracer):
+        started = _tracer.start(name, attributes)
+        return started if started.sampled else None
+    if isinstance(_tracer, OpenTelemetryTracer):
+        return _tracer.tracer.start_span(name, attributes=attributes)
+    return None
+
+
+def end_span(started) -> None:
+    if isinstance(started, Span):
+        _tracer.end(started)
+    elif started is not None:
+        started.end()
+
+
+def instrument_engine(engine) -> None:
+    """
+    Trace every statement run by a SQLAlchemy engine.
+
+    :param engine: The engine (``AsyncEngine.sync_engine`` for an async one).
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._span = start_span("db.query", **{"db.system": engine.dialect.name, "db.statement": statement})
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        end_span(getattr(context, "_span", None))
+
+    @event.listens_for(engine, "handle_error")
+    def error(context):
+        started = getattr(context.execution_context, "_span", None)
+        if isinstance(started, Span):
+            started.status = "ERROR"
+        end_span(started)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening the server span of every HTTP request, continuing the
+    trace of a ``traceparent`` header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        parent = headers if isinstance(_tracer, OpenTelemetryTracer) else parse_traceparent(headers.get("traceparent"))
+        with span(f"{scope['method']} {scope['path']}", parent, **{"http.method": scope["method"],
+                                                                   "http.target": scope["path"]}) as current:
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    current.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
@@ -1,7 +1,7 @@
 from fastapi.testclient import TestClient
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from src.database.db import Base,get_db
+from src.database.db import Base,get_db,unit_of_work
 from main import app
 import pytest
 import asyncio
@@ -45,16 +45,7 @@ def init_models_fixture(user):
 @pytest.fixture(scope='module')
 def client():
     
-    async def override_get_db():
-        session = TestingSessionLocal()
-        try:
-            yield session
-        except Exception as err:
-            await session.rollback()
-        finally:
-            await session.close()
-
-    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_db] = unit_of_work(TestingSessionLocal)
 
     yield TestClient(app)
 
@@ -3,6 +3,7 @@ from unittest.mock import  MagicMock
 from tests.conftest import TestingSessionLocal
 from sqlalchemy import select
 from src.database.model import User
+from src.services.auth import auth_service
 
 user_mock = {"username":"Merlin",'email':"exefrmple@example.com", "password":"qwerty5"}
 
@@ -31,6 +32,22 @@ def test_login_user_not(client, monkeypatch):
     data= response.json()
     assert data.get('detail') == "Email not confirmed"
 
+def test_confirmed_email_forgets_principal_after_commit(client, monkeypatch):
+    seen = []
+
+    async def forget_user(email):
+        # The cached principal is dropped only once the confirmation is committed.
+        async with TestingSessionLocal() as session:
+            user = (await session.execute(select(User).filter(User.email == email))).scalar_one()
+            seen.append((email, user.confirmed))
+
+    monkeypatch.setattr(auth_service, "forget_user", forget_user)
+    token = auth_service.create_email_token({"sub": user_mock.get('email')})
+    response = client.get(f"/auth/confirmed_email/{token}")
+    assert response.status_code == 200, response.text
+    assert response.json() == {"message": "Email confirmed"}
+    assert seen == [(user_mock.get('email'), True)]
+
 @pytest.mark.asyncio
 async def test_login_user(client, monkeypatch):
     async with TestingSessionLocal() as session: 
@@ -69,3 +86,21 @@ def test_login_valid_user(client, monkeypatch):
     assert  response.status_code == 422, response.text
     data= response.json()
     assert 'detail' in data
+
+
+def test_refresh_token_rotation(client):
+    response = client.post("/auth/login",data={'username':user_mock.get('email'), 'password':user_mock.get('password')})
+    assert  response.status_code == 200, response.text
+    old_refresh = response.json()["refresh_token"]
+
+    response = client.get("/auth/refresh_token",headers={'Authorization':f"Bearer {old_refresh}"})
+    assert  response.status_code == 200, response.text
+    new_refresh = response.json()["refresh_token"]
+    assert new_refresh != old_refresh
+
+    response = client.get("/auth/refresh_token",headers={'Authorization':f"Bearer {old_refresh}"})
+    assert  response.status_code == 401, response.text
+    assert response.json().get('detail') == "Invalid refresh token"
+
+    response = client.get("/auth/refresh_token",headers={'Authorization':f"Bearer {new_refresh}"})
+    assert  response.status_code == 401, response.text
@@ -4,7 +4,7 @@ from src.services.auth import auth_service
 
 
 def test_get_contacts_(client, get_token, monkeypatch):
-    with patch.object(auth_service, attribute='cache') as redis_mok:
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
         redis_mok.get.return_value= None
         response = client.get("/main/contacts",headers={'Authorization':f"Bearer {get_token}"})
         assert response.status_code == 200, response.text
@@ -14,7 +14,7 @@ def test_get_contacts_(client, get_token, monkeypatch):
 
 
 def test_get_contact_(client, get_token, monkeypatch):
-    with patch.object(auth_service, attribute='cache') as redis_mok:
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
         redis_mok.get.return_value= None
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
@@ -25,7 +25,7 @@ def test_get_contact_(client, get_token, monkeypatch):
         assert "detail" in data
 
 def test_created_contact_(client, get_token):
-    with patch.object(auth_service, attribute='cache') as redis_mok:
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
         redis_mok.get.return_value= None
         response = client.post("/main/contact/",headers={'Authorization':f"Bearer {get_token}"}, json={"name":"Juniver",
                                                                                                         "surname":"Wulfsai",
@@ -40,7 +40,7 @@ def test_created_contact_(client, get_token):
 
 
 def test_update_contacts_(client, get_token, monkeypatch):
-    with patch.object(auth_service, attribute='cache') as redis_mok:
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
         redis_mok.get.return_value= None
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
@@ -56,7 +56,7 @@ def test_update_contacts_(client, get_token, monkeypatch):
         assert data["name"] == "Miv"
 
 def test_search_contacts_(client, get_token, monkeypatch):
-    with patch.object(auth_service, attribute='cache') as redis_mok:
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
         redis_mok.get.return_value= None
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
@@ -67,8 +67,23 @@ def test_search_contacts_(client, get_token, monkeypatch):
         assert isinstance(data, list)
         assert len(data) > 0
 
+def test_json_aggregation_contacts_(client, get_token, monkeypatch):
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
+        redis_mok.get.return_value= None
+        headers = {'Authorization':f"Bearer {get_token}"}
+        expected = {"/main/contacts": client.get("/main/contacts", headers=headers).json(),
+                    "/main/contact/Miv": client.get("/main/contact/Miv", headers=headers).json()}
+        monkeypatch.setattr("src.conf.config.config.contacts_json_aggregation", True)
+        for path, data in expected.items():
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200, response.text
+            assert response.headers["content-type"] == "application/json"
+            assert response.json() == data
+        response = client.get("/main/contact/Nobody", headers=headers)
+        assert response.status_code == 404, response.text
+
 def test_hbp_contacts_(client, get_token, monkeypatch):
-    with patch.object(auth_service, attribute='cache') as redis_mok:
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
         redis_mok.get.return_value= None
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
@@ -81,7 +96,7 @@ def test_hbp_contacts_(client, get_token, monkeypatch):
 
 
 def test_delete_contacts_(client, get_token, monkeypatch):
-    with patch.object(auth_service, attribute='cache') as redis_mok:
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
         redis_mok.get.return_value= None
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
@@ -92,9 +107,119 @@ def test_delete_contacts_(client, get_token, monkeypatch):
         assert data == {"message": "Contact deleted successfully"}
 
 
+def test_contact_changes_(client, get_token):
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
+        redis_mok.get.return_value= None
+        response = client.get("/main/contacts/changes",headers={'Authorization':f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        data =response.json()
+        assert data["deleted"] == []
 
+        response = client.get("/main/contacts/changes",params={"since":"2023-01-01T00:00:00"},
+                              headers={'Authorization':f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        data =response.json()
+        assert 1 in data["deleted"]
+        assert data["watermark"] is not None
 
+        response = client.get("/main/contacts/changes",params={"since":"2023-01-01T02:00:00+02:00"},
+                              headers={'Authorization':f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        assert response.json()["deleted"] == data["deleted"]
 
+        response = client.get("/main/contacts/changes",params={"since":"2023-01-01T00:00:00Z"},
+                              headers={'Authorization':f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        assert 1 in response.json()["deleted"]
 
 
-        
\ No newline at end of file
+def test_batch_contacts_(client, get_token):
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
+        redis_mok.get.return_value= None
+        contact = {"name":"Batch", "surname":"First", "email":"batch1@example.com", "phone":"1000001",
+                   "birthday":"1990-05-01", "notes":"one"}
+        response = client.post("/main/contacts/batch",headers={'Authorization':f"Bearer {get_token}"},
+                               json={"operations":[{"op":"create","contact":contact},
+                                                   {"op":"create","contact":dict(contact, email="batch2@example.com", phone="1000002")}]})
+        assert response.status_code == 200, response.text
+        created = response.json()
+        assert [r["status"] for r in created] == [201, 201]
+        first, second = created[0]["id"], created[1]["id"]
+
+        response = client.post("/main/contacts/batch",headers={'Authorization':f"Bearer {get_token}"},
+                               json={"operations":[{"op":"update","id":first,"contact":dict(contact, name="Updated")},
+                                                   {"op":"delete","id":second},
+                                                   {"op":"delete","id":999999}]})
+        assert response.status_code == 200, response.text
+        assert [r["status"] for r in response.json()] == [200, 200, 404]
+
+        response = client.get("/main/contact/Updated",headers={'Authorization':f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        assert [c["id"] for c in response.json()] == [first]
+
+
+def test_batch_contacts_validation_(client, get_token):
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
+        redis_mok.get.return_value= None
+        response = client.post("/main/contacts/batch",headers={'Authorization':f"Bearer {get_token}"},
+                               json={"operations":[{"op":"delete"}]})
+        assert response.status_code == 422, response.text
+
+        contact = {"name":"Twice", "surname":"Updated", "email":"twice@example.com", "phone":"1000003",
+                   "birthday":"1990-05-01"}
+        for op in ({"op":"update","id":1,"contact":contact}, {"op":"delete","id":1}):
+            response = client.post("/main/contacts/batch",headers={'Authorization':f"Bearer {get_token}"},
+                                   json={"operations":[op, op]})
+            assert response.status_code == 422, response.text
+
+
+def test_duplicate_contacts_(client, get_token):
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
+        redis_mok.get.return_value= None
+        contact = {"name":"Olena", "surname":"Petrenko", "email":"Olena.P@example.com", "phone":"+380 96 123 45 67",
+                   "birthday":"1990-05-01", "notes":"one"}
+        response = client.post("/main/contact",headers={'Authorization':f"Bearer {get_token}"}, json=contact)
+        assert response.status_code == 201, response.text
+
+        response = client.post("/main/contact",headers={'Authorization':f"Bearer {get_token}"},
+                               json=dict(contact, email="olena.p@EXAMPLE.com", phone="0501112233"))
+        assert response.status_code == 409, response.text
+        response = client.post("/main/contact",headers={'Authorization':f"Bearer {get_token}"},
+                               json=dict(contact, email="olena2@example.com", phone="096-123-45-67"))
+        assert response.status_code == 409, response.text
+
+        response = client.post("/main/contact",headers={'Authorization':f"Bearer {get_token}"},
+                               json=dict(contact, name="olena", email="olenap+work@example.com", phone="0501112233"))
+        assert response.status_code == 201, response.text
+
+        response = client.get("/main/contacts/duplicates",headers={'Authorization':f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        groups = response.json()
+        assert len(groups) == 1
+        assert len(groups[0]["contacts"]) == 2
+        assert groups[0]["reasons"] == ["email", "name"]
+
+
+def test_contact_stats_(client, get_token):
+    with patch.object(auth_service, attribute='cache', new_callable=AsyncMock) as redis_mok:
+        redis_mok.get.return_value= None
+        response = client.get("/main/contacts/stats",headers={'Authorization':f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        before = response.json()
+
+        response = client.post("/main/contact",headers={'Authorization':f"Bearer {get_token}"},
+                               json={"name":"Stats", "surname":"March", "email":"stats@example.com", "phone":"7000001",
+                                     "birthday":"1990-03-15", "notes":"one"})
+        assert response.status_code == 201, response.text
+
+        response = client.get("/main/contacts/stats",headers={'Authorization':f"Bearer {get_token}"})
+        after = response.json()
+        assert after["total"] == before["total"] + 1
+        assert after["birthdays_per_month"]["3"] == before["birthdays_per_month"]["3"] + 1
+        assert after["recently_added"][0]["email"] == "stats@example.com"
+
+        response = client.delete(f"/main/contact/{after['recently_added'][0]['id']}",
+                                 headers={'Authorization':f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        response = client.get("/main/contacts/stats",headers={'Authorization':f"Bearer {get_token}"})
+        assert response.json()["total"] == before["total"]
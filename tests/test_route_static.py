@@ -0,0 +1,50 @@
+from src.services.static import CachedStaticFiles
+
+
+def test_static_file_cached(client):
+    response = client.get("/static/pixel.png")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"]
+    assert "max-age" in response.headers["cache-control"]
+
+
+def test_static_file_not_modified(client):
+    etag = client.get("/static/avatar.jpg").headers["etag"]
+    response = client.get("/static/avatar.jpg", headers={"If-None-Match": etag})
+    assert response.status_code == 304, response.text
+    assert response.content == b""
+
+
+def test_static_variants_have_own_etags():
+    static = CachedStaticFiles("src/static")
+    static.files["pixel.png"].gzip = b"gzip bytes"
+    scope = {"type": "http", "method": "GET", "path": "/pixel.png", "headers": []}
+    identity = static.response(scope)
+    compressed = static.response(dict(scope, headers=[(b"accept-encoding", b"gzip")]))
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert identity.headers["etag"] != compressed.headers["etag"]
+
+    revalidated = static.response(dict(scope, headers=[(b"if-none-match", compressed.headers["etag"].encode())]))
+    assert revalidated.status_code == 200
+
+
+def test_static_encoding_respects_q_values():
+    static = CachedStaticFiles("src/static")
+    static.files["pixel.png"].gzip = b"gzip bytes"
+    static.files["pixel.png"].br = b"br bytes"
+    scope = {"type": "http", "method": "GET", "path": "/pixel.png", "headers": []}
+
+    def encoding(accept_encoding: bytes):
+        response = static.response(dict(scope, headers=[(b"accept-encoding", accept_encoding)]))
+        return response.headers.get("content-encoding")
+
+    assert encoding(b"br;q=0, gzip") == "gzip"
+    assert encoding(b"gzip, br") == "br"
+    assert encoding(b"gzip;q=0, br;q=0") is None
+    assert encoding(b"xbrotli, identity") is None
+
+
+def test_static_file_not_found(client):
+    response = client.get("/static/missing.png")
+    assert response.status_code == 404, response.text
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.services.admission import AdmissionMiddleware, Limiter, Overloaded, classify, shed
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def test_queue_full(self):
+        limiter = Limiter(1, queue_size=1, queue_timeout=1, target=1, interval=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with self.assertRaises(Overloaded) as cm:
+            await limiter.acquire()
+        self.assertEqual(cm.exception.reason, "queue")
+        limiter.release()
+        await waiter
+        self.assertEqual(limiter.in_flight, 1)
+        limiter.release()
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_queue_timeout(self):
+        limiter = Limiter(1, queue_size=5, queue_timeout=0.01, target=1, interval=1)
+        await limiter.acquire()
+        with self.assertRaises(Overloaded) as cm:
+            await limiter.acquire()
+        self.assertEqual(cm.exception.reason, "timeout")
+        self.assertEqual(limiter.queued, 0)
+
+    async def test_codel_sheds_standing_queue(self):
+        clock = FakeClock()
+        limiter = Limiter(1, queue_size=5, queue_timeout=10, target=0.1, interval=1, clock=clock)
+        await limiter.acquire()
+        for _ in range(2):
+            waiter = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            clock.now += 1.1
+            limiter.release()
+            await waiter
+        self.assertTrue(limiter.dropping)
+        with self.assertRaises(Overloaded) as cm:
+            await limiter.acquire()
+        self.assertEqual(cm.exception.reason, "latency")
+
+        limiter.release()
+        await limiter.acquire()
+        self.assertFalse(limiter.dropping)
+
+
+def test_classify():
+    assert classify({"path": "/auth/login", "method": "POST"}) == "auth"
+    assert classify({"path": "/main/contacts", "method": "GET"}) == "read"
+    assert classify({"path": "/main/contacts", "method": "POST"}) == "write"
+    assert classify({"path": "/main/api/healthchecker", "method": "GET"}) is None
+    assert classify({"path": "/metrics", "method": "GET"}) is None
+
+
+def test_middleware_sheds():
+    app = FastAPI()
+    limiter = Limiter(0, queue_size=0, queue_timeout=1, target=1, interval=1)
+    app.add_middleware(AdmissionMiddleware, limiters={"auth": limiter, "read": limiter, "write": limiter})
+
+    @app.get("/main/contacts")
+    async def contacts():
+        return []
+
+    @app.get("/metrics")
+    async def metrics():
+        return "ok"
+
+    client = TestClient(app)
+    before = shed.value(route_class="read", reason="queue")
+    response = client.get("/main/contacts")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert shed.value(route_class="read", reason="queue") == before + 1
+    assert client.get("/metrics").status_code == 200
+
+
+def test_shed_response_has_cors_headers():
+    from main import app
+
+    async def overloaded(self):
+        raise Overloaded("queue")
+
+    with patch.object(Limiter, "acquire", overloaded):
+        response = TestClient(app).get("/main/contacts", headers={"Origin": "https://example.com"})
+    assert response.status_code == 503
+    assert response.headers["access-control-allow-origin"] == "*"
+
@@ -0,0 +1,98 @@
+import unittest
+
+from src.services.bloom import BloomFilter
+
+
+class FakePipeline:
+    def __init__(self, data):
+        self.data = data
+        self.results = []
+
+    def setbit(self, key, offset, value):
+        bits = self.data.setdefault(key, bytearray())
+        if len(bits) <= offset // 8:
+            bits.extend(bytes(offset // 8 + 1 - len(bits)))
+        bits[offset // 8] |= 0x80 >> (offset % 8)
+        self.results.append(0)
+
+    def getbit(self, key, offset):
+        bits = self.data.get(key, b"")
+        self.results.append(int(len(bits) > offset // 8 and bool(bits[offset // 8] & (0x80 >> (offset % 8)))))
+
+    def exists(self, key):
+        self.results.append(int(key in self.data))
+
+    def set(self, key, value):
+        self.data[key] = bytearray(value) if isinstance(value, bytes) else value
+        self.results.append(True)
+
+    def rename(self, key, new_key):
+        self.data[new_key] = self.data.pop(key)
+        self.results.append(True)
+
+    def bitop(self, operation, dest, *keys):
+        bitmaps = [self.data.get(key, bytearray()) for key in keys]
+        merged = bytearray(max(len(bits) for bits in bitmaps))
+        for bits in bitmaps:
+            for i, byte in enumerate(bits):
+                merged[i] |= byte
+        self.data[dest] = merged
+        self.results.append(len(merged))
+
+    def delete(self, key):
+        self.results.append(int(self.data.pop(key, None) is not None))
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def pipeline(self, build, transaction=False):
+        pipe = FakePipeline(self.data)
+        build(pipe)
+        return pipe.results
+
+    async def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+
+class TestBloomFilter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.filter = BloomFilter(self.redis, "bloom", capacity=1000, error_rate=0.01)
+
+    def test_size(self):
+        self.assertEqual(self.filter.size, 9585)
+        self.assertEqual(self.filter.hashes, 7)
+
+    async def test_not_ready_contains_everything(self):
+        self.assertTrue(await self.filter.might_contain("new@example.com"))
+
+    async def test_rebuilt_filter(self):
+        emails = [f"user{i}@example.com" for i in range(1000)]
+        await self.filter.replace(self.filter.bitmap(emails))
+
+        for email in emails:
+            self.assertTrue(await self.filter.might_contain(email))
+        false_positives = [await self.filter.might_contain(f"other{i}@example.com") for i in range(1000)]
+        self.assertLess(sum(false_positives), 30)
+
+    async def test_add(self):
+        await self.filter.replace(self.filter.bitmap([]))
+        self.assertFalse(await self.filter.might_contain("new@example.com"))
+
+        await self.filter.add("new@example.com")
+        self.assertTrue(await self.filter.might_contain("new@example.com"))
+
+    async def test_items_added_during_rebuild_are_kept(self):
+        await self.filter.add("removed@example.com")
+        await self.filter.start_rebuild()
+        bits = self.filter.bitmap(["user@example.com"])
+        await self.filter.add("new@example.com")
+        await self.filter.replace(bits)
+
+        self.assertTrue(await self.filter.might_contain("user@example.com"))
+        self.assertTrue(await self.filter.might_contain("new@example.com"))
+        self.assertFalse(await self.filter.might_contain("removed@example.com"))
+        self.assertNotIn(self.filter.delta_key, self.redis.data)
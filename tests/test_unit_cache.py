@@ -0,0 +1,187 @@
+import asyncio
+import pickle
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from redis.exceptions import ConnectionError
+
+from src.services.auth import auth_service, principal_cache, user_tag
+from src.services.cache import (CacheEntry, CachePolicy, SingleFlight, invalidate_tag, read_cached, read_through,
+                                should_refresh, tag_key)
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_share_one_load(self):
+        flight = SingleFlight()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*(flight.do("key", load) for _ in range(10)))
+
+        self.assertEqual(calls, 1)
+        self.assertEqual(results, [1] * 10)
+        self.assertFalse(flight.in_flight("key"))
+
+    async def test_waiters_get_the_exception(self):
+        flight = SingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.01)
+            raise ValueError()
+
+        results = await asyncio.gather(*(flight.do("key", load) for _ in range(3)), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_waiter_loads_when_leader_is_cancelled(self):
+        flight = SingleFlight()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        leader = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await waiter, 2)
+        self.assertTrue(leader.cancelled())
+        self.assertFalse(flight.in_flight("key"))
+
+
+class TestReadThrough(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = AsyncMock()
+        self.redis.get.return_value = None
+        self.redis.set.return_value = True
+        self.load = AsyncMock(return_value=b"user")
+
+    async def test_miss_loads_once_and_stores(self):
+        self.assertEqual(await read_through(self.redis, "user:a", self.load, 900, SingleFlight()), b"user")
+
+        self.load.assert_awaited_once()
+        stored = [call for call in self.redis.set.await_args_list if call.args[0] == "user:a"][0]
+        self.assertLessEqual(stored.kwargs["ex"], 900)
+        self.assertEqual(pickle.loads(stored.args[1]).value, b"user")
+
+    async def test_fresh_hit_does_not_load(self):
+        entry = CacheEntry(b"cached", 0.01, time.time() + 900)
+        self.redis.get.return_value = pickle.dumps(entry)
+
+        self.assertEqual(await read_through(self.redis, "user:a", self.load, 900, SingleFlight()), b"cached")
+        self.load.assert_not_awaited()
+
+    async def test_waits_for_other_worker(self):
+        entry = CacheEntry(b"cached", 0.01, time.time() + 900)
+        self.redis.get.side_effect = [None, pickle.dumps(entry)]
+        self.redis.set.return_value = None
+
+        self.assertEqual(await read_through(self.redis, "user:a", self.load, 900, SingleFlight()), b"cached")
+        self.load.assert_not_awaited()
+
+    async def test_lock_is_released_only_by_its_holder(self):
+        await read_through(self.redis, "user:a", self.load, 900, SingleFlight(), lock=True)
+
+        lock = self.redis.set.await_args_list[0]
+        self.assertEqual(lock.args[0], "user:a:lock")
+        client = AsyncMock()
+        self.redis.call.call_args.args[0](client)
+        self.assertEqual(client.eval.call_args.args[2:], ("user:a:lock", lock.args[1]))
+        self.assertNotIn("user:a:lock", [key for call in self.redis.delete.await_args_list for key in call.args])
+
+    async def test_redis_down_loads_from_db(self):
+        self.redis.get.side_effect = ConnectionError()
+
+        self.assertEqual(await read_through(self.redis, "user:a", self.load, 900, SingleFlight()), b"user")
+
+    async def test_unreadable_entry_is_a_miss(self):
+        self.redis.get.return_value = b"not a pickle"
+
+        self.assertEqual(await read_through(self.redis, "user:a", self.load, 900, SingleFlight()), b"user")
+        self.load.assert_awaited_once()
+
+    async def test_tags_are_recorded(self):
+        await read_through(self.redis, "user:a", self.load, 900, SingleFlight(), lock=False, tags=("tenant:1",))
+
+        client = MagicMock()
+        self.redis.call.call_args.args[0](client)
+        stored = [call for call in self.redis.set.await_args_list if call.args[0] == "user:a"][0]
+        self.assertEqual(client.eval.call_args.args[2:], (tag_key("tenant:1"), "user:a", stored.kwargs["ex"]))
+
+    def test_should_refresh(self):
+        entry = CacheEntry(b"", 1.0, 1000.0)
+        self.assertTrue(should_refresh(entry, 1.0, now=1000.0))
+        self.assertFalse(should_refresh(entry, 0.0, now=900.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+class TestCachePolicy(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = AsyncMock()
+        self.redis.set.return_value = True
+        self.load = AsyncMock(return_value=b"v2")
+
+    def test_key(self):
+        policy = CachePolicy("principal", version=2, ttl=60)
+
+        self.assertEqual(policy.key("a@b.c"), "rest-app:principal:v2:a@b.c")
+        self.assertEqual(policy.key("a@b.c", version=1), "rest-app:principal:v1:a@b.c")
+
+    async def test_upgrades_previous_version(self):
+        policy = CachePolicy("principal", version=2, ttl=60, upgrades={1: lambda value: value + b"+"})
+        old = CacheEntry(b"v1", 0.01, time.time() + 60)
+        self.redis.get.side_effect = lambda key: pickle.dumps(old) if key == policy.key("a", version=1) else None
+
+        self.assertEqual(await read_cached(self.redis, policy, ("a",), self.load, SingleFlight()), b"v1+")
+        self.load.assert_not_awaited()
+        stored = [call for call in self.redis.set.await_args_list if call.args[0] == policy.key("a")][0]
+        self.assertLessEqual(stored.kwargs["ex"], 60)
+
+    async def test_invalidate_tag(self):
+        client = MagicMock()
+        pages = iter([(7, [b"k1", b"k2"]), (0, [b"k3"])])
+
+        def call(operation):
+            operation(client)
+            return next(pages)
+
+        self.redis.call.side_effect = call
+
+        self.assertEqual(await invalidate_tag(self.redis, "tenant:1", chunk_size=2), 3)
+        self.assertEqual([scan.args[1] for scan in client.sscan.call_args_list], [0, 7])
+        deleted = [call.args for call in self.redis.delete.await_args_list]
+        self.assertEqual(deleted, [(b"k1", b"k2"), (b"k3",), (tag_key("tenant:1"),)])
+
+    async def test_forget_user_drops_every_principal_version(self):
+        keys = [principal_cache.key("a@b.c", version=0).encode(), principal_cache.key("a@b.c").encode()]
+        self.redis.call.return_value = (0, keys)
+
+        with patch.object(auth_service, "cache", self.redis):
+            await auth_service.forget_user("a@b.c")
+
+        client = MagicMock()
+        self.redis.call.call_args.args[0](client)
+        self.assertEqual(client.sscan.call_args.args[0], tag_key(user_tag("a@b.c")))
+        self.assertEqual(self.redis.delete.await_args_list[0].args, tuple(keys))
+
+    async def test_invalidate_tag_redis_down(self):
+        self.redis.call.side_effect = ConnectionError()
+
+        self.assertEqual(await invalidate_tag(self.redis, "tenant:1"), 0)
@@ -0,0 +1,81 @@
+import gzip
+
+from fastapi import FastAPI, Depends
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from src.services.compression import CompressionMiddleware, compression, negotiate, available_encoders
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+ITEMS = [{"id": i, "name": "Juniver", "surname": "Wulfsai"} for i in range(200)]
+
+
+@app.get("/large")
+async def large():
+    return ITEMS
+
+
+@app.get("/small")
+async def small():
+    return {"id": 1}
+
+
+@app.get("/plain", dependencies=[Depends(compression(enabled=False))])
+async def plain():
+    return ITEMS
+
+
+@app.get("/stream")
+async def stream():
+    async def chunks():
+        for i in range(50):
+            yield f"line {i} of the streamed contact export\n".encode()
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+client = TestClient(app)
+
+
+def test_large_response_compressed():
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json() == ITEMS
+
+
+def test_small_response_not_compressed():
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == {"id": 1}
+
+
+def test_uncompressed_variant_varies():
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_route_can_disable_compression():
+    response = client.get("/plain", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == ITEMS
+
+
+def test_streaming_response_compressed():
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    text = gzip.decompress(raw).decode()
+    assert text.count("\n") == 50
+
+
+def test_negotiate():
+    encoders = available_encoders()
+    assert negotiate("gzip;q=0, deflate", encoders) is None
+    assert negotiate("br;q=0, gzip", encoders) == "gzip"
+    assert negotiate("", encoders) is None
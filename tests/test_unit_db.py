@@ -0,0 +1,49 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.db import Base, UnitOfWorkRoute, get_db, unit_of_work
+from src.database.model import User
+
+engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+
+@router.post("/users/{name}")
+async def create(name: str, fail: int = 0, db: AsyncSession = Depends(get_db)):
+    db.add(User(username=name, email=f"{name}@example.com", password="x"))
+    await db.flush()
+    if fail:
+        raise HTTPException(status_code=fail, detail="failed")
+    return {"name": name}
+
+
+app = FastAPI()
+app.include_router(router)
+app.dependency_overrides[get_db] = unit_of_work(Session)
+
+
+async def usernames():
+    async with Session() as session:
+        return set((await session.execute(select(User.username))).scalars().all())
+
+
+def test_unit_of_work():
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    client = TestClient(app)
+
+    assert client.post("/users/committed").status_code == 200
+    assert client.post("/users/rejected", params={"fail": 409}).status_code == 409
+    assert client.post("/users/created", params={"fail": 201}).status_code == 201
+
+    assert asyncio.run(usernames()) == {"committed", "created"}
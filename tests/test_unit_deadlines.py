@@ -0,0 +1,100 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from src.database.redis_manager import CircuitOpen
+from src.services import deadlines
+from src.services.deadlines import DeadlineRoute, deadline, timeout_for
+from src.services.metrics import Registry, deadline_exceeded
+
+router = APIRouter(route_class=DeadlineRoute)
+
+
+@router.get("/slow", dependencies=[Depends(deadline(0.05))])
+async def slow():
+    await asyncio.sleep(1)
+
+
+@router.get("/budget", dependencies=[Depends(deadline(5))])
+async def budget():
+    return {"remaining": deadlines.current().remaining(), "timeout": timeout_for(60)}
+
+
+@router.get("/cache")
+async def cache():
+    raise RedisTimeoutError("timed out")
+
+
+@router.get("/circuit")
+async def circuit():
+    raise CircuitOpen("Redis circuit is open")
+
+
+class SlowCommitSession:
+    committed = False
+    info = {}
+
+    def in_transaction(self):
+        return not self.committed
+
+    async def commit(self):
+        await asyncio.sleep(0.1)
+        self.committed = True
+
+
+session = SlowCommitSession()
+
+
+@router.post("/write", dependencies=[Depends(deadline(0.05))])
+async def write(request: Request):
+    request.state.db = session
+    return {"written": True}
+
+
+app = FastAPI()
+app.include_router(router)
+client = TestClient(app)
+
+
+def test_deadline_exceeded():
+    before = deadline_exceeded.value(route="/slow", stage="request")
+    response = client.get("/slow")
+    assert response.status_code == 504
+    assert deadline_exceeded.value(route="/slow", stage="request") == before + 1
+
+
+def test_budget_caps_timeouts():
+    body = client.get("/budget").json()
+    assert 4 < body["remaining"] <= 5
+    assert body["timeout"] <= 5
+    assert deadlines.current() is None
+    assert timeout_for(60) == 60
+
+
+def test_redis_timeout():
+    response = client.get("/cache")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert deadline_exceeded.value(route="/cache", stage="redis") >= 1
+
+
+def test_circuit_open():
+    response = client.get("/circuit")
+    assert response.status_code == 503
+
+
+def test_commit_is_not_cut_by_deadline():
+    response = client.post("/write")
+    assert response.status_code == 200
+    assert session.committed
+
+
+def test_render():
+    registry = Registry()
+    counter = registry.counter("errors_total", "Errors.", ("route",))
+    counter.inc(route='/a"b')
+    counter.inc(2, route="/c")
+    assert registry.render() == ('# HELP errors_total Errors.\n# TYPE errors_total counter\n'
+                                 'errors_total{route="/a\\"b"} 1\nerrors_total{route="/c"} 2\n')
@@ -0,0 +1,122 @@
+import unittest
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+from fastapi_mail.errors import ConnectionErrors
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.database.db import Base
+from src.database.model import Contact, ContactCounter, User
+from src.jobs.birthdays import birthday_days, run_birthday_reminders
+from src.jobs.counters import reconcile_all_counters
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value).encode()
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def expire(self, key, seconds):
+        return key in self.data
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+class TestBirthdayReminders(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.session = self.sessions()
+        user = User(username="Corwin", email="owner@example.com", password="x", confirmed=True)
+        self.session.add(user)
+        await self.session.flush()
+        for i, birthday in enumerate([date(1990, 5, 2), date(1985, 5, 2), date(1991, 6, 1), date(1992, 5, 2)]):
+            self.session.add(Contact(name=f"Name{i}", surname="Surname", email=f"c{i}@example.com", phone=str(i),
+                                     email_normalized=f"c{i}@example.com", phone_normalized=f"+380{i}",
+                                     birthday=birthday, user_id=user.id))
+        await self.session.commit()
+        self.user_id = user.id
+        self.redis = FakeRedis()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    def test_birthday_days_leap(self):
+        self.assertEqual(birthday_days(date(2023, 2, 28)), [(2, 28), (2, 29)])
+        self.assertEqual(birthday_days(date(2024, 2, 28)), [(2, 28)])
+
+    async def test_reminders_sent_in_chunks(self):
+        with patch("src.services.email.send_birthday_reminder", new=AsyncMock()) as send:
+            sent = await run_birthday_reminders(self.redis, self.sessions, date(2026, 5, 1), chunk_size=2)
+            self.assertEqual(sent, (3, 0))
+            self.assertEqual(send.await_count, 3)
+            self.assertEqual(self.redis.data["jobs:birthdays:2026-05-01"], b"done")
+
+            sent = await run_birthday_reminders(self.redis, self.sessions, date(2026, 5, 1))
+            self.assertEqual(sent, (0, 0))
+
+    async def test_reminders_resume_from_checkpoint(self):
+        await self.redis.set("jobs:birthdays:2026-05-01", 2)
+        with patch("src.services.email.send_birthday_reminder", new=AsyncMock()) as send:
+            sent = await run_birthday_reminders(self.redis, self.sessions, date(2026, 5, 1))
+        self.assertEqual(sent, (1, 0))
+        self.assertEqual(send.await_args.args[2], "Name3 Surname")
+
+    async def test_failed_reminders_are_not_counted_as_sent(self):
+        send = AsyncMock(side_effect=[None, ConnectionError("smtp down"), None])
+        with patch("src.services.email.send_birthday_reminder", new=send):
+            sent = await run_birthday_reminders(self.redis, self.sessions, date(2026, 5, 1), concurrency=1)
+        self.assertEqual(sent, (2, 1))
+
+    async def test_smtp_failures_are_counted(self):
+        mail = AsyncMock()
+        mail.send_message.side_effect = [None, ConnectionErrors("smtp down"), None]
+        with patch("src.services.email.get_mail", return_value=mail):
+            sent = await run_birthday_reminders(self.redis, self.sessions, date(2026, 5, 1), concurrency=1)
+        self.assertEqual(sent, (2, 1))
+
+    async def test_each_chunk_uses_its_own_session(self):
+        opened = []
+
+        def sessions():
+            opened.append(self.sessions())
+            return opened[-1]
+
+        with patch("src.services.email.send_birthday_reminder", new=AsyncMock()):
+            await run_birthday_reminders(self.redis, sessions, date(2026, 5, 1), chunk_size=2)
+        # Two full chunks and the empty one ending the scan.
+        self.assertEqual(len(opened), 3)
+        self.assertFalse(any(session.in_transaction() for session in opened))
+
+    async def test_reconcile_counters(self):
+        user_id = self.user_id
+        self.session.add(ContactCounter(user_id=user_id, bucket=0, count=7))
+        self.session.add(ContactCounter(user_id=user_id, bucket=1, count=2))
+        await self.session.commit()
+
+        corrected = await reconcile_all_counters(self.session)
+
+        counters = dict((await self.session.execute(
+            select(ContactCounter.bucket, ContactCounter.count).where(ContactCounter.user_id == user_id)
+        )).all())
+        self.assertEqual(corrected, 4)
+        self.assertEqual(counters, {0: 4, 1: 0, 5: 3, 6: 1})
+        self.assertEqual(await reconcile_all_counters(self.session), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.database.db import DatabaseSessionManager
+from src.services import log
+from src.services.lifecycle import InFlightTracker, lifespan
+
+
+class TestLifecycle(unittest.IsolatedAsyncioTestCase):
+
+    async def test_drain_waits_for_in_flight(self):
+        tracker = InFlightTracker()
+        tracker.enter()
+        asyncio.get_running_loop().call_later(0.05, tracker.leave)
+
+        self.assertTrue(await tracker.drain(1))
+        self.assertEqual(tracker.in_flight, 0)
+
+    async def test_drain_timeout(self):
+        tracker = InFlightTracker()
+        tracker.enter()
+
+        self.assertFalse(await tracker.drain(0.01))
+        self.assertEqual(tracker.in_flight, 1)
+
+    async def test_warm_up_opens_connections(self):
+        manager = DatabaseSessionManager("sqlite+aiosqlite:///./test.sqlite", echo=False,
+                                         poolclass=AsyncAdaptedQueuePool)
+        try:
+            opened = await manager.warm_up(3)
+            self.assertEqual(opened, 3)
+            self.assertEqual(manager._engine.pool.checkedin(), 3)
+        finally:
+            await manager.close()
+
+    async def test_lifespan_runs_the_log_writer(self):
+        with patch("src.services.lifecycle.FastAPILimiter.init", AsyncMock()), \
+                patch("src.services.lifecycle.db.sessionmanager", AsyncMock()), \
+                patch("src.services.lifecycle.redis_manager", AsyncMock()):
+            async with lifespan(None):
+                self.assertIsNotNone(log._listener._thread)
+        self.assertIsNone(log._listener._thread)
+
+
+if __name__ == "__main__":
+    unittest.main()
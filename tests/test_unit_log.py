@@ -0,0 +1,60 @@
+import io
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.services.log import (JsonFormatter, RequestIdMiddleware, SamplingFilter, request_id, setup_logging,
+                              stop_logging)
+
+
+def record(level=logging.INFO, name="app", msg="hello %s", args=("world",), **extra):
+    result = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    result.__dict__.update(extra)
+    return result
+
+
+def test_json_formatter():
+    line = json.loads(JsonFormatter().format(record(request_id="abc", contact_id=7)))
+
+    assert line["message"] == "hello world"
+    assert line["level"] == "INFO"
+    assert line["request_id"] == "abc"
+    assert line["contact_id"] == 7
+
+
+def test_sampling_filter():
+    never = SamplingFilter(0.0, ("sqlalchemy.engine",))
+
+    assert not never.filter(record(logging.DEBUG))
+    assert not never.filter(record(name="sqlalchemy.engine.Engine"))
+    assert never.filter(record(logging.INFO))
+    assert never.filter(record(logging.WARNING, name="sqlalchemy.engine.Engine"))
+    assert SamplingFilter(1.0).filter(record(logging.DEBUG))
+
+
+def test_queue_logging_with_request_id():
+    stream = io.StringIO()
+    listener = setup_logging("INFO", json_output=True, stream=stream)
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/")
+    async def index():
+        logging.getLogger("test").info("served", extra={"user_id": 1})
+        return request_id.get()
+
+    try:
+        response = TestClient(app).get("/", headers={"X-Request-ID": "req-1"})
+        assert response.headers["X-Request-ID"] == "req-1"
+        assert response.json() == "req-1"
+        assert TestClient(app).get("/").headers["X-Request-ID"]
+    finally:
+        stop_logging()
+        assert listener._thread is None
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    served = [line for line in lines if line["message"] == "served"]
+    assert served[0]["request_id"] == "req-1"
+    assert served[0]["user_id"] == 1
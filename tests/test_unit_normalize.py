@@ -0,0 +1,22 @@
+import unittest
+
+from src.services.normalize import email_key, normalize_email, normalize_name, normalize_phone, phone_key
+
+
+class TestNormalize(unittest.TestCase):
+
+    def test_normalize_email(self):
+        self.assertEqual(normalize_email("  Olena.P@Example.COM "), "olena.p@example.com")
+
+    def test_normalize_phone(self):
+        for phone in ("+380 96 123 45 67", "096-123-45-67", "380961234567", "00380961234567"):
+            self.assertEqual(normalize_phone(phone, "380"), "+380961234567")
+
+    def test_blocking_keys(self):
+        self.assertEqual(email_key("olena.p+work@example.com"), email_key("olenap@example.com"))
+        self.assertEqual(phone_key("+380961234567"), phone_key("+48961234567"))
+        self.assertEqual(normalize_name("Ann-Marie", "Smith"), normalize_name("smith", "annmarie"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.database.db import Base
+from src.database.model import ContactEvent, User
+from src.jobs.outbox import LOCK_KEY, RELEASE_LOCK, relay_batch, run_relay, stream_for
+from src.repository.contacts import apply_batch, lock_user_writes
+from src.schemas import ContactOperation
+
+
+class FakePipeline:
+    def __init__(self):
+        self.entries = []
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self.entries.append((stream, fields))
+        return self
+
+
+class FakeRedis:
+    def __init__(self):
+        self.pipe = FakePipeline()
+        self.data = {}
+
+    async def pipeline(self, build, transaction=False, timeout=None):
+        build(self.pipe)
+        return [b"0-1"] * len(self.pipe.entries)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def call(self, operation, timeout=None, name="redis"):
+        client = MagicMock()
+        client.eval = self.eval
+        return await operation(client)
+
+    async def eval(self, script, numkeys, key, token, *args):
+        # Both lock scripts act only while the key still holds the token.
+        if self.data.get(key) != token:
+            return 0
+        if script == RELEASE_LOCK:
+            del self.data[key]
+        return 1
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        user = User(username="Corwin", email="owner@example.com", password="x", confirmed=True)
+        self.session.add(user)
+        await self.session.commit()
+        self.user_id = user.id
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_events_written_and_relayed_in_order(self):
+        contact = {"name": "Ann", "surname": "Lee", "email": "ann@example.com", "phone": "0961234567",
+                   "birthday": "1990-05-02", "notes": ""}
+        results = await apply_batch(self.user_id, [ContactOperation(op="create", contact=contact)], self.session)
+        contact_id = results[0].id
+        await apply_batch(self.user_id, [ContactOperation(op="update", id=contact_id, contact=dict(contact, name="Anna")),
+                                         ContactOperation(op="delete", id=contact_id)], self.session)
+
+        redis = FakeRedis()
+        self.assertEqual(await relay_batch(redis, self.session), 3)
+
+        self.assertEqual({stream for stream, _ in redis.pipe.entries}, {stream_for(self.user_id)})
+        self.assertEqual([fields["event"] for _, fields in redis.pipe.entries], ["created", "updated", "deleted"])
+        self.assertEqual(json.loads(redis.pipe.entries[1][1]["payload"])["name"], "Anna")
+        self.assertEqual((await self.session.execute(select(ContactEvent))).all(), [])
+        self.assertEqual(await relay_batch(redis, self.session), 0)
+
+    async def test_relay_releases_only_its_own_lock(self):
+        redis = FakeRedis()
+        stop = asyncio.Event()
+
+        async def batch(*args):
+            # Another relay took the lock over after this one stalled.
+            redis.data[LOCK_KEY] = "other relay"
+            return 0
+
+        relay_batch_mock = AsyncMock(side_effect=batch)
+        with patch("src.jobs.outbox.relay_batch", relay_batch_mock):
+            task = asyncio.create_task(run_relay(redis, self.session, stop))
+            await asyncio.sleep(0.01)
+            stop.set()
+            await task
+
+        self.assertEqual(redis.data[LOCK_KEY], "other relay")
+
+    async def test_user_writes_lock_on_postgres(self):
+        db = AsyncMock()
+        db.get_bind = MagicMock(return_value=MagicMock(dialect=MagicMock()))
+        db.get_bind.return_value.dialect.name = "postgresql"
+        await lock_user_writes(self.user_id, db)
+        self.assertIn("pg_advisory_xact_lock", str(db.execute.await_args.args[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
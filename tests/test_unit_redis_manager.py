@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from redis.exceptions import ConnectionError, ResponseError, TimeoutError
+
+from src.database.redis_manager import CircuitBreaker, CircuitOpen, RedisManager, SafeConnection
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRedisManager(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.redis = RedisManager("localhost", 6379, socket_timeout=0.05,
+                                  breaker=CircuitBreaker(2, 10.0, clock=self.clock))
+        self.redis.client = MagicMock()
+
+    async def test_breaker_opens_after_failures(self):
+        self.redis.client.get = AsyncMock(side_effect=ConnectionError())
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                await self.redis.get("key")
+
+        with self.assertRaises(CircuitOpen):
+            await self.redis.get("key")
+        self.assertEqual(self.redis.client.get.await_count, 2)
+
+    async def test_breaker_closes_after_successful_trial(self):
+        self.redis.client.get = AsyncMock(side_effect=ConnectionError())
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                await self.redis.get("key")
+
+        self.clock.now = 10.0
+        self.redis.client.get = AsyncMock(return_value=b"value")
+        self.assertEqual(await self.redis.get("key"), b"value")
+        self.assertFalse(self.redis.breaker.is_open)
+
+    async def test_command_errors_do_not_open_breaker(self):
+        self.redis.client.get = AsyncMock(side_effect=ResponseError("WRONGTYPE"))
+        for _ in range(3):
+            with self.assertRaises(ResponseError):
+                await self.redis.get("key")
+
+        self.assertFalse(self.redis.breaker.is_open)
+        self.assertEqual(self.redis.client.get.await_count, 3)
+
+    async def test_slow_command_times_out(self):
+        async def slow(key):
+            await asyncio.sleep(1)
+
+        self.redis.client.get = slow
+        with self.assertRaises(TimeoutError):
+            await self.redis.get("key")
+        self.assertEqual(self.redis.breaker.failures, 1)
+
+
+class TestSafeConnection(unittest.IsolatedAsyncioTestCase):
+
+    async def test_cancelled_read_disconnects(self):
+        async def slow(*args, **kwargs):
+            await asyncio.sleep(1)
+
+        conn = SafeConnection()
+        conn.disconnect = AsyncMock()
+        with patch("redis.asyncio.Connection.read_response", slow):
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(conn.read_response(), 0.01)
+        conn.disconnect.assert_awaited_once_with(nowait=True)
+
+    def test_pool_uses_safe_connections(self):
+        redis = RedisManager("localhost", 6379)
+        self.assertIs(redis.client.connection_pool.connection_class, SafeConnection)
+
+
+if __name__ == "__main__":
+    unittest.main()
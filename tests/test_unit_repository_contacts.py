@@ -0,0 +1,101 @@
+import unittest
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import config
+from src.database.db import Base
+from src.database.model import Contact, ContactTombstone, User
+from src.repository.contacts import delete_contact, get_changes, with_normalized
+
+
+class ContactsTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self.record)
+
+        async with self.sessions() as db:
+            db.add_all([User(id=1, username="ann", email="ann@example.com", password="x"),
+                        User(id=2, username="bob", email="bob@example.com", password="x")])
+            await db.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def executed(self, prefix: str) -> list[str]:
+        return [statement for statement in self.statements if statement.lstrip().upper().startswith(prefix.upper())]
+
+    async def create(self, user_id: int, name: str = "Juniver", **values) -> Contact:
+        async with self.sessions() as db:
+            contact = Contact(**with_normalized(dict(name=name, surname="Smith", email=f"{name.lower()}@example.com",
+                                                     phone=f"+38050{len(name)}234567", birthday=date(1990, 5, 17),
+                                                     user_id=user_id, **values)))
+            db.add(contact)
+            await db.commit()
+        return contact
+
+
+class TestCompositeKeyCrud(ContactsTestCase):
+
+    async def test_identity_includes_user(self):
+        contact = await self.create(1)
+
+        async with self.sessions() as db:
+            self.assertEqual((await db.get(Contact, (contact.id, 1))).name, "Juniver")
+            self.assertIsNone(await db.get(Contact, (contact.id, 2)))
+
+    async def test_update_filters_by_user(self):
+        contact = await self.create(1)
+
+        async with self.sessions() as db:
+            stored = await db.get(Contact, (contact.id, 1))
+            stored.notes = "met at the conference"
+            await db.commit()
+
+        (update,) = self.executed("UPDATE contacts")
+        self.assertIn("contacts.id = ?", update)
+        self.assertIn("contacts.user_id = ?", update)
+        async with self.sessions() as db:
+            self.assertEqual((await db.get(Contact, (contact.id, 1))).notes, "met at the conference")
+
+    async def test_delete_filters_by_user(self):
+        contact = await self.create(1)
+
+        async with self.sessions() as db:
+            await delete_contact(await db.get(Contact, (contact.id, 1)), db)
+            await db.commit()
+
+        (delete,) = self.executed("DELETE FROM contacts")
+        self.assertIn("contacts.id = ?", delete)
+        self.assertIn("contacts.user_id = ?", delete)
+        async with self.sessions() as db:
+            self.assertEqual((await db.execute(select(Contact))).scalars().all(), [])
+            tombstone = (await db.execute(select(ContactTombstone))).scalar_one()
+            self.assertEqual((tombstone.contact_id, tombstone.user_id), (contact.id, 1))
+
+
+class TestChanges(ContactsTestCase):
+
+    async def test_late_commit_is_synced(self):
+        watermark = datetime(2026, 10, 19, 12, 0, 0)
+        await self.create(1, "Early", updated_at=watermark)
+        async with self.sessions() as db:
+            _, _, since = await get_changes(1, watermark - timedelta(minutes=1), db)
+        self.assertEqual(since, watermark)
+
+        # Timestamped when its transaction started, just under a request deadline before
+        # the watermark, but committed after the client synced.
+        late = await self.create(1, "Late", updated_at=watermark - timedelta(seconds=config.request_deadline - 1))
+
+        async with self.sessions() as db:
+            contacts, _, _ = await get_changes(1, since, db)
+        self.assertIn(late.id, [contact.id for contact in contacts])
@@ -3,7 +3,8 @@ from unittest.mock import AsyncMock, MagicMock
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.model import User, Contact
 from src.schemas import UserSchema, UserResponseSchema
-from src.repository.users import get_user_by_email, user_to_response_schema, create_user, update_token,  update_avatar
+from src.repository.users import get_user_by_email, user_to_response_schema, create_user, update_token,  update_avatar, get_principal_by_email
+from src.services.principal import Principal
 
 class TestAsyncMethod(unittest.IsolatedAsyncioTestCase):
 
@@ -19,6 +20,8 @@ class TestAsyncMethod(unittest.IsolatedAsyncioTestCase):
 
     async def test_create_user(self):
         body=UserSchema(username='Cor5win',email='test@example.com', password='qwer5ty')
+        self.session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(
+            return_value=User(id=2, username=body.username, email=body.email)))
         result = await create_user(body,self.session)
 
         self.assertEqual(result.username, body.username)
@@ -26,6 +29,12 @@ class TestAsyncMethod(unittest.IsolatedAsyncioTestCase):
 
         self.assertTrue(hasattr(result, "id"))
 
+    async def test_create_user_email_taken(self):
+        body=UserSchema(username='Cor5win',email='test@example.com', password='qwer5ty')
+        self.session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=None))
+
+        self.assertIsNone(await create_user(body,self.session))
+
     async def test_user_to_response_schema(self):
         result = await user_to_response_schema(self.user)
 
@@ -41,6 +50,18 @@ class TestAsyncMethod(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(self.token, self.user.refresh_token)
 
+    async def test_get_principal_by_email(self):
+        row = (1, 'test50@example.com', 'Corwin', None, True)
+        self.session.execute.return_value = MagicMock(first=MagicMock(return_value=row))
+        result = await get_principal_by_email('test50@example.com', self.session)
+
+        self.assertEqual(result, Principal(*row))
+        self.assertEqual(Principal.loads(result.dumps()), result)
+        self.assertFalse(hasattr(result, "password"))
+
+        self.session.execute.return_value = MagicMock(first=MagicMock(return_value=None))
+        self.assertIsNone(await get_principal_by_email('missing@example.com', self.session))
+
 
     
 
@@ -0,0 +1,63 @@
+import asyncio
+from unittest.mock import patch
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.conf import server
+from src.conf.config import config
+from src.database.db import DatabaseSessionManager
+
+
+def test_worker_count_defaults_to_cpus():
+    with patch("os.cpu_count", return_value=4):
+        assert server.worker_count(config.model_copy(update={"workers": 0})) == 4
+    with patch("os.cpu_count", return_value=None):
+        assert server.worker_count(config.model_copy(update={"workers": 0})) == 1
+    assert server.worker_count(config.model_copy(update={"workers": 3})) == 3
+
+
+def test_uvicorn_options():
+    settings = config.model_copy(update={"host": "127.0.0.1", "port": 9000, "workers": 2, "keep_alive": 30,
+                                         "backlog": 512, "limit_concurrency": 100,
+                                         "shutdown_drain_timeout": 7.5, "log_level": "WARNING"})
+    options = server.uvicorn_options(settings)
+
+    assert options["host"] == "127.0.0.1"
+    assert options["port"] == 9000
+    assert options["workers"] == 2
+    assert options["timeout_keep_alive"] == 30
+    assert options["backlog"] == 512
+    assert options["limit_concurrency"] == 100
+    assert options["timeout_graceful_shutdown"] == 7
+    assert options["log_level"] == "warning"
+    assert options["log_config"] is None
+    assert options["loop"] in ("uvloop", "asyncio")
+    assert options["http"] in ("httptools", "h11")
+
+
+def test_run_serves_app_by_import_string():
+    with patch.object(server.uvicorn, "run") as run:
+        server.run()
+
+    (app,), options = run.call_args
+    # An import string lets every worker process load its own app, engine and pools.
+    assert app == "main:app"
+    assert options["workers"] == server.worker_count()
+
+
+def test_reset_after_fork_drops_inherited_pool(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path / 'fork.sqlite'}",
+                                     poolclass=AsyncAdaptedQueuePool)
+
+    async def connect():
+        async with manager._engine.connect():
+            pass
+
+    asyncio.run(connect())
+    inherited = manager._engine.sync_engine.pool
+    assert inherited.checkedin() == 1
+
+    manager.reset_after_fork()
+
+    assert manager._engine.sync_engine.pool is not inherited
+    assert manager._engine.sync_engine.pool.checkedin() == 0
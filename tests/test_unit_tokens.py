@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from redis.exceptions import ConnectionError
+
+from src.database.redis_manager import RedisManager
+from src.services.tokens import FallbackTokenStore, InvalidRefreshToken, RedisTokenStore, UnknownFamily
+
+
+class TestTokenStores(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = RedisManager("localhost", 6379)
+        self.redis.client = MagicMock()
+        self.script = self.redis.client.register_script.return_value = AsyncMock()
+        self.store = RedisTokenStore(self.redis)
+        self.claims = {"sub": "test@example.com", "fam": "f1", "jti": "j1", "exp": 4102444800}
+        self.new_token = "eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiJ0ZXN0QGV4YW1wbGUuY29tIiwiZmFtIjoiZjEiLCJqdGkiOiJqMiIsImV4cCI6NDEwMjQ0NDgwMH0.sig"
+
+    async def test_rotate_current_token(self):
+        self.script.return_value = 1
+        await self.store.rotate(self.claims, "token", self.new_token, None)
+        kwargs = self.script.call_args.kwargs
+        self.assertEqual(kwargs["keys"], ["refresh:family:f1"])
+        self.assertEqual(kwargs["args"][:2], ["j1", "j2"])
+        self.assertIs(kwargs["client"], self.redis.client)
+
+    async def test_rotate_reused_token(self):
+        self.script.return_value = 0
+        with self.assertRaises(InvalidRefreshToken):
+            await self.store.rotate(self.claims, "token", self.new_token, None)
+
+    async def test_rotate_unknown_family(self):
+        self.script.return_value = -1
+        with self.assertRaises(UnknownFamily):
+            await self.store.rotate(self.claims, "token", self.new_token, None)
+
+    async def test_fallback_when_redis_down(self):
+        primary = AsyncMock()
+        primary.rotate.side_effect = ConnectionError()
+        fallback = AsyncMock()
+        store = FallbackTokenStore(primary, fallback)
+
+        await store.rotate(self.claims, "token", self.new_token, None)
+
+        fallback.rotate.assert_awaited_once_with(self.claims, "token", self.new_token, None)
+
+    async def test_redis_path_does_not_write_fallback(self):
+        primary = AsyncMock()
+        fallback = AsyncMock()
+        store = FallbackTokenStore(primary, fallback)
+
+        await store.issue("token", None)
+        await store.rotate(self.claims, "token", self.new_token, None)
+
+        fallback.issue.assert_not_awaited()
+        fallback.rotate.assert_not_awaited()
+
+    async def test_unknown_family_uses_fallback(self):
+        primary = AsyncMock()
+        primary.rotate.side_effect = UnknownFamily()
+        fallback = AsyncMock()
+        store = FallbackTokenStore(primary, fallback)
+
+        await store.rotate(self.claims, "token", self.new_token, None)
+
+        fallback.rotate.assert_awaited_once_with(self.claims, "token", self.new_token, None)
+
+    async def test_reused_token_is_not_checked_by_fallback(self):
+        primary = AsyncMock()
+        primary.rotate.side_effect = InvalidRefreshToken()
+        fallback = AsyncMock()
+        store = FallbackTokenStore(primary, fallback)
+
+        with self.assertRaises(InvalidRefreshToken):
+            await store.rotate(self.claims, "token", self.new_token, None)
+        fallback.rotate.assert_not_awaited()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import logging
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.conf.config import config
+from src.services import tracing
+from src.services.tracing import instrument_engine, parse_traceparent, setup_tracing, span, stop_tracing
+
+
+@pytest.fixture
+def spans(caplog):
+    setup_tracing(enabled=True, exporter="log", sample_rate=1.0)
+    caplog.set_level(logging.INFO, logger="tracing.spans")
+    yield lambda: [record for record in caplog.records if record.name == "tracing.spans"]
+    setup_tracing()
+
+
+def test_nested_spans(spans):
+    parent = parse_traceparent("00-" + "a" * 32 + "-" + "b" * 16 + "-01")
+    with span("request", parent, route="/main/contacts") as outer:
+        with span("auth.decode_token") as inner:
+            pass
+        with pytest.raises(ValueError):
+            with span("failing"):
+                raise ValueError()
+
+    recorded = {record.getMessage(): record for record in spans()}
+    assert recorded["request"].trace_id == "a" * 32
+    assert recorded["request"].parent_span_id == "b" * 16
+    assert recorded["request"].attributes == {"route": "/main/contacts"}
+    assert recorded["auth.decode_token"].parent_span_id == outer.span_id
+    assert recorded["auth.decode_token"].span_id == inner.span_id
+    assert recorded["failing"].status == "ERROR"
+
+
+def test_unsampled_trace_records_nothing(spans):
+    setup_tracing(enabled=True, exporter="log", sample_rate=0.0)
+    with span("request") as outer:
+        with span("db.query") as inner:
+            assert inner is outer
+    assert spans() == []
+
+
+def test_disabled():
+    setup_tracing(enabled=False)
+    try:
+        with span("request") as current:
+            assert current is None
+    finally:
+        setup_tracing()
+
+
+def test_off_by_default():
+    setup_tracing()
+    with span("request") as current:
+        assert current is None
+
+
+def test_file_exporter_flushed_on_stop(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "tracing_file", str(tmp_path / "traces.jsonl"))
+    setup_tracing(enabled=True, exporter="file", sample_rate=1.0)
+    with span("request"):
+        pass
+    stop_tracing()
+
+    lines = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert [line["message"] for line in lines] == ["request"]
+    assert tracing.span_logger.handlers == []
+
+
+def test_database_statements(spans):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    instrument_engine(engine.sync_engine)
+
+    async def query():
+        with span("request") as outer:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        await engine.dispose()
+        return outer
+
+    outer = asyncio.run(query())
+    statements = [record for record in spans() if record.getMessage() == "db.query"]
+    assert statements[0].parent_span_id == outer.span_id
+    assert statements[0].attributes["db.statement"] == "SELECT 1"
+    assert tracing.current_span() is None